@@ -2,7 +2,10 @@
 Demo script to ingest sample PCAP and run analysis.
 """
 
+import importlib
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import click
 
@@ -12,9 +15,20 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from src.db.models import init_database
 from src.collector.pcap_ingest import PcapIngestor
 from src.parser.tor_extractor import TorExtractor
-from src.correlator.correlation_engine import CorrelationEngine
 from src.scorer.confidence import ConfidenceScorer
-from src.report.generator import ForensicReportGenerator
+
+# Later stages pull in networkx and reportlab. They are imported on a
+# background thread while the database is set up and the PCAP ingested.
+WARMUP_MODULES = (
+    'src.correlator.correlation_engine',
+    'src.report.generator',
+)
+
+
+def _warmup():
+    """Import the modules needed by the later pipeline stages."""
+    for module_name in WARMUP_MODULES:
+        importlib.import_module(module_name)
 
 
 @click.command()
@@ -37,49 +51,60 @@ def main(pcap: str, tor_nodes: str, db: str, report: str):
     click.echo("🔍 TOR Network Analysis - Sample Ingestion")
     click.echo("=" * 50)
     
+    threading.Thread(target=_warmup, daemon=True).start()
+    
     # Initialize database
     click.echo("\n1️⃣  Initializing database...")
     db_manager = init_database(Path(db))
     click.echo(f"   ✓ Database: {db}")
     
-    # Ingest PCAP
-    click.echo("\n2️⃣  Ingesting PCAP file...")
-    ingestor = PcapIngestor(db_manager, batch_size=1000)
-    flow_count = ingestor.ingest_pcap(Path(pcap), streaming=True)
-    click.echo(f"   ✓ Ingested {flow_count:,} flows")
+    # The analysis stages share one session instead of opening one per call.
+    # PCAP ingest runs on a worker thread with its own sessions, overlapping
+    # with TOR node loading.
+    with db_manager.session_scope() as session, \
+            ThreadPoolExecutor(max_workers=1) as executor:
+        # Ingest PCAP
+        click.echo("\n2️⃣  Ingesting PCAP file...")
+        ingestor = PcapIngestor(db_manager, batch_size=1000)
+        ingest_future = executor.submit(ingestor.ingest_pcap, Path(pcap), streaming=True)
     
-    # Load TOR nodes
-    click.echo("\n3️⃣  Loading TOR nodes...")
-    extractor = TorExtractor(db_manager)
-    if Path(tor_nodes).exists():
-        extractor.load_tor_nodes_from_file(Path(tor_nodes))
-        click.echo(f"   ✓ Loaded TOR nodes from {tor_nodes}")
-    else:
-        click.echo(f"   ⚠️  TOR node list not found: {tor_nodes}")
+        # Load TOR nodes
+        click.echo("\n3️⃣  Loading TOR nodes...")
+        extractor = TorExtractor(db_manager, session=session)
+        if Path(tor_nodes).exists():
+            extractor.load_tor_nodes_from_file(Path(tor_nodes))
+            click.echo(f"   ✓ Loaded TOR nodes from {tor_nodes}")
+        else:
+            click.echo(f"   ⚠️  TOR node list not found: {tor_nodes}")
+        
+        flow_count = ingest_future.result()
+        click.echo(f"   ✓ Ingested {flow_count:,} flows")
     
-    # Analyze flows
-    click.echo("\n4️⃣  Analyzing flows for TOR indicators...")
-    tor_flow_count = extractor.analyze_flows()
-    click.echo(f"   ✓ Identified {tor_flow_count:,} TOR-related flows")
+        # Analyze flows
+        click.echo("\n4️⃣  Analyzing flows for TOR indicators...")
+        tor_flow_count = extractor.analyze_flows()
+        click.echo(f"   ✓ Identified {tor_flow_count:,} TOR-related flows")
     
-    # Correlate flows
-    click.echo("\n5️⃣  Correlating flows...")
-    correlator = CorrelationEngine(db_manager, time_window_seconds=10)
-    correlation_count = correlator.correlate_flows(min_correlation_weight=0.3)
-    click.echo(f"   ✓ Created {correlation_count:,} correlations")
+        # Correlate flows
+        click.echo("\n5️⃣  Correlating flows...")
+        from src.correlator.correlation_engine import CorrelationEngine
+        correlator = CorrelationEngine(db_manager, time_window_seconds=10, session=session)
+        correlation_count = correlator.correlate_flows(min_correlation_weight=0.3)
+        click.echo(f"   ✓ Created {correlation_count:,} correlations")
     
-    # Score flows
-    click.echo("\n6️⃣  Calculating confidence scores...")
-    scorer = ConfidenceScorer(db_manager)
-    scored_count = scorer.score_all_flows()
-    click.echo(f"   ✓ Scored {scored_count:,} flows")
+        # Score flows
+        click.echo("\n6️⃣  Calculating confidence scores...")
+        scorer = ConfidenceScorer(db_manager, session=session)
+        scored_count = scorer.score_all_flows()
+        click.echo(f"   ✓ Scored {scored_count:,} flows")
     
-    # Get high confidence flows
-    high_conf = scorer.get_high_confidence_flows(min_score=60.0)
-    click.echo(f"   ✓ Found {len(high_conf)} high-confidence flows")
+        # Get high confidence flows
+        high_conf = scorer.get_high_confidence_flows(min_score=60.0)
+        click.echo(f"   ✓ Found {len(high_conf)} high-confidence flows")
     
     # Generate report
     click.echo("\n7️⃣  Generating forensic report...")
+    from src.report.generator import ForensicReportGenerator
     generator = ForensicReportGenerator(db_manager)
     report_path = Path(report)
     report_path.parent.mkdir(parents=True, exist_ok=True)
@@ -4,28 +4,83 @@ REST API for TOR Network Analysis Tool.
 FastAPI-based backend that exposes all core functionality via HTTP endpoints.
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Dict, Any
 from pathlib import Path
-import tempfile
-import shutil
 from datetime import datetime
-
-from src.db.models import init_database, Flow, TorNode, Correlation, Report
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import aiofiles
+from fastapi import Request
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.db.models import init_database, DatabaseManager, Flow, TorNode, Correlation, Report, SUSPECT_FILTER
 from src.collector.pcap_ingest import PcapIngestor
 from src.parser.tor_extractor import TorExtractor
 from src.correlator.correlation_engine import CorrelationEngine
 from src.scorer.confidence import ConfidenceScorer
 from src.report.generator import ForensicReportGenerator
+from src.utils.logger import get_logger
+
+try:
+    import orjson
+except ImportError:  # Optional: faster serialization of streamed responses
+    orjson = None
+
+logger = get_logger(__name__)
+
+# Bytes read from an upload per await
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Runs ingests, analyses and report builds off the event loop, at most one per CPU
+pipeline_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Rows fetched and serialized per chunk of a streamed response
+STREAM_BATCH_SIZE = 500
+
+# Read endpoint responses are cached until the data changes (TTLs in seconds)
+CACHE_PREFIX = "tor-api"
+STATS_CACHE_TTL = 5
+QUERY_CACHE_TTL = 30
+REPORTS_CACHE_TTL = 60
+
+# Uploads accepted but not yet ingested; analysis waits for them
+pending_ingests = 0
+ingests_done = threading.Condition()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the database and response cache in each worker process."""
+    app.state.db = init_database(Path("tor_analysis.db"))
+    init_cache()
+    yield
+    await app.state.db.dispose()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="TOR Network Analysis API",
     description="REST API for analyzing network traffic and detecting TOR usage",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for frontend integration
@@ -37,8 +92,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database
-db_manager = init_database(Path("tor_analysis.db"))
+
+def init_cache():
+    """Cache in Redis when REDIS_URL is set, in process memory otherwise."""
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+        backend = RedisBackend(aioredis.from_url(redis_url))
+    else:
+        backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, key_builder=request_key_builder)
+
+
+def request_key_builder(func, namespace: str = "", *, request: Request = None,
+                        response=None, args=(), kwargs=None) -> str:
+    """Key cached responses by path and query parameters only."""
+    params = hashlib.md5(
+        str(sorted(request.query_params.multi_items())).encode()
+    ).hexdigest()
+    return f"{FastAPICache.get_prefix()}:{namespace}:{request.url.path}:{params}"
+
+
+async def invalidate_cache():
+    """Drop every cached response (after the stored data changes)."""
+    await FastAPICache.clear()
+
+
+def get_db_manager(request: Request) -> DatabaseManager:
+    """Provide the worker's database manager to an endpoint."""
+    return request.app.state.db
+
+
+async def get_db(
+    db_manager: DatabaseManager = Depends(get_db_manager)
+) -> AsyncIterator[AsyncSession]:
+    """Provide an asyncio database session to an endpoint."""
+    async with db_manager.get_async_session() as session:
+        yield session
+
+
+def count_where(*criteria):
+    """Count the rows of an aggregate query matching the given criteria."""
+    return func.coalesce(func.sum(case((and_(*criteria), 1), else_=0)), 0)
+
+
+def dumps(value) -> bytes:
+    """Serialize a response item to JSON (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+async def stream_json_array(db_manager: DatabaseManager, query,
+                            to_dict) -> AsyncIterator[bytes]:
+    """
+    Yield the rows of a query as a JSON array, one batch of rows at a time.
+    
+    The generator opens its own session: it runs while the response is
+    sent, after endpoint dependencies have been closed.
+    
+    Args:
+        db_manager: Database manager to open the session on
+        query: Select statement returning ORM objects
+        to_dict: Converts one object to a JSON-serializable dict
+    """
+    async with db_manager.get_async_session() as session:
+        result = await session.stream_scalars(
+            query.execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        separator = b"["
+        async for rows in result.partitions():
+            yield separator + b",".join(dumps(to_dict(row)) for row in rows)
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+
+def flow_to_dict(flow: Flow) -> Dict[str, Any]:
+    """Convert a flow to its API representation (FlowResponse fields)."""
+    return {
+        "id": flow.id,
+        "src_ip": flow.src_ip,
+        "src_port": flow.src_port,
+        "dst_ip": flow.dst_ip,
+        "dst_port": flow.dst_port,
+        "protocol": flow.protocol,
+        "ts_start": flow.ts_start.isoformat() if flow.ts_start else "",
+        "pkt_count": flow.pkt_count,
+        "byte_count": flow.byte_count,
+        "confidence_score": flow.confidence_score,
+        "confidence_category": flow.confidence_category,
+        "possible_tor_handshake": flow.possible_tor_handshake or False,
+        "relay_comm": flow.relay_comm or False,
+        "directory_fetch": flow.directory_fetch or False,
+        "obfsproxy_candidate": flow.obfsproxy_candidate or False
+    }
+
+
+def timeline_point(flow: Flow) -> Dict[str, Any]:
+    """Convert a flow to a timeline entry."""
+    return {
+        "time": flow.ts_start.isoformat(),
+        "flow_id": flow.id,
+        "source": flow.src_ip,
+        "destination": flow.dst_ip,
+        "score": flow.confidence_score,
+        "category": flow.confidence_category
+    }
 
 
 # Pydantic models for request/response
@@ -103,165 +263,171 @@ async def root():
 
 
 @app.get("/api/stats", response_model=StatsResponse)
-async def get_stats():
+@cache(expire=STATS_CACHE_TTL)
+async def get_stats(session: AsyncSession = Depends(get_db)):
     """Get overall statistics."""
-    session = db_manager.get_session()
-    try:
-        total_flows = session.query(Flow).count()
-        suspect_flows = session.query(Flow).filter(
-            Flow.confidence_score >= 30.0
-        ).count()
-        critical_flows = session.query(Flow).filter(
-            Flow.confidence_category == 'Critical'
-        ).count()
-        high_flows = session.query(Flow).filter(
-            Flow.confidence_category == 'High'
-        ).count()
-        total_correlations = session.query(Correlation).count()
-        total_tor_nodes = session.query(TorNode).count()
-        
-        return StatsResponse(
-            total_flows=total_flows,
-            suspect_flows=suspect_flows,
-            critical_flows=critical_flows,
-            high_flows=high_flows,
-            total_correlations=total_correlations,
-            total_tor_nodes=total_tor_nodes
-        )
-    finally:
-        session.close()
-
-
-@app.get("/api/flows", response_model=List[FlowResponse])
+    # Flow counts in one pass over flows, the other tables as subqueries
+    result = await session.execute(select(
+        func.count(Flow.id).label('total_flows'),
+        count_where(SUSPECT_FILTER).label('suspect_flows'),
+        count_where(Flow.confidence_category == 'Critical').label('critical_flows'),
+        count_where(Flow.confidence_category == 'High').label('high_flows'),
+        select(func.count(Correlation.id)).scalar_subquery().label('total_correlations'),
+        select(func.count(TorNode.id)).scalar_subquery().label('total_tor_nodes')
+    ))
+    return StatsResponse(**result.one()._asdict())
+
+
+@app.get("/api/flows")
 async def get_flows(
     min_score: float = 0.0,
     category: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
-    """Get flows with optional filtering."""
-    session = db_manager.get_session()
-    try:
-        query = session.query(Flow).filter(Flow.confidence_score >= min_score)
-        
-        if category:
-            query = query.filter(Flow.confidence_category == category)
-        
-        flows = query.order_by(Flow.confidence_score.desc()).offset(offset).limit(limit).all()
-        
-        return [
-            FlowResponse(
-                id=flow.id,
-                src_ip=flow.src_ip,
-                src_port=flow.src_port,
-                dst_ip=flow.dst_ip,
-                dst_port=flow.dst_port,
-                protocol=flow.protocol,
-                ts_start=flow.ts_start.isoformat() if flow.ts_start else "",
-                pkt_count=flow.pkt_count,
-                byte_count=flow.byte_count,
-                confidence_score=flow.confidence_score,
-                confidence_category=flow.confidence_category,
-                possible_tor_handshake=flow.possible_tor_handshake or False,
-                relay_comm=flow.relay_comm or False,
-                directory_fetch=flow.directory_fetch or False,
-                obfsproxy_candidate=flow.obfsproxy_candidate or False
-            )
-            for flow in flows
-        ]
-    finally:
-        session.close()
+    """Get flows with optional filtering, streamed as a JSON array of FlowResponse."""
+    query = select(Flow).where(Flow.confidence_score >= min_score)
+    
+    if category:
+        query = query.where(Flow.confidence_category == category)
+    
+    query = query.order_by(Flow.confidence_score.desc()).offset(offset).limit(limit)
+    return StreamingResponse(
+        stream_json_array(db_manager, query, flow_to_dict), media_type="application/json"
+    )
 
 
 @app.get("/api/flows/{flow_id}")
-async def get_flow_detail(flow_id: int):
+async def get_flow_detail(flow_id: int, session: AsyncSession = Depends(get_db)):
     """Get detailed information about a specific flow."""
-    session = db_manager.get_session()
-    try:
-        flow = session.query(Flow).filter_by(id=flow_id).first()
-        if not flow:
-            raise HTTPException(status_code=404, detail="Flow not found")
-        
-        # Get correlations
-        correlations = session.query(Correlation).filter(
-            (Correlation.flow_id == flow_id) | (Correlation.correlated_flow_id == flow_id)
-        ).all()
-        
-        return {
-            "flow": FlowResponse(
-                id=flow.id,
-                src_ip=flow.src_ip,
-                src_port=flow.src_port,
-                dst_ip=flow.dst_ip,
-                dst_port=flow.dst_port,
-                protocol=flow.protocol,
-                ts_start=flow.ts_start.isoformat() if flow.ts_start else "",
-                pkt_count=flow.pkt_count,
-                byte_count=flow.byte_count,
-                confidence_score=flow.confidence_score,
-                confidence_category=flow.confidence_category,
-                possible_tor_handshake=flow.possible_tor_handshake or False,
-                relay_comm=flow.relay_comm or False,
-                directory_fetch=flow.directory_fetch or False,
-                obfsproxy_candidate=flow.obfsproxy_candidate or False
-            ),
-            "correlations": [
-                {
-                    "id": c.id,
-                    "flow_id": c.flow_id,
-                    "correlated_flow_id": c.correlated_flow_id,
-                    "weight": c.correlation_weight,
-                    "type": c.correlation_type
-                }
-                for c in correlations
-            ],
-            "payload_sample": flow.payload_sample
-        }
-    finally:
-        session.close()
+    flow = await session.get(Flow, flow_id)
+    if not flow:
+        raise HTTPException(status_code=404, detail="Flow not found")
+    
+    # Get correlations as one index seek per endpoint column (UNION ALL)
+    # rather than an OR over both
+    result = await session.execute(select(Correlation).from_statement(
+        select(Correlation).where(Correlation.flow_id == flow_id).union_all(
+            select(Correlation).where(
+                Correlation.correlated_flow_id == flow_id, Correlation.flow_id != flow_id
+            )
+        )
+    ))
+    correlations = result.scalars().all()
+    
+    return {
+        "flow": FlowResponse(**flow_to_dict(flow)),
+        "correlations": [
+            {
+                "id": c.id,
+                "flow_id": c.flow_id,
+                "correlated_flow_id": c.correlated_flow_id,
+                "weight": c.correlation_weight,
+                "type": c.correlation_type
+            }
+            for c in correlations
+        ],
+        # Raw bytes in the database; base64 in the response
+        "payload_sample": (
+            base64.b64encode(flow.payload_sample).decode('ascii')
+            if flow.payload_sample else None
+        )
+    }
 
 
 @app.post("/api/upload")
 async def upload_pcap(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
-    """Upload and ingest PCAP file."""
+    """Upload a PCAP file and ingest it in the background."""
+    global pending_ingests
     if not file.filename.endswith(('.pcap', '.pcapng')):
         raise HTTPException(status_code=400, detail="Invalid file type. Must be .pcap or .pcapng")
     
-    # Save uploaded file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pcap') as tmp_file:
-        shutil.copyfileobj(file.file, tmp_file)
+    # Save uploaded file, one chunk per await so the event loop keeps serving
+    async with aiofiles.tempfile.NamedTemporaryFile('wb', delete=False, suffix='.pcap') as tmp_file:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await tmp_file.write(chunk)
         tmp_path = Path(tmp_file.name)
     
+    # Ingest after the response is sent
+    with ingests_done:
+        pending_ingests += 1
+    background_tasks.add_task(ingest_in_background, db_manager, tmp_path)
+    
+    return {
+        "status": "accepted",
+        "message": f"Ingesting {file.filename}"
+    }
+
+
+async def run_in_pipeline_executor(func, *args):
+    """Run a blocking call on the pipeline executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pipeline_executor, func, *args)
+
+
+async def ingest_in_background(db_manager: DatabaseManager, tmp_path: Path):
+    """Ingest an uploaded PCAP file, then drop cached responses."""
+    await run_in_pipeline_executor(ingest_upload, db_manager, tmp_path)
+    await invalidate_cache()
+
+
+def ingest_upload(db_manager: DatabaseManager, tmp_path: Path):
+    """Ingest an uploaded PCAP file and remove it."""
+    global pending_ingests
     try:
-        # Ingest PCAP
         ingestor = PcapIngestor(db_manager, batch_size=1000)
         flow_count = ingestor.ingest_pcap(tmp_path, streaming=True)
-        
-        # Clean up
-        tmp_path.unlink()
-        
-        return {
-            "status": "success",
-            "message": f"Ingested {flow_count} flows",
-            "flow_count": flow_count
-        }
+        logger.info(f"Ingested {flow_count} flows", file=str(tmp_path))
     except Exception as e:
+        logger.error(f"Error ingesting upload: {e}", file=str(tmp_path))
+    finally:
         if tmp_path.exists():
             tmp_path.unlink()
-        raise HTTPException(status_code=500, detail=str(e))
+        with ingests_done:
+            pending_ingests -= 1
+            ingests_done.notify_all()
+
+
+def wait_for_ingests():
+    """Block until every accepted upload has been ingested."""
+    with ingests_done:
+        ingests_done.wait_for(lambda: pending_ingests == 0)
 
 
 @app.post("/api/analyze")
-async def run_analysis(request: AnalysisRequest):
+async def run_analysis(request: AnalysisRequest,
+                       db_manager: DatabaseManager = Depends(get_db_manager)):
     """Run complete TOR analysis pipeline."""
+    # Flows from uploads still being ingested are part of the analysis
+    await asyncio.to_thread(wait_for_ingests)
+    
     try:
-        results = {}
+        results = await run_in_pipeline_executor(run_analysis_pipeline, db_manager, request)
+        await invalidate_cache()
         
+        return {
+            "status": "success",
+            "message": "Analysis complete",
+            "results": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def run_analysis_pipeline(db_manager: DatabaseManager,
+                          request: AnalysisRequest) -> Dict[str, int]:
+    """Extract TOR indicators, correlate and score the stored flows."""
+    results = {}
+    
+    # One session for every stage, instead of one per stage and query
+    with db_manager.session_scope() as session:
         # Step 1: Extract TOR indicators
-        extractor = TorExtractor(db_manager)
+        extractor = TorExtractor(db_manager, session=session)
         
         # Load TOR nodes if available
         tor_nodes_path = Path("data/tor_node_list.json")
@@ -272,129 +438,115 @@ async def run_analysis(request: AnalysisRequest):
         results['tor_flows_identified'] = tor_count
         
         # Step 2: Correlate flows
-        correlator = CorrelationEngine(db_manager, time_window_seconds=request.time_window)
+        correlator = CorrelationEngine(db_manager, time_window_seconds=request.time_window,
+                                       session=session)
         corr_count = correlator.correlate_flows(min_correlation_weight=request.min_correlation_weight)
         results['correlations_created'] = corr_count
         
         # Step 3: Score flows
-        scorer = ConfidenceScorer(db_manager)
+        scorer = ConfidenceScorer(db_manager, session=session)
         scored_count = scorer.score_all_flows()
         results['flows_scored'] = scored_count
         
-        # Get high confidence flows
-        high_conf = scorer.get_high_confidence_flows(min_score=60.0)
-        results['high_confidence_flows'] = len(high_conf)
-        
-        return {
-            "status": "success",
-            "message": "Analysis complete",
-            "results": results
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Count high confidence flows (without loading them)
+        results['high_confidence_flows'] = session.scalar(
+            select(func.count()).select_from(Flow).where(Flow.confidence_score >= 60.0)
+        )
+    
+    return results
 
 
 @app.get("/api/correlations", response_model=List[CorrelationResponse])
-async def get_correlations(limit: int = 100, offset: int = 0):
+@cache(expire=QUERY_CACHE_TTL)
+async def get_correlations(limit: int = 100, offset: int = 0,
+                           session: AsyncSession = Depends(get_db)):
     """Get flow correlations."""
-    session = db_manager.get_session()
-    try:
-        correlations = session.query(Correlation).order_by(
-            Correlation.correlation_weight.desc()
-        ).offset(offset).limit(limit).all()
-        
-        return [
-            CorrelationResponse(
-                id=c.id,
-                flow_id=c.flow_id,
-                correlated_flow_id=c.correlated_flow_id,
-                correlation_weight=c.correlation_weight,
-                correlation_type=c.correlation_type
-            )
-            for c in correlations
-        ]
-    finally:
-        session.close()
+    result = await session.execute(select(Correlation).order_by(
+        Correlation.correlation_weight.desc()
+    ).offset(offset).limit(limit))
+    correlations = result.scalars().all()
+    
+    return [
+        CorrelationResponse(
+            id=c.id,
+            flow_id=c.flow_id,
+            correlated_flow_id=c.correlated_flow_id,
+            correlation_weight=c.correlation_weight,
+            correlation_type=c.correlation_type
+        )
+        for c in correlations
+    ]
 
 
 @app.get("/api/graph")
-async def get_correlation_graph():
+@cache(expire=QUERY_CACHE_TTL)
+async def get_correlation_graph(session: AsyncSession = Depends(get_db)):
     """Get correlation graph data for visualization."""
-    session = db_manager.get_session()
-    try:
-        correlations = session.query(Correlation).all()
-        
-        nodes = {}
-        edges = []
+    # Both endpoint flows come with each correlation in a single query;
+    # inner joins skip correlations whose flows no longer exist
+    source, target = aliased(Flow), aliased(Flow)
+    rows = await session.execute(
+        select(
+            Correlation.flow_id, Correlation.correlated_flow_id,
+            Correlation.correlation_weight, Correlation.correlation_type,
+            source.src_ip, source.dst_ip, source.confidence_score, source.confidence_category,
+            target.src_ip, target.dst_ip, target.confidence_score, target.confidence_category
+        )
+        .join(source, source.id == Correlation.flow_id)
+        .join(target, target.id == Correlation.correlated_flow_id)
+    )
+    
+    nodes = {}
+    edges = []
+    
+    for (flow_id, correlated_flow_id, weight, corr_type,
+         src1, dst1, score1, category1, src2, dst2, score2, category2) in rows:
+        # Add nodes
+        if flow_id not in nodes:
+            nodes[flow_id] = {
+                "id": flow_id,
+                "label": f"{src1}→{dst1}",
+                "score": score1,
+                "category": category1
+            }
         
-        for corr in correlations:
-            # Get flow details
-            flow1 = session.query(Flow).filter_by(id=corr.flow_id).first()
-            flow2 = session.query(Flow).filter_by(id=corr.correlated_flow_id).first()
-            
-            if flow1 and flow2:
-                # Add nodes
-                if corr.flow_id not in nodes:
-                    nodes[corr.flow_id] = {
-                        "id": corr.flow_id,
-                        "label": f"{flow1.src_ip}→{flow1.dst_ip}",
-                        "score": flow1.confidence_score,
-                        "category": flow1.confidence_category
-                    }
-                
-                if corr.correlated_flow_id not in nodes:
-                    nodes[corr.correlated_flow_id] = {
-                        "id": corr.correlated_flow_id,
-                        "label": f"{flow2.src_ip}→{flow2.dst_ip}",
-                        "score": flow2.confidence_score,
-                        "category": flow2.confidence_category
-                    }
-                
-                # Add edge
-                edges.append({
-                    "source": corr.flow_id,
-                    "target": corr.correlated_flow_id,
-                    "weight": corr.correlation_weight,
-                    "type": corr.correlation_type
-                })
+        if correlated_flow_id not in nodes:
+            nodes[correlated_flow_id] = {
+                "id": correlated_flow_id,
+                "label": f"{src2}→{dst2}",
+                "score": score2,
+                "category": category2
+            }
         
-        return {
-            "nodes": list(nodes.values()),
-            "edges": edges
-        }
-    finally:
-        session.close()
+        # Add edge
+        edges.append({
+            "source": flow_id,
+            "target": correlated_flow_id,
+            "weight": weight,
+            "type": corr_type
+        })
+    
+    return {
+        "nodes": list(nodes.values()),
+        "edges": edges
+    }
 
 
 @app.get("/api/timeline")
-async def get_timeline_data():
-    """Get timeline data for visualization."""
-    session = db_manager.get_session()
-    try:
-        flows = session.query(Flow).filter(
-            Flow.ts_start.isnot(None),
-            Flow.confidence_score >= 30.0
-        ).order_by(Flow.ts_start).all()
-        
-        timeline_data = [
-            {
-                "time": flow.ts_start.isoformat(),
-                "flow_id": flow.id,
-                "source": flow.src_ip,
-                "destination": flow.dst_ip,
-                "score": flow.confidence_score,
-                "category": flow.confidence_category
-            }
-            for flow in flows
-        ]
-        
-        return timeline_data
-    finally:
-        session.close()
+async def get_timeline_data(db_manager: DatabaseManager = Depends(get_db_manager)):
+    """Get timeline data for visualization, streamed as a JSON array."""
+    query = select(Flow).where(
+        Flow.ts_start.isnot(None),
+        SUSPECT_FILTER
+    ).order_by(Flow.ts_start)
+    return StreamingResponse(
+        stream_json_array(db_manager, query, timeline_point), media_type="application/json"
+    )
 
 
 @app.post("/api/reports/generate")
-async def generate_report(title: str = "TOR Analysis Report"):
+async def generate_report(title: str = "TOR Analysis Report",
+                          db_manager: DatabaseManager = Depends(get_db_manager)):
     """Generate PDF forensic report."""
     try:
         generator = ForensicReportGenerator(db_manager)
@@ -403,7 +555,11 @@ async def generate_report(title: str = "TOR Analysis Report"):
         output_path = Path(f"reports/report_{timestamp}.pdf")
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        report_path = generator.generate_report(output_path, title=title)
+        # Layout and rendering are CPU-bound; keep them off the event loop
+        report_path = await run_in_pipeline_executor(
+            partial(generator.generate_report, output_path, title=title)
+        )
+        await invalidate_cache()
         
         return {
             "status": "success",
@@ -431,33 +587,32 @@ async def download_report(filename: str):
 
 
 @app.get("/api/reports")
-async def list_reports():
+@cache(expire=REPORTS_CACHE_TTL)
+async def list_reports(session: AsyncSession = Depends(get_db)):
     """List all generated reports."""
-    session = db_manager.get_session()
-    try:
-        reports = session.query(Report).order_by(Report.created_at.desc()).all()
-        
-        return [
-            {
-                "id": r.id,
-                "title": r.title,
-                "created_at": r.created_at.isoformat(),
-                "total_flows": r.total_flows,
-                "suspect_flows": r.suspect_flows,
-                "critical_alerts": r.critical_alerts,
-                "file_path": r.file_path
-            }
-            for r in reports
-        ]
-    finally:
-        session.close()
+    result = await session.execute(select(Report).order_by(Report.created_at.desc()))
+    reports = result.scalars().all()
+    
+    return [
+        {
+            "id": r.id,
+            "title": r.title,
+            "created_at": r.created_at.isoformat(),
+            "total_flows": r.total_flows,
+            "suspect_flows": r.suspect_flows,
+            "critical_alerts": r.critical_alerts,
+            "file_path": r.file_path
+        }
+        for r in reports
+    ]
 
 
 @app.delete("/api/database/reset")
-async def reset_database():
+async def reset_database(db_manager: DatabaseManager = Depends(get_db_manager)):
     """Reset database (development only)."""
     try:
         db_manager.reset_database()
+        await invalidate_cache()
         return {"status": "success", "message": "Database reset"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
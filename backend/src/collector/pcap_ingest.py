@@ -2,99 +2,197 @@
 PCAP ingestion and flow normalization using Scapy.
 """
 
-import base64
+import heapq
+import mmap
+import os
+import socket
+import struct
+import time
+from contextlib import closing
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Generator
-from collections import defaultdict
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Generator, Tuple
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
 import click
+import numpy as np
 
-from scapy.all import rdpcap, PcapReader, IP, IPv6, TCP, UDP, Raw
+from scapy.all import RawPcapReader, IP, IPv6, TCP, UDP, Raw, conf
 from scapy.packet import Packet
 from tqdm import tqdm
 
+from sqlalchemy.orm import Session
+
 from src.db.models import Flow, DatabaseManager
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Classic pcap magic numbers -> (byte order, timestamp ticks per second).
+# Files starting with one of these are memory-mapped and read directly.
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1000000),
+    b'\xa1\xb2\xc3\xd4': ('>', 1000000),
+    b'\x4d\x3c\xb2\xa1': ('<', 1000000000),
+    b'\xa1\xb2\x3c\x4d': ('>', 1000000000),
+}
+PCAP_HEADER_SIZE = 24
 
-class FlowKey:
-    """Unique identifier for a network flow."""
-    
-    def __init__(self, src_ip: str, src_port: int, dst_ip: str, dst_port: int, proto: str):
-        self.src_ip = src_ip
-        self.src_port = src_port
-        self.dst_ip = dst_ip
-        self.dst_port = dst_port
-        self.proto = proto
-    
-    def __hash__(self):
-        return hash((self.src_ip, self.src_port, self.dst_ip, self.dst_port, self.proto))
-    
-    def __eq__(self, other):
-        return (self.src_ip == other.src_ip and 
-                self.src_port == other.src_port and
-                self.dst_ip == other.dst_ip and 
-                self.dst_port == other.dst_port and
-                self.proto == other.proto)
+# Link-layer types whose headers are parsed directly; anything else is
+# dissected with Scapy
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+IPPROTO_IPIP = 4
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_IPV6 = 41
+IPPROTO_GRE = 47
+
+# IPv6 extension headers skipped on the way to the transport header
+# (hop-by-hop, routing, destination options) and the fragment header
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+
+# Tunnels (IP-in-IP, IPv6-in-IPv4, GRE) are keyed on the outer addresses and
+# the inner transport header, as Scapy does. They are left out of the array
+# parsing; _parse_frame follows IP tunnels and hands GRE to Scapy.
+IP_TUNNEL_PROTOCOLS = (IPPROTO_IPIP, IPPROTO_IPV6, IPPROTO_GRE)
+
+# Zero bytes appended to a batch buffer so fixed-offset header reads never
+# run past its end (link + maximum IPv4 header + TCP data offset)
+HEADER_READ_PADDING = 128
+
+
+# Flow identifier: (src_ip, src_port, dst_ip, dst_port, IP protocol number).
+# Plain tuples hash and compare in C on every dict lookup. Addresses are
+# kept packed (4 or 16 bytes) and only formatted when a flow is written.
+FlowKey = Tuple[bytes, int, bytes, int, int]
+
+# Aggregate of one flow's packets within a batch:
+# (flow key, packet count, byte count, first timestamp, last timestamp,
+# first payload sample or None). Plain tuples keep worker results cheap
+# to pickle.
+FlowSummary = Tuple[FlowKey, int, int, float, float, Optional[bytes]]
+
+# Transport protocol number -> name stored on flows
+PROTOCOL_NAMES = {IPPROTO_TCP: "TCP", IPPROTO_UDP: "UDP"}
+
+# Bytes of the first payload kept on each flow
+PAYLOAD_SAMPLE_SIZE = 512
+
+
+def format_address(address: bytes) -> str:
+    """Format a packed IPv4 or IPv6 address."""
+    if len(address) == 4:
+        return socket.inet_ntoa(address)
+    return socket.inet_ntop(socket.AF_INET6, address)
 
 
 class FlowRecord:
     """Aggregated flow record."""
     
+    # One record per active flow; no per-instance __dict__
+    __slots__ = ('key', 'ts_start', 'ts_end', 'pkt_count', 'byte_count', 'payload_sample')
+    
     def __init__(self, key: FlowKey, timestamp: float):
         self.key = key
-        self.ts_start = datetime.fromtimestamp(timestamp)
-        self.ts_end = datetime.fromtimestamp(timestamp)
+        # Capture timestamps (seconds since the epoch), converted to
+        # datetimes only when the flow is written
+        self.ts_start = timestamp
+        self.ts_end = timestamp
         self.pkt_count = 0
         self.byte_count = 0
         self.payload_sample: Optional[bytes] = None
     
     def update(self, timestamp: float, payload: Optional[bytes], pkt_size: int):
         """Update flow with new packet information."""
-        self.ts_end = datetime.fromtimestamp(timestamp)
-        self.pkt_count += 1
-        self.byte_count += pkt_size
+        self.add_packets(1, pkt_size, timestamp, payload)
+    
+    def add_packets(self, pkt_count: int, byte_count: int, timestamp: float,
+                    payload: Optional[bytes]):
+        """
+        Update flow with a run of packets aggregated elsewhere.
+        
+        Args:
+            pkt_count: Number of packets
+            byte_count: Total size of the packets
+            timestamp: Timestamp of the last packet
+            payload: First non-empty payload among the packets, if any
+        """
+        self.ts_end = timestamp
+        self.pkt_count += pkt_count
+        self.byte_count += byte_count
         
         # Capture first payload sample (up to 512 bytes)
         if payload and not self.payload_sample:
-            self.payload_sample = payload[:512]
+            self.payload_sample = payload[:PAYLOAD_SAMPLE_SIZE]
+    
+    def to_dict(self) -> Dict:
+        """Convert to a Flow column mapping (for bulk inserts)."""
+        src_ip, src_port, dst_ip, dst_port, proto = self.key
+        return {
+            'src_ip': format_address(src_ip),
+            'src_port': src_port,
+            'dst_ip': format_address(dst_ip),
+            'dst_port': dst_port,
+            'protocol': PROTOCOL_NAMES[proto],
+            'ts_start': datetime.fromtimestamp(self.ts_start),
+            'ts_end': datetime.fromtimestamp(self.ts_end),
+            'pkt_count': self.pkt_count,
+            'byte_count': self.byte_count,
+            'payload_sample': self.payload_sample
+        }
     
     def to_flow_model(self) -> Flow:
         """Convert to SQLAlchemy Flow model."""
-        payload_encoded = None
-        if self.payload_sample:
-            payload_encoded = base64.b64encode(self.payload_sample).decode('utf-8')
-        
-        return Flow(
-            src_ip=self.key.src_ip,
-            src_port=self.key.src_port,
-            dst_ip=self.key.dst_ip,
-            dst_port=self.key.dst_port,
-            protocol=self.key.proto,
-            ts_start=self.ts_start,
-            ts_end=self.ts_end,
-            pkt_count=self.pkt_count,
-            byte_count=self.byte_count,
-            payload_sample=payload_encoded
-        )
+        return Flow(**self.to_dict())
+
+
+def _summarize_batch(linktypes: List[int], timestamps: List[float],
+                     frames: List[bytes]) -> List[FlowSummary]:
+    """Summarize a batch of frames in a worker process."""
+    return PcapIngestor(None)._summarize_batch(linktypes, timestamps, frames)
 
 
 class PcapIngestor:
     """PCAP file ingestion and flow extraction."""
     
-    def __init__(self, db_manager: DatabaseManager, batch_size: int = 1000):
+    # Packets read before they are aggregated into flows
+    PACKET_BATCH_SIZE = 8192
+    
+    # When streaming, flows idle for this long (in capture time) are
+    # written out and dropped from memory
+    FLOW_IDLE_TIMEOUT = 120.0
+    
+    def __init__(self, db_manager: DatabaseManager, batch_size: int = 1000,
+                 session: Optional[Session] = None):
         """
         Initialize PCAP ingestor.
         
         Args:
             db_manager: Database manager instance
-            batch_size: Number of flows to batch before database insert
+            batch_size: Number of active flows at which idle flows are
+                written to the database when streaming
+            session: Optional shared session (a new one is used per flush otherwise)
         """
         self.db_manager = db_manager
+        self.session = session
         self.batch_size = batch_size
+        # Active flows, not yet written to the database
         self.flows: Dict[FlowKey, FlowRecord] = {}
+        # Min-heap of (last seen, key) for the flows updated by each batch;
+        # entries are stale once their flow is updated again or flushed
+        self._last_seen: List[Tuple[float, FlowKey]] = []
+        # Flows written to the database by the current ingest
+        self.flow_count = 0
     
     def process_packet(self, packet: Packet) -> Optional[FlowKey]:
         """
@@ -106,59 +204,484 @@ class PcapIngestor:
         Returns:
             FlowKey if packet was processed, None otherwise
         """
-        # Extract IP layer
-        if IP in packet:
-            ip_layer = packet[IP]
-            src_ip = ip_layer.src
-            dst_ip = ip_layer.dst
-        elif IPv6 in packet:
-            ip_layer = packet[IPv6]
-            src_ip = ip_layer.src
-            dst_ip = ip_layer.dst
-        else:
+        parsed = self._parse_packet(packet)
+        if parsed is None:
             return None
+        flow_key, payload = parsed
+        return self._update_flow(flow_key, float(packet.time), payload, len(packet))
+    
+    def _parse_packet(self, packet: Packet) -> Optional[Tuple[FlowKey, Optional[bytes]]]:
+        """
+        Get the flow key and payload of a Scapy packet.
+        
+        Args:
+            packet: Scapy packet
+        
+        Returns:
+            Tuple of (FlowKey, payload or None), or None if the packet
+            does not belong to a TCP/UDP flow
+        """
+        # Each layer is located with a single walk of the packet
+        # (getlayer) rather than a membership test followed by an index
+        
+        # Extract IP layer
+        ip_layer = packet.getlayer(IP)
+        if ip_layer is None:
+            ip_layer = packet.getlayer(IPv6)
+            if ip_layer is None:
+                return None
         
         # Extract transport layer
-        if TCP in packet:
-            transport = packet[TCP]
-            proto = "TCP"
-            src_port = transport.sport
-            dst_port = transport.dport
-        elif UDP in packet:
-            transport = packet[UDP]
-            proto = "UDP"
-            src_port = transport.sport
-            dst_port = transport.dport
+        transport = packet.getlayer(TCP)
+        if transport is not None:
+            proto = IPPROTO_TCP
         else:
-            return None
+            transport = packet.getlayer(UDP)
+            if transport is None:
+                return None
+            proto = IPPROTO_UDP
         
         # Create flow key
-        flow_key = FlowKey(src_ip, src_port, dst_ip, dst_port, proto)
+        family = socket.AF_INET6 if ip_layer.version == 6 else socket.AF_INET
+        flow_key = (
+            socket.inet_pton(family, ip_layer.src), transport.sport,
+            socket.inet_pton(family, ip_layer.dst), transport.dport, proto
+        )
         
         # Extract payload
         payload = None
-        if Raw in packet:
-            payload = bytes(packet[Raw].load)
+        raw_layer = packet.getlayer(Raw)
+        if raw_layer is not None:
+            payload = bytes(raw_layer.load)
         
-        # Get packet timestamp and size
-        timestamp = float(packet.time)
-        pkt_size = len(packet)
+        return flow_key, payload
+    
+    def process_frame(self, linktype: int, timestamp: float, frame: bytes) -> Optional[FlowKey]:
+        """
+        Process a raw captured frame and update flow records.
         
-        # Update or create flow record
-        if flow_key not in self.flows:
-            self.flows[flow_key] = FlowRecord(flow_key, timestamp)
+        Link, IP and transport headers are read at fixed offsets instead of
+        building a Scapy packet, following IP-in-IP and IPv6 tunnels. Link
+        types not handled here and GRE tunnels are dissected with Scapy.
         
-        self.flows[flow_key].update(timestamp, payload, pkt_size)
+        Args:
+            linktype: Capture link-layer type
+            timestamp: Capture timestamp (seconds since the epoch)
+            frame: Captured bytes
+        
+        Returns:
+            FlowKey if the frame was processed, None otherwise
+        """
+        parsed = self._parse_frame(linktype, frame)
+        if parsed is None:
+            return None
+        flow_key, payload = parsed
+        return self._update_flow(flow_key, timestamp, payload, len(frame))
+    
+    def _parse_frame(self, linktype: int, frame: bytes) -> Optional[Tuple[FlowKey, Optional[bytes]]]:
+        """
+        Get the flow key and payload of a raw captured frame.
+        
+        Args:
+            linktype: Capture link-layer type
+            frame: Captured bytes
+        
+        Returns:
+            Tuple of (FlowKey, payload or None), or None if the frame
+            does not belong to a TCP/UDP flow
+        """
+        # Locate the network header
+        if linktype == LINKTYPE_ETHERNET:
+            if len(frame) < 14:
+                return None
+            ethertype, = struct.unpack_from('!H', frame, 12)
+            offset = 14
+            while ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+                ethertype, = struct.unpack_from('!H', frame, offset + 2)
+                offset += 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if len(frame) < 16:
+                return None
+            ethertype, = struct.unpack_from('!H', frame, 14)
+            offset = 16
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            if not frame:
+                return None
+            version = frame[0] >> 4
+            ethertype = ETHERTYPE_IPV6 if version == 6 else ETHERTYPE_IPV4
+            offset = 0
+        else:
+            return self._parse_packet(self._dissect_frame(linktype, frame))
+        
+        # Locate the transport header, descending through IP-in-IP and
+        # IPv6 tunnels; `end` drops any link-layer padding
+        addresses = None
+        end = len(frame)
+        while True:
+            if ethertype == ETHERTYPE_IPV4:
+                if len(frame) < offset + 20:
+                    return None
+                ihl = (frame[offset] & 0x0F) * 4
+                total_length, = struct.unpack_from('!H', frame, offset + 2)
+                frag, = struct.unpack_from('!H', frame, offset + 6)
+                proto = frame[offset + 9]
+                # Non-first fragments carry no transport header
+                if frag & 0x1FFF:
+                    return None
+                # Like Scapy, key on the outermost IPv4 header if there is one
+                if addresses is None or len(addresses[0]) == 16:
+                    addresses = (frame[offset + 12:offset + 16], frame[offset + 16:offset + 20])
+                if total_length >= ihl:
+                    end = min(end, offset + total_length)
+                offset += ihl
+            elif ethertype == ETHERTYPE_IPV6:
+                if len(frame) < offset + 40:
+                    return None
+                payload_length, = struct.unpack_from('!H', frame, offset + 4)
+                proto = frame[offset + 6]
+                if addresses is None:
+                    addresses = (frame[offset + 8:offset + 24], frame[offset + 24:offset + 40])
+                offset += 40
+                end = min(end, offset + payload_length)
+                while proto in IPV6_EXTENSION_HEADERS or proto == IPV6_FRAGMENT_HEADER:
+                    if len(frame) < offset + 8:
+                        return None
+                    if proto == IPV6_FRAGMENT_HEADER:
+                        frag, = struct.unpack_from('!H', frame, offset + 2)
+                        if frag >> 3:
+                            return None
+                        header_length = 8
+                    else:
+                        header_length = (frame[offset + 1] + 1) * 8
+                    proto = frame[offset]
+                    offset += header_length
+            else:
+                return None
+            
+            if proto == IPPROTO_IPIP:
+                ethertype = ETHERTYPE_IPV4
+            elif proto == IPPROTO_IPV6:
+                ethertype = ETHERTYPE_IPV6
+            elif proto == IPPROTO_GRE:
+                return self._parse_packet(self._dissect_frame(linktype, frame))
+            else:
+                break
+        src_ip, dst_ip = addresses
+        
+        # Read the ports and transport payload
+        if proto == IPPROTO_TCP:
+            if min(end, len(frame)) < offset + 20:
+                return None
+            src_port, dst_port = struct.unpack_from('!HH', frame, offset)
+            payload = frame[offset + (frame[offset + 12] >> 4) * 4:end]
+            flow_key = (src_ip, src_port, dst_ip, dst_port, IPPROTO_TCP)
+        elif proto == IPPROTO_UDP:
+            if min(end, len(frame)) < offset + 8:
+                return None
+            src_port, dst_port, udp_length = struct.unpack_from('!HHH', frame, offset)
+            payload = frame[offset + 8:end][:udp_length - 8]
+            flow_key = (src_ip, src_port, dst_ip, dst_port, IPPROTO_UDP)
+        else:
+            return None
+        
+        return flow_key, payload or None
+    
+    @staticmethod
+    def _dissect_frame(linktype: int, frame: bytes) -> Packet:
+        """Dissect a frame with Scapy."""
+        layer = conf.l2types.num2layer.get(linktype, conf.raw_layer)
+        try:
+            return layer(frame)
+        except Exception:
+            return conf.raw_layer(frame)
+    
+    def _update_flow(self, flow_key: FlowKey, timestamp: float,
+                     payload: Optional[bytes], pkt_size: int) -> FlowKey:
+        """Add a packet to its flow record, creating the record if needed."""
+        # One lookup for existing flows
+        record = self.flows.get(flow_key)
+        if record is None:
+            record = FlowRecord(flow_key, timestamp)
+            self.flows[flow_key] = record
+        
+        record.update(timestamp, payload, pkt_size)
         
         return flow_key
     
-    def ingest_pcap(self, pcap_path: Path, streaming: bool = True) -> int:
+    def _process_batch(self, linktypes: List[int], timestamps: List[float],
+                       frames: List[bytes]):
+        """
+        Parse a batch of captured frames and fold them into the flow records.
+        
+        Args:
+            linktypes: Link-layer type of each frame
+            timestamps: Capture timestamp of each frame
+            frames: Captured bytes of each frame
+        """
+        self._merge_summaries(self._summarize_batch(linktypes, timestamps, frames))
+    
+    def _summarize_batch(self, linktypes: List[int], timestamps: List[float],
+                         frames: List[bytes]) -> List[FlowSummary]:
+        """
+        Parse a batch of captured frames and aggregate them per flow.
+        
+        IPv4 TCP/UDP frames on untagged Ethernet, Linux cooked and raw IP
+        captures are parsed for the whole batch at once with array
+        operations (_parse_headers). The remaining frames go through
+        _parse_frame one at a time.
+        
+        Args:
+            linktypes: Link-layer type of each frame
+            timestamps: Capture timestamp of each frame
+            frames: Captured bytes of each frame
+        
+        Returns:
+            Summary of each flow in the batch, in the order the flows were
+            first seen
+        """
+        if not frames:
+            return []
+        
+        headers = self._parse_headers(linktypes, frames)
+        parsed = np.flatnonzero(headers['parsed'])
+        payload_start = headers['payload_start']
+        payload_end = headers['payload_end']
+        
+        # Batch-local flow number of every packet (-1 for packets not in a flow)
+        batch_flows: Dict[FlowKey, int] = {}
+        numbers = np.full(len(frames), -1, dtype=np.intp)
+        has_payload = payload_end > payload_start
+        
+        # Frames parsed with array operations: one key per distinct 5-tuple
+        if len(parsed):
+            columns = np.empty(len(parsed), dtype=[('addresses', 'u8'), ('ports', 'u8')])
+            columns['addresses'] = (headers['src_ip'][parsed] << 32) | headers['dst_ip'][parsed]
+            columns['ports'] = (
+                (headers['src_port'][parsed] << 24) |
+                (headers['dst_port'][parsed] << 8) |
+                headers['proto'][parsed]
+            )
+            distinct, inverse = np.unique(columns, return_inverse=True)
+            group_numbers = [
+                batch_flows.setdefault((
+                    (addresses >> 32).to_bytes(4, 'big'),
+                    ports >> 24,
+                    (addresses & 0xFFFFFFFF).to_bytes(4, 'big'),
+                    (ports >> 8) & 0xFFFF,
+                    ports & 0xFF
+                ), len(batch_flows))
+                for addresses, ports in distinct.tolist()
+            ]
+            numbers[parsed] = np.asarray(group_numbers, dtype=np.intp)[inverse]
+        
+        # Everything else, frame by frame
+        parse_frame = self._parse_frame
+        payloads: Dict[int, bytes] = {}
+        for index in np.flatnonzero(headers['fallback']).tolist():
+            result = parse_frame(linktypes[index], frames[index])
+            if result is None:
+                continue
+            flow_key, payload = result
+            numbers[index] = batch_flows.setdefault(flow_key, len(batch_flows))
+            if payload:
+                payloads[index] = payload
+                has_payload[index] = True
+        
+        kept = np.flatnonzero(numbers >= 0)
+        if not len(kept):
+            return []
+        
+        def payload_at(position: int) -> bytes:
+            index = int(kept[position])
+            payload = payloads.get(index)
+            if payload is None:
+                start = int(payload_start[index])
+                payload = frames[index][start:int(payload_end[index])]
+            return payload[:PAYLOAD_SAMPLE_SIZE]
+        
+        return self._summarize_flows(
+            list(batch_flows),
+            numbers[kept],
+            np.asarray(timestamps, dtype=np.float64)[kept],
+            headers['length'][kept],
+            has_payload[kept],
+            payload_at
+        )
+    
+    @staticmethod
+    def _parse_headers(linktypes: List[int], frames: List[bytes]) -> Dict[str, np.ndarray]:
+        """
+        Read the IPv4 and TCP/UDP headers of a batch of frames at once.
+        
+        The frames are joined into one byte buffer and each header field is
+        gathered for all frames with a single fancy-indexing read. The
+        checks follow _parse_frame exactly.
+        
+        Args:
+            linktypes: Link-layer type of each frame
+            frames: Captured bytes of each frame
+        
+        Returns:
+            Dict of per-frame columns: ``parsed`` (the 5-tuple and payload
+            bounds columns are valid), ``fallback`` (the frame must go
+            through _parse_frame), ``length``, ``src_ip``, ``dst_ip``,
+            ``src_port``, ``dst_port``, ``proto``, ``payload_start`` and
+            ``payload_end``. Frames that are neither parsed nor fallback
+            carry no flow.
+        """
+        lengths = np.fromiter(map(len, frames), dtype=np.int64, count=len(frames))
+        starts = np.zeros(len(frames), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        # Reads past the end of a short frame stay inside the buffer; their
+        # values are masked out below
+        buffer = np.frombuffer(b''.join(frames) + bytes(HEADER_READ_PADDING), dtype=np.uint8)
+        
+        def u8(offset):
+            return buffer[starts + offset].astype(np.int64)
+        
+        def u16(offset):
+            return (u8(offset) << 8) | u8(offset + 1)
+        
+        # Network header offset of IPv4 frames on the supported link types
+        linktypes = np.asarray(linktypes)
+        ethernet = (linktypes == LINKTYPE_ETHERNET) & (lengths >= 14) & (u16(12) == ETHERTYPE_IPV4)
+        cooked = (linktypes == LINKTYPE_LINUX_SLL) & (lengths >= 16) & (u16(14) == ETHERTYPE_IPV4)
+        raw = (
+            np.isin(linktypes, (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6)) &
+            (lengths >= 1) & (u8(0) >> 4 != 6)
+        )
+        supported = ethernet | cooked | raw
+        network = np.where(ethernet, 14, np.where(cooked, 16, 0))
+        candidate = supported & (lengths >= network + 20)
+        
+        ihl = (u8(network) & 0x0F) * 4
+        total_length = u16(network + 2)
+        fragment = u16(network + 6) & 0x1FFF
+        proto = u8(network + 9)
+        # Tunnels are dissected by Scapy; non-first fragments and other
+        # protocols carry no flow
+        tunnel = candidate & np.isin(proto, IP_TUNNEL_PROTOCOLS)
+        candidate &= ~tunnel & (fragment == 0)
+        
+        end = np.where(total_length >= ihl, network + total_length, lengths)
+        limit = np.minimum(end, lengths)
+        transport = network + ihl
+        tcp = candidate & (proto == IPPROTO_TCP) & (limit >= transport + 20)
+        udp = candidate & (proto == IPPROTO_UDP) & (limit >= transport + 8)
+        
+        # TCP payload follows the data offset; UDP payload is additionally
+        # cut to the UDP length, with the same slicing as _parse_frame
+        udp_start = transport + 8
+        udp_available = np.maximum(limit - udp_start, 0)
+        udp_cut = u16(transport + 4) - 8
+        udp_size = np.where(
+            udp_cut >= 0,
+            np.minimum(udp_available, udp_cut),
+            np.maximum(udp_available + udp_cut, 0)
+        )
+        payload_start = np.where(tcp, transport + (u8(transport + 12) >> 4) * 4, udp_start)
+        payload_end = np.where(tcp, limit, udp_start + udp_size)
+        parsed = tcp | udp
+        
+        return {
+            'parsed': parsed,
+            'fallback': ~supported | tunnel,
+            'length': lengths,
+            'src_ip': (u16(network + 12) << 16) | u16(network + 14),
+            'dst_ip': (u16(network + 16) << 16) | u16(network + 18),
+            'src_port': u16(transport),
+            'dst_port': u16(transport + 2),
+            'proto': proto,
+            'payload_start': np.where(parsed, payload_start, 0),
+            'payload_end': np.where(parsed, payload_end, 0),
+        }
+    
+    @staticmethod
+    def _summarize_flows(flow_keys: List[FlowKey], inverse: np.ndarray,
+                         timestamps: np.ndarray, sizes: np.ndarray,
+                         has_payload: np.ndarray,
+                         payload_at: Callable[[int], bytes]) -> List[FlowSummary]:
+        """
+        Aggregate a batch of parsed packets per flow.
+        
+        Per-flow counts, byte totals, first/last timestamps and first
+        payloads are computed over whole columns instead of packet by
+        packet.
+        
+        Args:
+            flow_keys: Key of each batch-local flow number
+            inverse: Flow number of each packet, in capture order
+            timestamps: Timestamp of each packet
+            sizes: Size of each packet in bytes
+            has_payload: Whether each packet has a non-empty payload
+            payload_at: Returns the payload sample of the packet at a position
+        
+        Returns:
+            Summary of each flow, in the order the flows were first seen
+        """
+        flow_count = len(flow_keys)
+        pkt_counts = np.bincount(inverse, minlength=flow_count)
+        byte_counts = np.bincount(inverse, weights=sizes, minlength=flow_count).astype(np.int64)
+        
+        # First and last packet of each flow (flow numbers run 0..flow_count-1)
+        first = np.unique(inverse, return_index=True)[1]
+        last = len(inverse) - 1 - np.unique(inverse[::-1], return_index=True)[1]
+        ts_first = timestamps[first].tolist()
+        ts_last = timestamps[last].tolist()
+        
+        # First packet with a payload of each flow that has one
+        with_payload = np.flatnonzero(has_payload)
+        payload_flows, payload_first = np.unique(inverse[with_payload], return_index=True)
+        first_payloads = dict(zip(payload_flows.tolist(), with_payload[payload_first].tolist()))
+        
+        pkt_counts = pkt_counts.tolist()
+        byte_counts = byte_counts.tolist()
+        summaries = []
+        for number in np.argsort(first, kind='stable').tolist():
+            position = first_payloads.get(number)
+            summaries.append((
+                flow_keys[number], pkt_counts[number], byte_counts[number],
+                ts_first[number], ts_last[number],
+                payload_at(position) if position is not None else None
+            ))
+        return summaries
+    
+    def _merge_summaries(self, summaries: List[FlowSummary]):
+        """
+        Fold per-batch flow summaries into the flow records.
+        
+        Each flow record is updated once per batch, in the order the
+        flows were first seen.
+        
+        Args:
+            summaries: Flow summaries of one batch
+        """
+        flows = self.flows
+        last_seen = self._last_seen
+        for flow_key, pkt_count, byte_count, ts_first, ts_last, payload in summaries:
+            record = flows.get(flow_key)
+            if record is None:
+                record = FlowRecord(flow_key, ts_first)
+                flows[flow_key] = record
+            record.add_packets(pkt_count, byte_count, ts_last, payload)
+            heapq.heappush(last_seen, (ts_last, flow_key))
+        
+        # Drop stale entries once they outnumber the active flows
+        if len(last_seen) > 2 * len(flows) + self.PACKET_BATCH_SIZE:
+            last_seen[:] = [(record.ts_end, key) for key, record in flows.items()]
+            heapq.heapify(last_seen)
+    
+    def ingest_pcap(self, pcap_path: Path, streaming: bool = True,
+                    workers: int = 1) -> int:
         """
         Ingest PCAP file and extract flows.
         
         Args:
             pcap_path: Path to PCAP file
-            streaming: Use streaming mode for large files
+            streaming: Flush idle flows to the database while reading
+                (otherwise all flows are flushed once at the end)
+            workers: Processes parsing batches of frames in parallel
+                (1 parses in this process)
         
         Returns:
             Number of flows extracted
@@ -166,30 +689,32 @@ class PcapIngestor:
         logger.info(f"Starting PCAP ingestion", file=str(pcap_path))
         
         self.flows.clear()
-        packet_count = 0
+        self._last_seen.clear()
+        self.flow_count = 0
         
         try:
-            if streaming:
-                # Streaming mode for large files
-                with PcapReader(str(pcap_path)) as pcap_reader:
-                    for packet in tqdm(pcap_reader, desc="Processing packets", unit="pkt"):
-                        self.process_packet(packet)
-                        packet_count += 1
-                        
-                        # Periodic batch insert
-                        if len(self.flows) >= self.batch_size:
-                            self._flush_flows()
-            else:
-                # Load entire file (for small PCAPs)
-                packets = rdpcap(str(pcap_path))
-                for packet in tqdm(packets, desc="Processing packets", unit="pkt"):
-                    self.process_packet(packet)
-                    packet_count += 1
+            # Frames are read one at a time as raw bytes; the whole capture
+            # is never held in memory
+            with closing(tqdm(self._read_frames(pcap_path),
+                              desc="Processing packets", unit="pkt")) as progress:
+                batches = self._read_batches(progress)
+                
+                # Frames are aggregated into flows a batch at a time
+                for summaries in self._summarize_batches(batches, workers):
+                    self._merge_summaries(summaries)
+                    
+                    # Periodic batch insert of the flows that went idle
+                    if streaming and summaries and len(self.flows) >= self.batch_size:
+                        capture_time = max(summary[4] for summary in summaries)
+                        self._flush_flows(idle_before=capture_time - self.FLOW_IDLE_TIMEOUT)
+                
+                packet_count = progress.n
             
             # Final flush
             self._flush_flows()
+            self.db_manager.analyze()
             
-            flow_count = len(self.flows)
+            flow_count = self.flow_count
             logger.info(f"PCAP ingestion complete", 
                        packets=packet_count, flows=flow_count)
             
@@ -199,23 +724,188 @@ class PcapIngestor:
             logger.error(f"Error ingesting PCAP: {e}", file=str(pcap_path))
             raise
     
-    def _flush_flows(self):
-        """Flush accumulated flows to database."""
-        if not self.flows:
+    def _read_frames(self, pcap_path: Path) -> Iterator[Tuple[int, float, bytes]]:
+        """
+        Read the frames of a capture file.
+        
+        Uncompressed classic pcap files are memory-mapped and their record
+        headers parsed in place, so reading takes no read() calls or
+        intermediate buffers. pcapng and compressed captures are read with
+        Scapy's RawPcapReader.
+        
+        Args:
+            pcap_path: Path to PCAP file
+        
+        Yields:
+            Tuples of (linktype, timestamp, frame)
+        """
+        with open(pcap_path, 'rb') as pcap_file:
+            header = pcap_file.read(PCAP_HEADER_SIZE)
+            if len(header) == PCAP_HEADER_SIZE and header[:4] in PCAP_MAGIC:
+                with mmap.mmap(pcap_file.fileno(), 0, access=mmap.ACCESS_READ) as capture:
+                    yield from self._read_mapped_frames(capture)
+                return
+        
+        with closing(RawPcapReader(str(pcap_path))) as pcap_reader:
+            frame_info = self._frame_info
+            for frame, metadata in pcap_reader:
+                linktype, timestamp = frame_info(pcap_reader, metadata)
+                yield linktype, timestamp, frame
+    
+    @staticmethod
+    def _read_mapped_frames(capture: mmap.mmap) -> Iterator[Tuple[int, float, bytes]]:
+        """
+        Read the frames of a memory-mapped classic pcap file.
+        
+        Args:
+            capture: The mapped file, starting with a pcap file header
+        
+        Yields:
+            Tuples of (linktype, timestamp, frame)
+        """
+        endian, resolution = PCAP_MAGIC[capture[:4]]
+        linktype, = struct.unpack_from(endian + 'I', capture, PCAP_HEADER_SIZE - 4)
+        record_header = struct.Struct(endian + 'IIII')
+        
+        offset = PCAP_HEADER_SIZE
+        size = len(capture)
+        while offset + record_header.size <= size:
+            sec, fraction, caplen, _ = record_header.unpack_from(capture, offset)
+            offset += record_header.size
+            # A truncated last record ends the capture, as with RawPcapReader
+            if offset + caplen > size:
+                return
+            yield linktype, (sec * resolution + fraction) / resolution, capture[offset:offset + caplen]
+            offset += caplen
+    
+    def _read_batches(self, frames: Iterable[Tuple[int, float, bytes]]
+                      ) -> Iterator[Tuple[List[int], List[float], List[bytes]]]:
+        """
+        Group captured frames into batches of PACKET_BATCH_SIZE.
+        
+        Args:
+            frames: Tuples of (linktype, timestamp, frame)
+        
+        Yields:
+            Tuples of (linktypes, timestamps, frames), in new lists each time
+        """
+        packet_batch_size = self.PACKET_BATCH_SIZE
+        linktypes, timestamps, batch = [], [], []
+        for linktype, timestamp, frame in frames:
+            linktypes.append(linktype)
+            timestamps.append(timestamp)
+            batch.append(frame)
+            if len(batch) >= packet_batch_size:
+                yield linktypes, timestamps, batch
+                linktypes, timestamps, batch = [], [], []
+        if batch:
+            yield linktypes, timestamps, batch
+    
+    def _summarize_batches(self, batches: Iterable[Tuple[List[int], List[float], List[bytes]]],
+                           workers: int) -> Iterator[List[FlowSummary]]:
+        """
+        Summarize batches of frames, in worker processes when workers > 1.
+        
+        Flows are merged in capture order, so results are yielded in the
+        order of the batches. At most two batches per worker are in flight.
+        
+        Args:
+            batches: Tuples of (linktypes, timestamps, frames)
+            workers: Number of worker processes
+        
+        Yields:
+            The flow summaries of each batch
+        """
+        if workers <= 1:
+            for batch in batches:
+                yield self._summarize_batch(*batch)
             return
         
-        session = self.db_manager.get_session()
-        try:
-            flow_models = [flow.to_flow_model() for flow in self.flows.values()]
-            session.bulk_save_objects(flow_models)
-            session.commit()
-            logger.debug(f"Flushed {len(flow_models)} flows to database")
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error flushing flows: {e}")
-            raise
-        finally:
-            session.close()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending: Deque[Future] = deque()
+            for batch in batches:
+                pending.append(executor.submit(_summarize_batch, *batch))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    @staticmethod
+    def _frame_info(pcap_reader: RawPcapReader, metadata) -> Tuple[int, float]:
+        """
+        Get a frame's link type and timestamp from its capture metadata.
+        
+        Args:
+            pcap_reader: Open pcap or pcapng reader
+            metadata: Metadata returned with the frame
+        
+        Returns:
+            Tuple of (linktype, timestamp)
+        """
+        if hasattr(metadata, 'linktype'):
+            # pcapng: per-interface link type and timestamp resolution
+            if metadata.tshigh is None:
+                return metadata.linktype, time.time()
+            ticks = (metadata.tshigh << 32) + metadata.tslow
+            return metadata.linktype, ticks / metadata.tsresol
+        
+        resolution = 1000000000 if pcap_reader.nano else 1000000
+        return (
+            pcap_reader.linktype,
+            (metadata.sec * resolution + metadata.usec) / resolution
+        )
+    
+    def _flush_flows(self, idle_before: Optional[float] = None):
+        """
+        Flush accumulated flows to database and drop them from memory.
+        
+        Args:
+            idle_before: Only flush flows whose last packet is older than
+                this capture time (all flows otherwise)
+        """
+        if idle_before is None:
+            records = list(self.flows.values())
+            self.flows.clear()
+            self._last_seen.clear()
+        else:
+            records = self._pop_idle_flows(idle_before)
+        
+        if not records:
+            return
+        
+        with self.db_manager.session_scope(self.session) as session:
+            try:
+                # A Core executemany; no ORM state is built for the rows
+                rows = [flow.to_dict() for flow in records]
+                session.execute(Flow.__table__.insert(), rows)
+                session.commit()
+                self.flow_count += len(rows)
+                logger.debug(f"Flushed {len(rows)} flows to database")
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error flushing flows: {e}")
+                raise
+    
+    def _pop_idle_flows(self, idle_before: float) -> List[FlowRecord]:
+        """
+        Remove the flows whose last packet is older than a capture time.
+        
+        Args:
+            idle_before: Capture time (seconds since the epoch)
+        
+        Returns:
+            The removed flow records
+        """
+        flows = self.flows
+        last_seen = self._last_seen
+        records = []
+        while last_seen and last_seen[0][0] < idle_before:
+            timestamp, flow_key = heapq.heappop(last_seen)
+            record = flows.get(flow_key)
+            # Skip entries superseded by a later update or a flushed flow
+            if record is not None and record.ts_end == timestamp:
+                records.append(flows.pop(flow_key))
+        return records
 
 
 @click.command()
@@ -224,10 +914,12 @@ class PcapIngestor:
 @click.option('--db', '-d', 'db_path', default='tor_analysis.db',
               help='Database path (default: tor_analysis.db)')
 @click.option('--streaming/--no-streaming', default=True,
-              help='Use streaming mode for large files')
+              help='Flush flows in batches while reading')
 @click.option('--batch-size', '-b', default=1000, type=int,
               help='Batch size for database inserts')
-def main(pcap_file: str, db_path: str, streaming: bool, batch_size: int):
+@click.option('--workers', '-w', default=os.cpu_count() or 1, type=int,
+              help='Processes parsing packets in parallel (default: CPU count)')
+def main(pcap_file: str, db_path: str, streaming: bool, batch_size: int, workers: int):
     """
     Ingest PCAP file and extract network flows.
     
@@ -242,7 +934,7 @@ def main(pcap_file: str, db_path: str, streaming: bool, batch_size: int):
     
     # Ingest PCAP
     ingestor = PcapIngestor(db_manager, batch_size=batch_size)
-    flow_count = ingestor.ingest_pcap(Path(pcap_file), streaming=streaming)
+    flow_count = ingestor.ingest_pcap(Path(pcap_file), streaming=streaming, workers=workers)
     
     click.echo(f"✓ Ingested {flow_count} flows from {pcap_file}")
 
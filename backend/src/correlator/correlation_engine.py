@@ -2,15 +2,18 @@
 Correlation engine for identifying TOR entry/exit flow patterns.
 """
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional, Set
-from collections import defaultdict
+import socket
+from datetime import timedelta
+from typing import Iterable, List, Dict, Tuple, Optional
+import numpy as np
 import networkx as nx
 
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
 
-from src.db.models import Flow, TorNode, Correlation, DatabaseManager
+from src.db.models import (
+    Flow, TorNode, Correlation, DatabaseManager, TOR_CANDIDATE_FILTER
+)
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -19,258 +22,572 @@ logger = get_logger(__name__)
 class CorrelationEngine:
     """Correlate flows to identify TOR usage patterns."""
     
-    def __init__(self, db_manager: DatabaseManager, time_window_seconds: int = 10):
+    # Correlation rows buffered per bulk insert
+    INSERT_BATCH_SIZE = 5000
+    
+    # Coarse text prefixes of the private ranges, used to skip external
+    # sources in SQL; _internal_ip_mask makes the exact decision
+    INTERNAL_PREFIXES = ('10.', '172.', '192.168.')
+    
+    # Timing score by time-difference band: <1s, <5s, <10s, otherwise
+    TIMING_BANDS_NS = np.array([1, 5, 10], dtype=np.int64) * 10**9
+    TIMING_SCORES = np.array([0.4, 0.3, 0.2, 0.1])
+    
+    # Per-flow columns read from the database by _build_flow_arrays
+    FLOW_ARRAY_DTYPES = {
+        'id': np.int64,
+        'ts': np.int64,
+        'src_ip': np.uint32,
+        'pkt_count': np.float64,
+        'byte_count': np.float64,
+        'dst_relay': bool,
+        'dst_guard': bool,
+        'dst_exit': bool,
+    }
+    
+    def __init__(self, db_manager: DatabaseManager, time_window_seconds: int = 10,
+                 session: Optional[Session] = None):
         """
         Initialize correlation engine.
         
         Args:
             db_manager: Database manager instance
             time_window_seconds: Time window for correlation (default: 10s)
+            session: Optional shared session (a new one is used per call otherwise)
         """
         self.db_manager = db_manager
+        self.session = session
         self.time_window = timedelta(seconds=time_window_seconds)
-        self.correlation_graph = nx.Graph()
+        
+        # Timestamps are compared as int64 nanoseconds in the sweep
+        self.time_window_ns = self.time_window // timedelta(microseconds=1) * 1000
+        
+        # Union-find over correlated flows: flow ID -> node index, and each
+        # node's parent. Chains are read off it without keeping the edges.
+        self._chain_index: Dict[int, int] = {}
+        self._chain_ids: List[int] = []
+        self._chain_parent: List[int] = []
+        self._correlation_graph: Optional[nx.Graph] = None
     
     def correlate_flows(self, min_correlation_weight: float = 0.3) -> int:
         """
         Correlate all flows to identify TOR entry/exit patterns.
         
+        Flows are swept in time order as NumPy column arrays: for each flow the
+        partners inside the time window form a contiguous slice, which is
+        scored in one vectorized pass instead of pair by pair.
+        
         Args:
             min_correlation_weight: Minimum correlation weight to persist
         
         Returns:
             Number of correlations found
         """
-        session = self.db_manager.get_session()
-        correlation_count = 0
+        with self.db_manager.session_scope(self.session) as session:
+            correlation_count = 0
+            pending: List[Dict] = []
         
-        try:
-            # Get all TOR-related flows
-            tor_flows = session.query(Flow).filter(
-                or_(
-                    Flow.possible_tor_handshake == True,
-                    Flow.relay_comm == True,
-                    Flow.directory_fetch == True,
-                    Flow.obfsproxy_candidate == True
-                )
-            ).order_by(Flow.ts_start).all()
-            
-            logger.info(f"Correlating {len(tor_flows)} TOR-related flows")
+            try:
+                # Load the relay table once instead of querying it per pair
+                tor_index = self._load_tor_index(session)
+                
+                arrays = self._build_flow_arrays(self._iter_tor_flows(session), tor_index)
+                
+                # Only correlate flows from internal IPs
+                internal = self._internal_ip_mask(arrays['src_ip'])
+                arrays = {name: column[internal] for name, column in arrays.items()}
+                flow_ids = arrays['id'].tolist()
+                
+                logger.info(f"Correlating {len(flow_ids)} internal TOR-related flows")
+                
+                ts = arrays['ts']
+                window_ns = self.time_window_ns
             
-            # Get internal IP ranges (simplified: assume 10.x, 192.168.x, 172.16-31.x)
-            internal_ips = self._get_internal_ips(session)
+                # Flows are sorted by time, so each window is a contiguous slice
+                window_ends = np.searchsorted(ts, ts + window_ns, side='right')
+                scratch = self._allocate_scratch(window_ends)
             
-            # Build correlation graph
-            for i, flow1 in enumerate(tor_flows):
-                # Only correlate flows from internal IPs
-                if not self._is_internal_ip(flow1.src_ip, internal_ips):
-                    continue
+                # Sweep in time buckets of two windows: each bucket only touches
+                # its own anchors plus a one-window tail of partners
+                for block_start, block_stop in self._time_buckets(ts, 2 * window_ns):
+                    block_end = int(window_ends[block_stop - 1])
+                    block = {
+                        name: column[block_start:block_end]
+                        for name, column in arrays.items()
+                    }
                 
-                # Find potential correlated flows within time window
-                for flow2 in tor_flows[i+1:]:
-                    if not self._is_internal_ip(flow2.src_ip, internal_ips):
-                        continue
-                    
-                    # Check time window
-                    time_diff = abs((flow2.ts_start - flow1.ts_start).total_seconds())
-                    if time_diff > self.time_window.total_seconds():
-                        break  # Flows are sorted by time
+                    for i in range(block_start, block_stop):
+                        j_end = int(window_ends[i])
+                        if j_end <= i + 1:
+                            continue
                     
-                    # Calculate correlation weight
-                    weight, evidence = self._calculate_correlation(
-                        flow1, flow2, session
-                    )
-                    
-                    if weight >= min_correlation_weight:
-                        # Create correlation record
-                        correlation = Correlation(
-                            flow_id=flow1.id,
-                            correlated_flow_id=flow2.id,
-                            correlation_weight=weight,
-                            correlation_type=evidence.get('type', 'timing'),
-                            evidence=evidence
+                        flow_id = flow_ids[i]
+                        pairs = self._correlate_anchor(
+                            block, i - block_start, j_end - block_start, scratch,
+                            min_correlation_weight
                         )
-                        session.add(correlation)
                         
-                        # Add to graph
-                        self.correlation_graph.add_edge(
-                            flow1.id, flow2.id, weight=weight
-                        )
+                        for k, weight, evidence in pairs:
+                            correlated_flow_id = flow_ids[i + 1 + k]
+                            
+                            # Queue correlation record for bulk insert
+                            pending.append({
+                                'flow_id': flow_id,
+                                'correlated_flow_id': correlated_flow_id,
+                                'correlation_weight': weight,
+                                'correlation_type': evidence.get('type', 'timing'),
+                                'evidence': evidence
+                            })
+                        
+                            # Merge the two flows' chains
+                            self._union(flow_id, correlated_flow_id)
                         
-                        correlation_count += 1
+                            correlation_count += 1
+                        
+                            if len(pending) >= self.INSERT_BATCH_SIZE:
+                                session.bulk_insert_mappings(Correlation, pending)
+                                pending.clear()
+            
+                if pending:
+                    session.bulk_insert_mappings(Correlation, pending)
             
-            session.commit()
-            logger.info(f"Created {correlation_count} correlations")
-            return correlation_count
+                session.commit()
+                self._correlation_graph = None
+                logger.info(f"Created {correlation_count} correlations")
+                return correlation_count
             
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error correlating flows: {e}")
-            raise
-        finally:
-            session.close()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error correlating flows: {e}")
+                raise
+    
+    def _correlate_anchor(
+        self,
+        block: Dict[str, np.ndarray],
+        i: int,
+        j_end: int,
+        scratch: Dict[str, np.ndarray],
+        min_correlation_weight: float
+    ):
+        """
+        Score one anchor flow against its window and yield surviving pairs.
+        
+        Args:
+            block: Column views for the current time bucket
+            i: Block-local index of the anchor flow
+            j_end: Block-local end (exclusive) of the anchor's window
+            scratch: Reusable buffers from ``_allocate_scratch``
+            min_correlation_weight: Minimum correlation weight to keep
+        
+        Yields:
+            Tuples of (partner index within the window, weight, evidence)
+        """
+        scores = self._score_window(block, i, j_end, scratch)
+        
+        # Entry/exit adds 0.3, so only pairs that could reach the
+        # threshold with it need the relay pattern check
+        candidates = np.flatnonzero(scores['best_case'] >= min_correlation_weight)
+        if not len(candidates):
+            return
+        
+        entry_exit = self._entry_exit_mask(block, i, candidates + i + 1)
+        weights = (
+            scores['timing'][candidates]
+            + np.where(entry_exit, 0.3, 0.0)
+            + scores['size'][candidates]
+            + scores['same_source'][candidates]
+        )
+        
+        for k, weight, is_entry_exit in zip(
+            candidates.tolist(), weights.tolist(), entry_exit.tolist()
+        ):
+            if weight >= min_correlation_weight:
+                yield k, weight, self._build_evidence(scores, k, is_entry_exit)
     
-    def _calculate_correlation(
-        self, 
-        flow1: Flow, 
-        flow2: Flow, 
-        session: Session
-    ) -> Tuple[float, Dict]:
+    @staticmethod
+    def _time_buckets(ts: np.ndarray, width: int):
         """
-        Calculate correlation weight between two flows.
+        Split time-sorted flows into contiguous buckets of fixed duration.
+        
+        Args:
+            ts: Sorted start times in nanoseconds
+            width: Bucket duration in nanoseconds
+        
+        Yields:
+            (start, stop) index ranges of non-empty buckets
+        """
+        if len(ts) == 0:
+            return
+        
+        bucket_ids = (ts - ts[0]) // max(width, 1)
+        bounds = np.flatnonzero(np.diff(bucket_ids)) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [len(ts)]))
+        
+        yield from zip(starts.tolist(), stops.tolist())
+    
+    @staticmethod
+    def _allocate_scratch(window_ends: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Allocate score buffers sized for the widest window, reused per anchor.
+        
+        Args:
+            window_ends: End (exclusive) of each flow's window slice
+        
+        Returns:
+            Dictionary of scratch arrays
+        """
+        n = len(window_ends)
+        size = int((window_ends - np.arange(n) - 1).max()) if n else 0
+        
+        return {
+            'dt': np.empty(size, dtype=np.int64),
+            'timing': np.empty(size),
+            'has_size': np.empty(size, dtype=bool),
+            'smaller': np.empty(size),
+            'larger': np.empty(size),
+            'nonzero': np.empty(size, dtype=bool),
+            'size': np.empty(size),
+            'same': np.empty(size, dtype=bool),
+            'same_source': np.empty(size),
+            'best_case': np.empty(size),
+        }
+    
+    def _iter_tor_flows(self, session: Session, chunk_size: int = 10000):
+        """
+        Stream TOR-related flows in start-time order.
+        
+        Only the columns used for correlation are selected, sources that
+        cannot be internal are dropped in SQL, and rows are fetched in
+        chunks as lightweight tuples rather than ORM objects.
         
         Args:
-            flow1: First flow
-            flow2: Second flow
             session: Database session
+            chunk_size: Number of rows fetched per round-trip
+        
+        Yields:
+            Chunks of flow rows with id, ts_start, src_ip, dst_ip, pkt_count
+            and byte_count
+        """
+        query = session.query(
+            Flow.id, Flow.ts_start, Flow.src_ip, Flow.dst_ip,
+            Flow.pkt_count, Flow.byte_count
+        ).filter(
+            TOR_CANDIDATE_FILTER,
+            or_(*(Flow.src_ip.like(prefix + '%') for prefix in self.INTERNAL_PREFIXES))
+        ).order_by(Flow.ts_start, Flow.id)
+        
+        yield from session.execute(
+            query.statement.execution_options(yield_per=chunk_size)
+        ).partitions()
+    
+    def _build_flow_arrays(
+        self,
+        chunks: Iterable[List],
+        tor_index: Dict[str, Tuple[bool, bool]]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Materialize flow rows as parallel (structure-of-arrays) columns.
+        
+        Each chunk is converted as it arrives, so only one chunk of rows is
+        held alongside the arrays.
+        
+        Args:
+            chunks: Chunks of flow rows sorted by start time
+            tor_index: Relay lookup from ``_load_tor_index``
         
         Returns:
-            Tuple of (correlation_weight, evidence_dict)
+            Dictionary of NumPy column arrays
+        """
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in self.FLOW_ARRAY_DTYPES}
+        
+        for flows in chunks:
+            n = len(flows)
+            relays = [tor_index.get(flow.dst_ip) for flow in flows]
+            
+            parts['id'].append(np.fromiter((flow.id for flow in flows), dtype=np.int64, count=n))
+            parts['ts'].append(np.array(
+                [flow.ts_start for flow in flows], dtype='datetime64[ns]'
+            ).astype(np.int64))
+            parts['src_ip'].append(np.fromiter(
+                (self._ip_to_int(flow.src_ip) for flow in flows),
+                dtype=np.uint32, count=n
+            ))
+            parts['pkt_count'].append(np.fromiter(
+                (flow.pkt_count or 0 for flow in flows), dtype=np.float64, count=n
+            ))
+            parts['byte_count'].append(np.fromiter(
+                (flow.byte_count or 0 for flow in flows), dtype=np.float64, count=n
+            ))
+            
+            # Relay flags of each destination, for the entry/exit pattern
+            parts['dst_relay'].append(np.fromiter(
+                (relay is not None for relay in relays), dtype=bool, count=n
+            ))
+            parts['dst_guard'].append(np.fromiter(
+                (relay is not None and relay[0] for relay in relays), dtype=bool, count=n
+            ))
+            parts['dst_exit'].append(np.fromiter(
+                (relay is not None and relay[1] for relay in relays), dtype=bool, count=n
+            ))
+        
+        arrays = {
+            name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+            for name, dtype in self.FLOW_ARRAY_DTYPES.items()
+        }
+        n = len(arrays['id'])
+        
+        # Average packet size, computed once per flow rather than per pair
+        has_pkts = arrays['pkt_count'] > 0
+        arrays['has_pkts'] = has_pkts
+        arrays['avg_size'] = np.divide(
+            arrays['byte_count'], arrays['pkt_count'],
+            out=np.zeros(n), where=has_pkts
+        )
+        
+        return arrays
+    
+    def _score_window(
+        self,
+        arrays: Dict[str, np.ndarray],
+        i: int,
+        j_end: int,
+        scratch: Dict[str, np.ndarray]
+    ) -> Dict[str, np.ndarray]:
         """
-        weight = 0.0
-        evidence = {}
+        Score flow ``i`` against every later flow in its time window.
+        
+        Args:
+            arrays: Flow column arrays from ``_build_flow_arrays``
+            i: Index of the anchor flow
+            j_end: End (exclusive) of the window slice
+            scratch: Reusable buffers from ``_allocate_scratch``
+        
+        Returns:
+            Dictionary of per-partner score component arrays (views into
+            ``scratch``, valid until the next call)
+        """
+        window = slice(i + 1, j_end)
+        m = j_end - i - 1
+        out = {name: buffer[:m] for name, buffer in scratch.items()}
         
         # Timing correlation (0-0.4)
-        time_diff = abs((flow2.ts_start - flow1.ts_start).total_seconds())
-        if time_diff < 1.0:
-            timing_score = 0.4
-        elif time_diff < 5.0:
-            timing_score = 0.3
-        elif time_diff < 10.0:
-            timing_score = 0.2
-        else:
-            timing_score = 0.1
-        
-        weight += timing_score
-        evidence['timing_diff_seconds'] = time_diff
-        evidence['timing_score'] = timing_score
-        
-        # Check for entry/exit pattern
-        # Flow1 to guard node, Flow2 to exit/target
-        is_entry_exit = self._check_entry_exit_pattern(flow1, flow2, session)
+        dt = np.subtract(arrays['ts'][window], arrays['ts'][i], out=out['dt'])
+        band = np.searchsorted(self.TIMING_BANDS_NS, dt, side='right')
+        timing = np.take(self.TIMING_SCORES, band, out=out['timing'])
+        
+        # Packet size similarity (0-0.2). Flows without packets have an
+        # average size of 0, which scores 0 without a separate branch.
+        has_size = np.logical_and(
+            arrays['has_pkts'][window], arrays['has_pkts'][i], out=out['has_size']
+        )
+        avg_size1 = arrays['avg_size'][i]
+        avg_size2 = arrays['avg_size'][window]
+        smaller = np.minimum(avg_size1, avg_size2, out=out['smaller'])
+        larger = np.maximum(avg_size1, avg_size2, out=out['larger'])
+        size = out['size']
+        size.fill(0.0)
+        np.divide(
+            smaller, larger, out=size,
+            where=np.greater(larger, 0, out=out['nonzero'])
+        )
+        size *= 0.2
+        
+        # Same source IP (different flows from same host)
+        same = np.equal(arrays['src_ip'][window], arrays['src_ip'][i], out=out['same'])
+        same_source = np.multiply(same, 0.1, out=out['same_source'])
+        
+        # Weight if the pair also matched the entry/exit pattern
+        best_case = np.add(timing, 0.3, out=out['best_case'])
+        best_case += size
+        best_case += same_source
+        
+        return {
+            'dt': dt,
+            'timing': timing,
+            'has_size': has_size,
+            'size': size,
+            'same_source': same_source,
+            'best_case': best_case,
+        }
+    
+    def _build_evidence(
+        self,
+        scores: Dict[str, np.ndarray],
+        k: int,
+        is_entry_exit: bool
+    ) -> Dict:
+        """
+        Build the evidence dictionary for one scored pair.
+        
+        Args:
+            scores: Score arrays from ``_score_window``
+            k: Index of the partner within the window
+            is_entry_exit: Whether the pair matches the entry/exit pattern
+        
+        Returns:
+            Evidence dictionary
+        """
+        evidence = {
+            'timing_diff_seconds': int(scores['dt'][k]) // 1000 / 10**6,
+            'timing_score': float(scores['timing'][k]),
+        }
+        
         if is_entry_exit:
-            weight += 0.3
             evidence['type'] = 'entry_exit'
             evidence['entry_exit_pattern'] = True
         
-        # Packet size similarity (0-0.2)
-        if flow1.pkt_count > 0 and flow2.pkt_count > 0:
-            avg_size1 = flow1.byte_count / flow1.pkt_count
-            avg_size2 = flow2.byte_count / flow2.pkt_count
-            
-            size_ratio = min(avg_size1, avg_size2) / max(avg_size1, avg_size2)
-            size_score = size_ratio * 0.2
-            
-            weight += size_score
-            evidence['size_similarity'] = size_score
+        if scores['has_size'][k]:
+            evidence['size_similarity'] = float(scores['size'][k])
         
-        # Same source IP (different flows from same host)
-        if flow1.src_ip == flow2.src_ip:
-            weight += 0.1
+        if scores['same_source'][k]:
             evidence['same_source'] = True
         
-        return weight, evidence
+        return evidence
     
-    def _check_entry_exit_pattern(
-        self, 
-        flow1: Flow, 
-        flow2: Flow, 
-        session: Session
-    ) -> bool:
+    def _load_tor_index(self, session: Session) -> Dict[str, Tuple[bool, bool]]:
         """
-        Check if flows match TOR entry/exit pattern.
+        Load all known TOR relays into an in-memory lookup.
         
         Args:
-            flow1: First flow
-            flow2: Second flow
             session: Database session
         
         Returns:
-            True if pattern matches
+            Mapping of relay IP address to its (is_guard, is_exit) flags
         """
-        # Get TOR nodes
-        tor_node1 = session.query(TorNode).filter_by(
-            ip_address=flow1.dst_ip
-        ).first()
+        rows = session.query(
+            TorNode.ip_address, TorNode.is_guard, TorNode.is_exit
+        ).all()
+        return {
+            ip: (bool(is_guard), bool(is_exit)) for ip, is_guard, is_exit in rows
+        }
+    
+    @staticmethod
+    def _entry_exit_mask(arrays: Dict[str, np.ndarray], i: int, partners: np.ndarray) -> np.ndarray:
+        """
+        Check which partners form a TOR entry/exit pattern with flow ``i``.
         
-        tor_node2 = session.query(TorNode).filter_by(
-            ip_address=flow2.dst_ip
-        ).first()
+        Args:
+            arrays: Flow column arrays from ``_build_flow_arrays``
+            i: Index of the anchor flow
+            partners: Indices of the partner flows
         
-        # Pattern 1: Flow1 to Guard, Flow2 to Exit
-        if tor_node1 and tor_node1.flags:
-            if 'Guard' in tor_node1.flags:
-                if tor_node2 and 'Exit' in tor_node2.flags:
-                    return True
+        Returns:
+            Boolean mask over ``partners``
+        """
+        # Pattern 1: anchor to a Guard, partner to an Exit
+        # Pattern 2: anchor to any relay, partner to non-TOR (exit traffic)
+        return (
+            (arrays['dst_guard'][i] & arrays['dst_exit'][partners])
+            | (arrays['dst_relay'][i] & ~arrays['dst_relay'][partners])
+        )
+    
+    @staticmethod
+    def _internal_ip_mask(ips: np.ndarray) -> np.ndarray:
+        """
+        Test packed IPv4 addresses against the private (RFC 1918) ranges.
         
-        # Pattern 2: Flow1 to any relay, Flow2 to non-TOR (exit traffic)
-        if tor_node1 and not tor_node2:
-            return True
+        Args:
+            ips: Addresses packed as uint32 (see ``_ip_to_int``)
         
-        return False
+        Returns:
+            Boolean mask of internal addresses
+        """
+        return (
+            ((ips & 0xFF000000) == 0x0A000000)      # 10.0.0.0/8
+            | ((ips & 0xFFF00000) == 0xAC100000)    # 172.16.0.0/12
+            | ((ips & 0xFFFF0000) == 0xC0A80000)    # 192.168.0.0/16
+        )
     
-    def _get_internal_ips(self, session: Session) -> Set[str]:
+    @staticmethod
+    def _ip_to_int(ip: str) -> int:
         """
-        Get set of internal IP addresses from flows.
+        Pack an IPv4 address into an unsigned 32-bit integer.
         
         Args:
-            session: Database session
+            ip: IP address string
         
         Returns:
-            Set of internal IP addresses
+            Integer address, or 0 for non-IPv4 addresses
         """
-        internal_ips = set()
-        
-        # Get all unique source IPs
-        flows = session.query(Flow.src_ip).distinct().all()
+        try:
+            return int.from_bytes(socket.inet_aton(ip), 'big')
+        except OSError:
+            return 0
+    
+    def _chain_node(self, flow_id: int) -> int:
+        """
+        Get (or register) the union-find node for a flow.
         
-        for (src_ip,) in flows:
-            if self._is_internal_ip(src_ip):
-                internal_ips.add(src_ip)
+        Args:
+            flow_id: Flow ID
         
-        return internal_ips
+        Returns:
+            Node index
+        """
+        node = self._chain_index.get(flow_id)
+        if node is None:
+            node = len(self._chain_ids)
+            self._chain_index[flow_id] = node
+            self._chain_ids.append(flow_id)
+            self._chain_parent.append(node)
+        return node
     
-    def _is_internal_ip(
-        self, 
-        ip: str, 
-        known_internal: Optional[Set[str]] = None
-    ) -> bool:
+    def _find(self, node: int) -> int:
         """
-        Check if IP is internal/private.
+        Find the root of a node's chain, compressing the path behind it.
         
         Args:
-            ip: IP address string
-            known_internal: Optional set of known internal IPs
+            node: Node index
         
         Returns:
-            True if IP is internal
-        """
-        if known_internal and ip in known_internal:
-            return True
-        
-        # Check common private ranges
-        if ip.startswith('10.'):
-            return True
-        if ip.startswith('192.168.'):
-            return True
-        if ip.startswith('172.'):
-            # Check 172.16.0.0 - 172.31.255.255
-            parts = ip.split('.')
-            if len(parts) >= 2:
-                second_octet = int(parts[1])
-                if 16 <= second_octet <= 31:
-                    return True
-        
-        return False
+            Root node index
+        """
+        parent = self._chain_parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+    
+    def _union(self, flow_id1: int, flow_id2: int):
+        """
+        Merge the chains containing two correlated flows.
+        
+        Args:
+            flow_id1: First flow ID
+            flow_id2: Second flow ID
+        """
+        root1 = self._find(self._chain_node(flow_id1))
+        root2 = self._find(self._chain_node(flow_id2))
+        if root1 != root2:
+            self._chain_parent[max(root1, root2)] = min(root1, root2)
     
     def get_correlation_graph(self) -> nx.Graph:
         """
         Get the correlation graph.
         
+        The graph is built on first access from the persisted correlations
+        between flows correlated by this engine, and cached until the next
+        correlation run.
+        
         Returns:
             NetworkX graph of correlations
         """
-        return self.correlation_graph
+        if self._correlation_graph is None:
+            graph = nx.Graph()
+            with self.db_manager.session_scope(self.session) as session:
+                rows = session.query(
+                    Correlation.flow_id,
+                    Correlation.correlated_flow_id,
+                    Correlation.correlation_weight
+                ).order_by(Correlation.id).yield_per(10000)
+                graph.add_weighted_edges_from(
+                    row for row in rows if row[0] in self._chain_index
+                )
+            self._correlation_graph = graph
+        return self._correlation_graph
     
     def find_suspicious_chains(self, min_chain_length: int = 2) -> List[List[int]]:
         """
@@ -282,36 +599,64 @@ class CorrelationEngine:
         Returns:
             List of flow ID chains
         """
-        chains = []
-        
-        # Find connected components
-        for component in nx.connected_components(self.correlation_graph):
-            if len(component) >= min_chain_length:
-                chains.append(list(component))
-        
-        return chains
+        if not self._chain_ids:
+            return []
+        
+        # Label every node with its chain root, then group IDs by label
+        labels = np.fromiter(
+            (self._find(node) for node in range(len(self._chain_ids))),
+            dtype=np.int64, count=len(self._chain_ids)
+        )
+        order = np.argsort(labels, kind='stable')
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        chains = np.split(np.array(self._chain_ids, dtype=np.int64)[order], boundaries)
+        
+        return [
+            chain.tolist() for chain in chains
+            if len(chain) >= min_chain_length
+        ]
     
-    def get_flow_correlations(self, flow_id: int) -> List[Correlation]:
+    def get_flow_correlations(
+        self,
+        flow_id: int,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Correlation]:
         """
         Get all correlations for a specific flow.
         
+        Both related flows are eager-loaded, so they can be accessed after the
+        session is closed. Results are ordered by correlation ID for keyset
+        pagination.
+        
         Args:
             flow_id: Flow ID
+            after_id: Only return correlations with an ID greater than this
+            limit: Maximum number of correlations to return
         
         Returns:
             List of Correlation objects
         """
-        session = self.db_manager.get_session()
-        try:
-            correlations = session.query(Correlation).filter(
+        with self.db_manager.session_scope(self.session) as session:
+            query = session.query(Correlation).options(
+                selectinload(Correlation.flow),
+                selectinload(Correlation.correlated_flow)
+            ).filter(
                 or_(
                     Correlation.flow_id == flow_id,
                     Correlation.correlated_flow_id == flow_id
                 )
-            ).all()
-            return correlations
-        finally:
-            session.close()
+            )
+            
+            if after_id is not None:
+                query = query.filter(Correlation.id > after_id)
+            
+            query = query.order_by(Correlation.id)
+            
+            if limit is not None:
+                query = query.limit(limit)
+            
+            return query.all()
 
 
 if __name__ == '__main__':
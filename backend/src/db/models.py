@@ -2,15 +2,28 @@
 SQLAlchemy database models for TOR analysis.
 """
 
+import base64
+import json
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Float, DateTime, 
-    Boolean, Text, ForeignKey, JSON
+    create_engine, Column, Computed, Integer, String, Float, DateTime, 
+    Boolean, Text, LargeBinary, ForeignKey, JSON, Index, case, cast, event, inspect, or_,
+    text, update
 )
-from sqlalchemy.orm import relationship, sessionmaker, Session, DeclarativeBase
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import relationship, sessionmaker, Session, DeclarativeBase, validates
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON column (de)serialization
+    orjson = None
+
 class Base(DeclarativeBase):
     """Base class for all models."""
     pass
@@ -26,11 +39,16 @@ class Flow(Base):
     dst_ip = Column(String(45), nullable=False, index=True)
     dst_port = Column(Integer, nullable=False)
     protocol = Column(String(10), nullable=False)
+    
+    # "ip:port" display strings, generated by the database (virtual on SQLite)
+    endpoint_src = Column(String(51), Computed("src_ip || ':' || CAST(src_port AS VARCHAR)"))
+    endpoint_dst = Column(String(51), Computed("dst_ip || ':' || CAST(dst_port AS VARCHAR)"))
+    
     ts_start = Column(DateTime, nullable=False, index=True)
     ts_end = Column(DateTime)
     pkt_count = Column(Integer, default=0)
     byte_count = Column(Integer, default=0)
-    payload_sample = Column(Text)  # Hex/base64 encoded
+    payload_sample = Column(LargeBinary)  # First payload bytes, raw
     
     # TOR-specific flags
     possible_tor_handshake = Column(Boolean, default=False)
@@ -49,10 +67,48 @@ class Flow(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    @property
+    def payload_bytes(self) -> Optional[bytes]:
+        """Payload sample bytes (the column stores them raw)."""
+        return self.payload_sample
+    
     def __repr__(self):
         return f"<Flow {self.src_ip}:{self.src_port} -> {self.dst_ip}:{self.dst_port}>"
 
 
+# Flows carrying any TOR indicator. Shared by the correlator's candidate
+# query and its partial index so SQLite can match the two.
+TOR_CANDIDATE_FILTER = or_(
+    Flow.possible_tor_handshake == True,
+    Flow.relay_comm == True,
+    Flow.directory_fetch == True,
+    Flow.obfsproxy_candidate == True
+)
+
+Index(
+    'ix_flows_tor_candidate', Flow.ts_start,
+    sqlite_where=TOR_CANDIDATE_FILTER,
+    postgresql_where=TOR_CANDIDATE_FILTER
+)
+
+# Flows scored as suspect. Shared by the API's suspect counts and timeline
+# and the timeline's partial index.
+SUSPECT_FILTER = Flow.confidence_score >= 30.0
+
+Index(
+    'ix_flows_suspect_ts_start', Flow.ts_start,
+    sqlite_where=SUSPECT_FILTER,
+    postgresql_where=SUSPECT_FILTER
+)
+
+# Strongest-first listings. Descending, so a forward scan also yields ties in
+# id order and the dashboard's paged "score DESC, id" listing needs no sort.
+Index('ix_flows_confidence_score', Flow.confidence_score.desc())
+
+# Category filter with the score ordering the flow listing uses
+Index('ix_flows_category_score', Flow.confidence_category, Flow.confidence_score)
+
+
 class TorNode(Base):
     """TOR relay node information."""
     __tablename__ = 'tor_nodes'
@@ -63,6 +119,13 @@ class TorNode(Base):
     fingerprint = Column(String(40), unique=True)
     nickname = Column(String(100))
     flags = Column(JSON)  # Guard, Exit, Fast, Stable, etc.
+    
+    # Indexed copies of the common relay flags, kept in sync with `flags`
+    is_guard = Column(Boolean, default=False, index=True)
+    is_exit = Column(Boolean, default=False, index=True)
+    is_fast = Column(Boolean, default=False, index=True)
+    is_stable = Column(Boolean, default=False, index=True)
+    
     country_code = Column(String(2))
     asn = Column(String(20))
     bandwidth = Column(Integer)
@@ -71,6 +134,28 @@ class TorNode(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Relay flag -> boolean column mirroring it
+    FLAG_COLUMNS = {
+        'Guard': 'is_guard',
+        'Exit': 'is_exit',
+        'Fast': 'is_fast',
+        'Stable': 'is_stable',
+    }
+    
+    @classmethod
+    def flag_columns(cls, flags) -> dict:
+        """Derive the boolean flag column values from a flag list."""
+        return {
+            column: bool(flags) and flag in flags
+            for flag, column in cls.FLAG_COLUMNS.items()
+        }
+    
+    @validates('flags')
+    def _sync_flag_columns(self, key, flags):
+        for column, value in self.flag_columns(flags).items():
+            setattr(self, column, value)
+        return flags
+    
     def __repr__(self):
         return f"<TorNode {self.ip_address}:{self.port} ({self.nickname})>"
 
@@ -108,6 +193,13 @@ class Correlation(Base):
     flow = relationship("Flow", foreign_keys=[flow_id], back_populates="correlations")
     correlated_flow = relationship("Flow", foreign_keys=[correlated_flow_id])
     
+    __table_args__ = (
+        Index('ix_correlations_flow_pair', 'flow_id', 'correlated_flow_id'),
+        Index('ix_correlations_correlated_flow', 'correlated_flow_id'),
+        # Strongest-first listings in the API and report
+        Index('ix_correlations_weight', 'correlation_weight'),
+    )
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -137,9 +229,64 @@ class Report(Base):
         return f"<Report {self.title}>"
 
 
+def _json_serializer(value) -> str:
+    """Serialize JSON column values compactly (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _json_deserializer(value: str):
+    """Deserialize JSON column values (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
 class DatabaseManager:
     """Database connection and session management."""
     
+    # Applied to every new SQLite connection. WAL lets readers run alongside
+    # the writer, and synchronous=NORMAL is durable enough under WAL. Writers
+    # from concurrent ingests, analyses and report builds wait for the write
+    # lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA busy_timeout=30000",
+    )
+    
+    # Connection pool sizing. API requests hold a connection only for the
+    # duration of their queries; the longest holders are ingest flushes and
+    # analysis steps, which run on worker threads with their own sessions.
+    POOL_OPTIONS = {
+        'pool_size': 20,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+    }
+    
+    # Extra pool options for server databases, whose connections can be
+    # dropped by the server while idle
+    SERVER_POOL_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': 3600,
+    }
+    
+    # Rows sampled per index when refreshing SQLite planner statistics
+    ANALYSIS_LIMIT = 1000
+    
+    # Flows converted per statement when decoding legacy base64 payloads
+    PAYLOAD_MIGRATION_BATCH_SIZE = 10000
+    
+    # asyncio drivers used for the async engine, by backend
+    ASYNC_DRIVERS = {
+        'sqlite': 'aiosqlite',
+        'postgresql': 'asyncpg',
+    }
+    
     def __init__(self, db_url: str = "sqlite:///tor_analysis.db"):
         """
         Initialize database manager.
@@ -147,12 +294,125 @@ class DatabaseManager:
         Args:
             db_url: SQLAlchemy database URL
         """
-        self.engine = create_engine(db_url, echo=False)
+        self.db_url = make_url(db_url)
+        self.engine = create_engine(self.db_url, **self._engine_options(QueuePool))
+        if self.db_url.get_backend_name() == 'sqlite':
+            event.listen(self.engine, 'connect', self._apply_sqlite_pragmas)
+        
         self.SessionLocal = sessionmaker(bind=self.engine)
+        self._async_engine: Optional[AsyncEngine] = None
+        self._async_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+    
+    def _engine_options(self, poolclass: type) -> Dict[str, Any]:
+        """
+        Get the create_engine arguments for this database.
+        
+        Args:
+            poolclass: Queue pool class for the engine (sync or asyncio)
+        """
+        options: Dict[str, Any] = {
+            'echo': False,
+            'json_serializer': _json_serializer,
+            'json_deserializer': _json_deserializer,
+        }
+        if self.db_url.get_backend_name() != 'sqlite':
+            options.update(self.POOL_OPTIONS, **self.SERVER_POOL_OPTIONS)
+        else:
+            options['connect_args'] = {'check_same_thread': False}
+            # File databases get a sized pool; an in-memory database keeps
+            # SQLAlchemy's default single-connection pool so it is shared
+            if self.db_url.database not in (None, '', ':memory:'):
+                options.update(self.POOL_OPTIONS, poolclass=poolclass)
+        return options
+    
+    @classmethod
+    def _apply_sqlite_pragmas(cls, dbapi_connection, connection_record):
+        """Tune a new SQLite connection for bulk writes."""
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in cls.SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
     
     def create_tables(self):
-        """Create all database tables."""
+        """Create all database tables, adding any columns and indexes missing from existing ones."""
         Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            added = self._add_missing_columns(conn)
+            
+            # Relay flag columns added to an existing table are filled once
+            # from the JSON flags they mirror
+            for flag, column in TorNode.FLAG_COLUMNS.items():
+                if (TorNode.__tablename__, column) in added:
+                    conn.execute(update(TorNode.__table__).values({
+                        column: case(
+                            (cast(TorNode.flags, Text).like(f'%"{flag}"%'), True),
+                            else_=False
+                        )
+                    }))
+            
+            # Payload samples used to be stored base64-encoded in a TEXT
+            # column; convert any left from then to the raw bytes read now
+            if conn.dialect.name == 'sqlite':
+                self._decode_text_payloads(conn)
+        # create_all skips tables that already exist, so indexes added since
+        # a database was created are created here instead (after the
+        # columns they cover, added above)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+    
+    @staticmethod
+    def _add_missing_columns(conn) -> Set[Tuple[str, str]]:
+        """
+        Add columns declared on the models but missing from existing tables.
+        
+        create_all skips tables that already exist, so databases created
+        before a column was added are migrated here. New columns must be
+        nullable or generated.
+        
+        Args:
+            conn: Connection to run the ALTER TABLE statements on
+        
+        Returns:
+            Set of (table, column) names that were added
+        """
+        inspector = inspect(conn)
+        added = set()
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN "
+                        f"{CreateColumn(column).compile(dialect=conn.dialect)}"
+                    ))
+                    added.add((table.name, column.name))
+        return added
+    
+    @classmethod
+    def _decode_text_payloads(cls, conn):
+        """
+        Decode base64 TEXT payload samples into raw BLOBs, in id order.
+        
+        Args:
+            conn: Connection to the SQLite database
+        """
+        last_id = 0
+        while True:
+            rows = conn.exec_driver_sql(
+                "SELECT id, payload_sample FROM flows "
+                "WHERE id > ? AND typeof(payload_sample) = 'text' ORDER BY id LIMIT ?",
+                (last_id, cls.PAYLOAD_MIGRATION_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return
+            conn.exec_driver_sql(
+                "UPDATE flows SET payload_sample = ? WHERE id = ?",
+                [(base64.b64decode(payload), flow_id) for flow_id, payload in rows]
+            )
+            last_id = rows[-1][0]
     
     def drop_tables(self):
         """Drop all database tables."""
@@ -162,6 +422,67 @@ class DatabaseManager:
         """Get a new database session."""
         return self.SessionLocal()
     
+    def get_async_session(self) -> AsyncSession:
+        """
+        Get a new asyncio session on the same database.
+        
+        The async engine is created on first use, so the asyncio driver
+        (aiosqlite or asyncpg) is only needed by callers that use it.
+        """
+        if self._async_session_factory is None:
+            backend = self.db_url.get_backend_name()
+            url = self.db_url.set(drivername=f"{backend}+{self.ASYNC_DRIVERS[backend]}")
+            engine = create_async_engine(url, **self._engine_options(AsyncAdaptedQueuePool))
+            if backend == 'sqlite':
+                event.listen(engine.sync_engine, 'connect', self._apply_sqlite_pragmas)
+            self._async_engine = engine
+            self._async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        return self._async_session_factory()
+    
+    async def dispose(self):
+        """Close the pooled connections of both engines."""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        self.engine.dispose()
+    
+    @contextmanager
+    def session_scope(self, session: Optional[Session] = None) -> Iterator[Session]:
+        """
+        Provide a session for a unit of work.
+        
+        Args:
+            session: Optional existing session. It is yielded as-is and left
+                open for its owner; otherwise a new session is opened and
+                closed on exit.
+        """
+        if session is not None:
+            yield session
+            return
+        
+        session = self.get_session()
+        try:
+            yield session
+        finally:
+            session.close()
+    
+    def analyze(self):
+        """Refresh stale query planner statistics (run after bulk loads)."""
+        with self.engine.begin() as conn:
+            if conn.dialect.name != 'sqlite':
+                conn.execute(text("ANALYZE"))
+                return
+            
+            # Sample a bounded number of rows per index, so a refresh costs
+            # the same however large the tables have grown
+            conn.exec_driver_sql(f"PRAGMA analysis_limit={self.ANALYSIS_LIMIT}")
+            has_stats = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )).first()
+            # optimize only re-analyzes tables whose size has changed a lot
+            # since their last statistics; a database without any gets a
+            # first ANALYZE
+            conn.exec_driver_sql("PRAGMA optimize" if has_stats else "ANALYZE")
+    
     def reset_database(self):
         """Reset database (drop and recreate all tables)."""
         self.drop_tables()
@@ -2,12 +2,17 @@
 TOR traffic extraction and detection using heuristics and Stem.
 """
 
-import base64
 import json
+import re
 from typing import List, Dict, Optional, Set
 from pathlib import Path
 import struct
 
+from sqlalchemy import (
+    Column, MetaData, String, Table, cast, or_, select, update
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from stem.descriptor.remote import DescriptorDownloader
 from stem.descriptor import parse_file
@@ -22,7 +27,8 @@ class TorExtractor:
     """Extract and identify TOR-related traffic patterns."""
     
     # Known TOR ports
-    TOR_PORTS = {9001, 9030, 9050, 9051, 9150}
+    TOR_PORTS = frozenset({9001, 9030, 9050, 9051, 9150})
+    DIRECTORY_PORT = 9030
     
     # TLS handshake patterns
     TLS_CLIENT_HELLO = b'\x16\x03'  # TLS handshake, version 3.x
@@ -33,15 +39,38 @@ class TorExtractor:
         b'\x03\x00',      # Version 3 handshake
     ]
     
-    def __init__(self, db_manager: DatabaseManager, tor_nodes: Optional[List[Dict]] = None):
+    # Plaintext protocol markers that rule out obfuscated transports
+    COMMON_PROTOCOL_MARKERS = (
+        b'HTTP/', b'GET ', b'POST ', b'SSH-', b'220 ', b'CONNECT'
+    )
+    
+    # All markers as one alternation, so the head is scanned once
+    PROTOCOL_MARKER_RE = re.compile(
+        b'|'.join(map(re.escape, COMMON_PROTOCOL_MARKERS))
+    )
+    
+    # Number of leading payload bytes inspected by the obfsproxy heuristic
+    OBFS_HEAD_SIZE = 100
+    
+    # Per-connection scratch table used to join flows against known TOR IPs
+    _tor_ips_table = Table(
+        'tor_ips', MetaData(),
+        Column('ip', String(45), primary_key=True),
+        prefixes=['TEMPORARY']
+    )
+    
+    def __init__(self, db_manager: DatabaseManager, tor_nodes: Optional[List[Dict]] = None,
+                 session: Optional[Session] = None):
         """
         Initialize TOR extractor.
         
         Args:
             db_manager: Database manager instance
             tor_nodes: Optional list of TOR node dictionaries
+            session: Optional shared session (a new one is used per call otherwise)
         """
         self.db_manager = db_manager
+        self.session = session
         self.tor_node_ips: Set[str] = set()
         
         if tor_nodes:
@@ -54,37 +83,55 @@ class TorExtractor:
         Args:
             tor_nodes: List of TOR node dictionaries
         """
-        session = self.db_manager.get_session()
-        try:
-            for node_data in tor_nodes:
-                # Check if node already exists
-                existing = session.query(TorNode).filter_by(
-                    ip_address=node_data['ip_address']
-                ).first()
-                
-                if not existing:
-                    node = TorNode(
-                        ip_address=node_data['ip_address'],
-                        port=node_data.get('port', 9001),
-                        fingerprint=node_data.get('fingerprint'),
-                        nickname=node_data.get('nickname'),
-                        flags=node_data.get('flags', []),
-                        country_code=node_data.get('country_code'),
-                        asn=node_data.get('asn'),
-                        bandwidth=node_data.get('bandwidth')
-                    )
-                    session.add(node)
-                    self.tor_node_ips.add(node_data['ip_address'])
+        with self.db_manager.session_scope(self.session) as session:
+            try:
+                rows = []
+                for node_data in tor_nodes:
+                    flags = node_data.get('flags', [])
+                    rows.append({
+                        'ip_address': node_data['ip_address'],
+                        'port': node_data.get('port', 9001),
+                        'fingerprint': node_data.get('fingerprint'),
+                        'nickname': node_data.get('nickname'),
+                        'flags': flags,
+                        'country_code': node_data.get('country_code'),
+                        'asn': node_data.get('asn'),
+                        'bandwidth': node_data.get('bandwidth'),
+                        **TorNode.flag_columns(flags)
+                    })
             
-            session.commit()
-            logger.info(f"Loaded {len(tor_nodes)} TOR nodes")
+                if rows:
+                    # Skip nodes that already exist; only newly inserted IPs are
+                    # returned and cached
+                    dialect_insert = self._dialect_insert(session)
+                    stmt = dialect_insert(TorNode).on_conflict_do_nothing(
+                        index_elements=['ip_address']
+                    ).returning(TorNode.ip_address)
+                    result = session.execute(stmt, rows)
+                    self.tor_node_ips.update(result.scalars())
             
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error loading TOR nodes: {e}")
-            raise
-        finally:
-            session.close()
+                session.commit()
+                logger.info(f"Loaded {len(tor_nodes)} TOR nodes")
+            
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error loading TOR nodes: {e}")
+                raise
+    
+    @staticmethod
+    def _dialect_insert(session: Session):
+        """
+        Get the dialect-specific INSERT construct (supports ON CONFLICT).
+        
+        Args:
+            session: Active database session
+        
+        Returns:
+            The ``insert`` function for the session's dialect
+        """
+        if session.get_bind().dialect.name == 'postgresql':
+            return postgresql_insert
+        return sqlite_insert
     
     def load_tor_nodes_from_file(self, file_path: Path):
         """
@@ -98,98 +145,118 @@ class TorExtractor:
         
         self._load_tor_nodes(tor_nodes)
     
-    def analyze_flows(self, batch_size: int = 100) -> int:
+    def analyze_flows(self, batch_size: int = 1000) -> int:
         """
         Analyze all flows in database for TOR indicators.
         
+        Relay and directory flags are pure IP/port membership checks and are
+        set with set-based UPDATE statements. Only flows carrying a payload
+        sample are streamed back into Python for the payload heuristics.
+        
         Args:
-            batch_size: Number of flows to process per batch
+            batch_size: Number of payload rows fetched per round trip
         
         Returns:
             Number of flows marked as TOR-related
         """
-        session = self.db_manager.get_session()
-        tor_flow_count = 0
-        
-        try:
-            # Get total flow count
-            total_flows = session.query(Flow).count()
-            logger.info(f"Analyzing {total_flows} flows for TOR indicators")
+        with self.db_manager.session_scope(self.session) as session:
+            try:
+                total_flows = session.query(Flow).count()
+                logger.info(f"Analyzing {total_flows} flows for TOR indicators")
+            
+                self._load_tor_ip_table(session)
+                is_relay = or_(
+                    Flow.dst_ip.in_(select(self._tor_ips_table.c.ip)),
+                    Flow.dst_port.in_(self.TOR_PORTS)
+                )
+            
+                # Known TOR node or TOR port
+                session.execute(
+                    update(Flow).where(is_relay).values(relay_comm=True),
+                    execution_options={'synchronize_session': False}
+                )
+                # Directory port (9030)
+                session.execute(
+                    update(Flow).where(
+                        Flow.dst_port == self.DIRECTORY_PORT
+                    ).values(directory_fetch=True),
+                    execution_options={'synchronize_session': False}
+                )
+                tor_flow_count = session.query(Flow).filter(is_relay).count()
             
-            # Process in batches
-            offset = 0
-            while offset < total_flows:
-                flows = session.query(Flow).offset(offset).limit(batch_size).all()
-                
-                for flow in flows:
-                    if self._analyze_flow(flow):
-                        tor_flow_count += 1
-                
+                # Payload heuristics
+                updates = []
+                rows = session.execute(
+                    select(Flow.id, Flow.payload_sample, is_relay)
+                    .where(Flow.payload_sample.isnot(None))
+                    .execution_options(yield_per=batch_size)
+                )
+            
+                for flow_id, payload_sample, relay_match in rows:
+                    flags = self._payload_flags(payload_sample)
+                    if flags:
+                        updates.append({'id': flow_id, **flags})
+                        if not relay_match:
+                            tor_flow_count += 1
+            
+                if updates:
+                    session.bulk_update_mappings(Flow, updates)
+            
+                session.execute(self._tor_ips_table.delete())
                 session.commit()
-                offset += batch_size
             
-            logger.info(f"Identified {tor_flow_count} TOR-related flows")
-            return tor_flow_count
+                logger.info(f"Identified {tor_flow_count} TOR-related flows")
+                return tor_flow_count
             
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error analyzing flows: {e}")
-            raise
-        finally:
-            session.close()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error analyzing flows: {e}")
+                raise
     
-    def _analyze_flow(self, flow: Flow) -> bool:
+    def _load_tor_ip_table(self, session: Session):
         """
-        Analyze a single flow for TOR indicators.
+        Push the cached TOR node IPs into a temporary table for SQL joins.
         
         Args:
-            flow: Flow object to analyze
-        
-        Returns:
-            True if flow is TOR-related
+            session: Active database session
+        """
+        self._tor_ips_table.create(session.connection(), checkfirst=True)
+        session.execute(self._tor_ips_table.delete())
+        if self.tor_node_ips:
+            session.execute(
+                self._tor_ips_table.insert(),
+                [{'ip': ip} for ip in self.tor_node_ips]
+            )
+    
+    @classmethod
+    def _payload_flags(cls, payload: bytes) -> Dict[str, bool]:
         """
-        is_tor = False
+        Run all payload heuristics over one payload sample.
         
-        # Check if destination is a known TOR node
-        if flow.dst_ip in self.tor_node_ips:
-            flow.relay_comm = True
-            is_tor = True
+        Args:
+            payload: Raw payload bytes
         
-        # Check for TOR ports
-        if flow.dst_port in self.TOR_PORTS:
-            flow.relay_comm = True
-            is_tor = True
+        Returns:
+            Dictionary of flag columns to set (empty if none matched)
+        """
+        flags = {}
         
-        # Check for directory port (9030)
-        if flow.dst_port == 9030:
-            flow.directory_fetch = True
-            is_tor = True
+        # Check for TLS handshake
+        if payload.startswith(cls.TLS_CLIENT_HELLO):
+            # Check for TOR-specific patterns
+            for pattern in cls.TOR_HANDSHAKE_PATTERNS:
+                if pattern in payload:
+                    flags['possible_tor_handshake'] = True
+                    break
         
-        # Analyze payload if available
-        if flow.payload_sample:
-            try:
-                payload = base64.b64decode(flow.payload_sample)
-                
-                # Check for TLS handshake
-                if payload.startswith(self.TLS_CLIENT_HELLO):
-                    # Check for TOR-specific patterns
-                    for pattern in self.TOR_HANDSHAKE_PATTERNS:
-                        if pattern in payload:
-                            flow.possible_tor_handshake = True
-                            is_tor = True
-                            break
-                
-                # Check for obfsproxy patterns (simplified)
-                if self._check_obfsproxy_patterns(payload):
-                    flow.obfsproxy_candidate = True
-                    is_tor = True
-                    
-            except Exception as e:
-                logger.debug(f"Error decoding payload for flow {flow.id}: {e}")
+        # Check for obfsproxy patterns (simplified)
+        if cls._check_obfsproxy_patterns(payload):
+            flags['obfsproxy_candidate'] = True
         
-        return is_tor
+        return flags
     
-    def _check_obfsproxy_patterns(self, payload: bytes) -> bool:
+    @classmethod
+    def _check_obfsproxy_patterns(cls, payload: bytes) -> bool:
         """
         Check for obfsproxy/pluggable transport patterns.
         
@@ -199,25 +266,19 @@ class TorExtractor:
         Returns:
             True if obfsproxy patterns detected
         """
-        # Simplified heuristic: high entropy, no clear protocol markers
-        if len(payload) < 20:
+        # Simplified heuristic: high entropy, no clear protocol markers.
+        # Only payloads longer than the inspected head can qualify.
+        if len(payload) <= cls.OBFS_HEAD_SIZE:
             return False
         
-        # Check for lack of common protocol markers
-        common_markers = [
-            b'HTTP/', b'GET ', b'POST ', b'SSH-', b'220 ', b'CONNECT'
-        ]
+        head = payload[:cls.OBFS_HEAD_SIZE]
         
-        has_marker = any(marker in payload[:100] for marker in common_markers)
-        
-        # If no common markers and reasonable size, might be obfuscated
-        if not has_marker and len(payload) > 100:
-            # Simple entropy check (very basic)
-            unique_bytes = len(set(payload[:100]))
-            if unique_bytes > 50:  # High byte diversity
-                return True
+        # Check for lack of common protocol markers
+        if cls.PROTOCOL_MARKER_RE.search(head):
+            return False
         
-        return False
+        # Simple entropy check (very basic): high byte diversity
+        return len(set(head)) > 50
     
     def get_tor_nodes_by_flag(self, flag: str) -> List[TorNode]:
         """
@@ -229,16 +290,22 @@ class TorExtractor:
         Returns:
             List of TorNode objects
         """
-        session = self.db_manager.get_session()
-        try:
-            nodes = session.query(TorNode).all()
+        with self.db_manager.session_scope(self.session) as session:
+            column = TorNode.FLAG_COLUMNS.get(flag)
+            if column:
+                # Common flags are mirrored into indexed boolean columns
+                return session.query(TorNode).filter_by(**{column: True}).all()
+            
+            # Narrow down in SQL on the serialized flag list, then confirm
+            # the exact flag match in Python
+            nodes = session.query(TorNode).filter(
+                cast(TorNode.flags, String).like(f'%"{flag}"%')
+            ).all()
             filtered = [
                 node for node in nodes 
                 if node.flags and flag in node.flags
             ]
             return filtered
-        finally:
-            session.close()
 
 
 def download_tor_consensus(output_path: Path) -> int:
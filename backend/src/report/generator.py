@@ -2,40 +2,98 @@
 PDF forensic report generator.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 import io
+import os
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
+    SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, TableStyle,
     PageBreak, Image as RLImage
 )
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
-from sqlalchemy import func
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
 
-from src.db.models import Flow, Alert, Correlation, Report, DatabaseManager
+from src.db.models import Flow, Alert, Correlation, Report, DatabaseManager, SUSPECT_FILTER
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Table styles, built once and shared by every report
+_STATS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+_SUSPECT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8)
+])
+
+_CORRELATION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+@dataclass
+class ReportStats:
+    """Aggregates shown across the report sections."""
+    total_flows: int
+    suspect_flows: int
+    high_confidence_flows: int
+    critical_flows: int
+    total_correlations: int
+    flows_by_category: List[Tuple[Optional[str], int]]
+
 
 class ForensicReportGenerator:
     """Generate PDF forensic reports."""
     
-    def __init__(self, db_manager: DatabaseManager):
+    # Long tables are split into sub-tables of this many body rows, each
+    # with fixed row heights so ReportLab does not measure every cell
+    TABLE_CHUNK_ROWS = 50
+    TABLE_ROW_HEIGHT = 0.25 * inch
+    
+    # Minimum score of the flows listed in the suspect table
+    HIGH_CONFIDENCE_SCORE = 60.0
+    
+    def __init__(self, db_manager: DatabaseManager, session: Optional[Session] = None):
         """
         Initialize report generator.
         
         Args:
             db_manager: Database manager instance
+            session: Optional shared session (a new one is used per report otherwise)
         """
         self.db_manager = db_manager
+        self.session = session
+        self._stats: Optional[ReportStats] = None
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
     
@@ -94,56 +152,105 @@ class ForensicReportGenerator:
         # Create output directory
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Create PDF document
+        # Render into memory, so the file is written in one pass and never
+        # seen half-written by the download endpoint
+        buffer = io.BytesIO()
         doc = SimpleDocTemplate(
-            str(output_path),
+            buffer,
             pagesize=letter,
             rightMargin=72,
             leftMargin=72,
             topMargin=72,
-            bottomMargin=18
+            bottomMargin=18,
+            # Deflate page content streams regardless of rl_config defaults
+            pageCompression=1
         )
         
-        # Build content
-        story = []
-        
-        # Title page
-        story.extend(self._build_title_page(title))
-        story.append(PageBreak())
-        
-        # Executive summary
-        story.extend(self._build_executive_summary())
-        story.append(Spacer(1, 0.2 * inch))
-        
-        # Statistics
-        story.extend(self._build_statistics())
-        story.append(Spacer(1, 0.2 * inch))
-        
-        # High-confidence flows
-        story.extend(self._build_suspect_flows_table())
-        story.append(PageBreak())
-        
-        # Correlations
-        story.extend(self._build_correlations_section())
-        story.append(Spacer(1, 0.2 * inch))
-        
-        # Visualizations
-        if include_visualizations and viz_paths:
-            story.extend(self._build_visualizations_section(viz_paths))
+        with self.db_manager.session_scope(self.session) as session:
+            # Aggregates shared by the summary, statistics and metadata
+            self._stats = self._collect_stats(session)
+            
+            # Build content
+            story = []
+            
+            # Title page
+            story.extend(self._build_title_page(title))
             story.append(PageBreak())
-        
-        # Recommendations
-        story.extend(self._build_recommendations())
-        
-        # Build PDF
-        doc.build(story)
-        
-        # Save report metadata to database
-        self._save_report_metadata(output_path, title)
+            
+            # Executive summary
+            story.extend(self._build_executive_summary())
+            story.append(Spacer(1, 0.2 * inch))
+            
+            # Statistics
+            story.extend(self._build_statistics())
+            story.append(Spacer(1, 0.2 * inch))
+            
+            # High-confidence flows
+            story.extend(self._build_suspect_flows_table(session))
+            story.append(PageBreak())
+            
+            # Correlations
+            story.extend(self._build_correlations_section(session))
+            story.append(Spacer(1, 0.2 * inch))
+            
+            # Visualizations
+            if include_visualizations and viz_paths:
+                story.extend(self._build_visualizations_section(viz_paths))
+                story.append(PageBreak())
+            
+            # Recommendations
+            story.extend(self._build_recommendations(session))
+            
+            # Build PDF, then move it into place in one write
+            doc.build(story)
+            tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+            tmp_path.write_bytes(buffer.getbuffer())
+            os.replace(tmp_path, output_path)
+            
+            # Save report metadata to database
+            self._save_report_metadata(session, output_path, title)
         
         logger.info(f"Report generated successfully", path=str(output_path))
         return output_path
     
+    @classmethod
+    def _collect_stats(cls, session: Session) -> ReportStats:
+        """
+        Gather the report's aggregates.
+        
+        The flow and correlation counts come from one query, the
+        per-category breakdown from a second.
+        
+        Args:
+            session: Database session
+        """
+        (total_flows, suspect_flows, high_confidence_flows, critical_flows,
+         total_correlations) = session.execute(
+            select(
+                func.count(Flow.id),
+                func.coalesce(func.sum(case((SUSPECT_FILTER, 1), else_=0)), 0),
+                func.coalesce(func.sum(case(
+                    (Flow.confidence_score >= cls.HIGH_CONFIDENCE_SCORE, 1), else_=0
+                )), 0),
+                func.coalesce(func.sum(case((Flow.confidence_category == 'Critical', 1), else_=0)), 0),
+                select(func.count(Correlation.id)).scalar_subquery()
+            )
+        ).one()
+        
+        flows_by_category = session.execute(
+            select(Flow.confidence_category, func.count(Flow.id))
+            .group_by(Flow.confidence_category)
+        ).all()
+        
+        return ReportStats(
+            total_flows=total_flows,
+            suspect_flows=suspect_flows,
+            high_confidence_flows=high_confidence_flows,
+            critical_flows=critical_flows,
+            total_correlations=total_correlations,
+            flows_by_category=[tuple(row) for row in flows_by_category]
+        )
+    
     def _build_title_page(self, title: str) -> List:
         """Build title page content."""
         content = []
@@ -170,36 +277,23 @@ class ForensicReportGenerator:
         
         content.append(Paragraph("Executive Summary", self.styles['SectionHeader']))
         
-        session = self.db_manager.get_session()
-        try:
-            # Get statistics
-            total_flows = session.query(Flow).count()
-            suspect_flows = session.query(Flow).filter(
-                Flow.confidence_score >= 30.0
-            ).count()
-            critical_flows = session.query(Flow).filter(
-                Flow.confidence_category == 'Critical'
-            ).count()
-            
-            summary_text = f"""
-            This report presents the results of network traffic analysis focused on 
-            detecting TOR (The Onion Router) usage patterns. The analysis examined 
-            <b>{total_flows:,}</b> network flows and identified <b>{suspect_flows:,}</b> 
-            flows with medium or higher confidence of TOR-related activity.
-            <br/><br/>
-            <b>Key Findings:</b><br/>
-            • {critical_flows} flows classified as CRITICAL confidence<br/>
-            • Multiple correlated flow patterns detected<br/>
-            • Evidence of potential TOR circuit establishment<br/>
-            <br/>
-            <b>Recommendation:</b> Immediate investigation of high-confidence flows 
-            and source hosts is recommended.
-            """
-            
-            content.append(Paragraph(summary_text, self.styles['Normal']))
-            
-        finally:
-            session.close()
+        stats = self._stats
+        summary_text = f"""
+        This report presents the results of network traffic analysis focused on 
+        detecting TOR (The Onion Router) usage patterns. The analysis examined 
+        <b>{stats.total_flows:,}</b> network flows and identified <b>{stats.suspect_flows:,}</b> 
+        flows with medium or higher confidence of TOR-related activity.
+        <br/><br/>
+        <b>Key Findings:</b><br/>
+        • {stats.critical_flows} flows classified as CRITICAL confidence<br/>
+        • Multiple correlated flow patterns detected<br/>
+        • Evidence of potential TOR circuit establishment<br/>
+        <br/>
+        <b>Recommendation:</b> Immediate investigation of high-confidence flows 
+        and source hosts is recommended.
+        """
+        
+        content.append(Paragraph(summary_text, self.styles['Normal']))
         
         return content
     
@@ -209,155 +303,144 @@ class ForensicReportGenerator:
         
         content.append(Paragraph("Analysis Statistics", self.styles['SectionHeader']))
         
-        session = self.db_manager.get_session()
-        try:
-            # Gather statistics
-            total_flows = session.query(Flow).count()
-            
-            stats_by_category = session.query(
-                Flow.confidence_category,
-                func.count(Flow.id)
-            ).group_by(Flow.confidence_category).all()
-            
-            total_correlations = session.query(Correlation).count()
-            
-            # Build table
-            data = [
-                ['Metric', 'Value'],
-                ['Total Flows Analyzed', f'{total_flows:,}'],
-                ['Total Correlations', f'{total_correlations:,}']
-            ]
-            
-            for category, count in stats_by_category:
-                if category:
-                    data.append([f'{category} Confidence Flows', f'{count:,}'])
-            
-            table = Table(data, colWidths=[3.5 * inch, 2 * inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            content.append(table)
-            
-        finally:
-            session.close()
+        stats = self._stats
+        
+        # Build table
+        data = [
+            ['Metric', 'Value'],
+            ['Total Flows Analyzed', f'{stats.total_flows:,}'],
+            ['Total Correlations', f'{stats.total_correlations:,}']
+        ]
+        
+        for category, count in stats.flows_by_category:
+            if category:
+                data.append([f'{category} Confidence Flows', f'{count:,}'])
+        
+        table = Table(data, colWidths=[3.5 * inch, 2 * inch])
+        table.setStyle(_STATS_TABLE_STYLE)
+        
+        content.append(table)
         
         return content
     
-    def _build_suspect_flows_table(self) -> List:
+    def _build_suspect_flows_table(self, session: Session) -> List:
         """Build table of high-confidence suspect flows."""
         content = []
         
         content.append(Paragraph("High-Confidence Suspect Flows", 
                                 self.styles['SectionHeader']))
         
-        session = self.db_manager.get_session()
-        try:
-            # Get high-confidence flows
-            flows = session.query(Flow).filter(
-                Flow.confidence_score >= 60.0
-            ).order_by(Flow.confidence_score.desc()).limit(20).all()
-            
-            if not flows:
-                content.append(Paragraph(
-                    "No high-confidence flows detected.",
-                    self.styles['Normal']
-                ))
-                return content
-            
-            # Build table
-            data = [['Flow ID', 'Source', 'Destination', 'Score', 'Category']]
-            
-            for flow in flows:
-                data.append([
-                    str(flow.id),
-                    f"{flow.src_ip}:{flow.src_port}",
-                    f"{flow.dst_ip}:{flow.dst_port}",
-                    f"{flow.confidence_score:.1f}",
-                    flow.confidence_category or 'N/A'
-                ])
-            
-            table = Table(data, colWidths=[0.6*inch, 1.8*inch, 1.8*inch, 0.8*inch, 1*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8)
-            ]))
-            
-            content.append(table)
-            
-        finally:
-            session.close()
+        # Get high-confidence flows (only the listed columns, not payloads;
+        # none to query if the stats pass found none)
+        flows = session.execute(
+            select(
+                Flow.id, Flow.src_ip, Flow.src_port, Flow.dst_ip, Flow.dst_port,
+                Flow.confidence_score, Flow.confidence_category
+            ).where(Flow.confidence_score >= self.HIGH_CONFIDENCE_SCORE)
+            .order_by(Flow.confidence_score.desc()).limit(20)
+        ).all() if self._stats.high_confidence_flows else []
+        
+        if not flows:
+            content.append(Paragraph(
+                "No high-confidence flows detected.",
+                self.styles['Normal']
+            ))
+            return content
+        
+        # Build table
+        data = [['Flow ID', 'Source', 'Destination', 'Score', 'Category']]
+        
+        for flow in flows:
+            data.append([
+                str(flow.id),
+                f"{flow.src_ip}:{flow.src_port}",
+                f"{flow.dst_ip}:{flow.dst_port}",
+                f"{flow.confidence_score:.1f}",
+                flow.confidence_category or 'N/A'
+            ])
+        
+        content.extend(self._build_tables(
+            data, [0.6*inch, 1.8*inch, 1.8*inch, 0.8*inch, 1*inch], _SUSPECT_TABLE_STYLE
+        ))
         
         return content
     
-    def _build_correlations_section(self) -> List:
+    def _build_correlations_section(self, session: Session) -> List:
         """Build correlations section."""
         content = []
         
         content.append(Paragraph("Flow Correlations", self.styles['SectionHeader']))
         
-        session = self.db_manager.get_session()
-        try:
-            # Get top correlations
-            correlations = session.query(Correlation).order_by(
-                Correlation.correlation_weight.desc()
-            ).limit(10).all()
-            
-            if not correlations:
-                content.append(Paragraph(
-                    "No significant correlations detected.",
-                    self.styles['Normal']
-                ))
-                return content
-            
-            text = """
-            The following flow pairs show strong correlation patterns, 
-            potentially indicating TOR circuit activity:
-            """
-            content.append(Paragraph(text, self.styles['Normal']))
-            content.append(Spacer(1, 0.1 * inch))
-            
-            # Build table
-            data = [['Flow 1', 'Flow 2', 'Weight', 'Type']]
-            
-            for corr in correlations:
-                data.append([
-                    str(corr.flow_id),
-                    str(corr.correlated_flow_id),
-                    f"{corr.correlation_weight:.2f}",
-                    corr.correlation_type or 'N/A'
-                ])
-            
-            table = Table(data, colWidths=[1.5*inch, 1.5*inch, 1.2*inch, 1.8*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            content.append(table)
-            
-        finally:
-            session.close()
+        # Get top correlations (none to query if the stats pass found none)
+        correlations = session.execute(
+            select(
+                Correlation.flow_id, Correlation.correlated_flow_id,
+                Correlation.correlation_weight, Correlation.correlation_type
+            ).order_by(Correlation.correlation_weight.desc()).limit(10)
+        ).all() if self._stats.total_correlations else []
+        
+        if not correlations:
+            content.append(Paragraph(
+                "No significant correlations detected.",
+                self.styles['Normal']
+            ))
+            return content
+        
+        text = """
+        The following flow pairs show strong correlation patterns, 
+        potentially indicating TOR circuit activity:
+        """
+        content.append(Paragraph(text, self.styles['Normal']))
+        content.append(Spacer(1, 0.1 * inch))
+        
+        # Build table
+        data = [['Flow 1', 'Flow 2', 'Weight', 'Type']]
+        
+        for corr in correlations:
+            data.append([
+                str(corr.flow_id),
+                str(corr.correlated_flow_id),
+                f"{corr.correlation_weight:.2f}",
+                corr.correlation_type or 'N/A'
+            ])
+        
+        content.extend(self._build_tables(
+            data, [1.5*inch, 1.5*inch, 1.2*inch, 1.8*inch], _CORRELATION_TABLE_STYLE
+        ))
         
         return content
     
+    def _build_tables(self, data: List[List[str]], col_widths: List[float],
+                      style: TableStyle) -> List:
+        """
+        Lay out table rows as fixed-size tables that repeat the header.
+        
+        Args:
+            data: Header row followed by body rows
+            col_widths: Column widths
+            style: Style applied to every sub-table
+        
+        Returns:
+            One table per TABLE_CHUNK_ROWS body rows
+        """
+        header, rows = data[0], data[1:]
+        tables = []
+        
+        for start in range(0, len(rows), self.TABLE_CHUNK_ROWS):
+            chunk = rows[start:start + self.TABLE_CHUNK_ROWS]
+            # Only the padded header row is measured; LongTable reuses the
+            # computed widths when a chunk splits across pages
+            table = LongTable(
+                [header] + chunk,
+                colWidths=col_widths,
+                rowHeights=[None] + [self.TABLE_ROW_HEIGHT] * len(chunk),
+                repeatRows=1
+            )
+            table.setStyle(style)
+            tables.append(table)
+        
+        return tables
+    
     def _build_visualizations_section(self, viz_paths: List[Path]) -> List:
         """Build visualizations section."""
         content = []
@@ -376,74 +459,59 @@ class ForensicReportGenerator:
         
         return content
     
-    def _build_recommendations(self) -> List:
+    def _build_recommendations(self, session: Session) -> List:
         """Build recommendations section."""
         content = []
         
         content.append(Paragraph("Recommendations", self.styles['SectionHeader']))
         
-        session = self.db_manager.get_session()
-        try:
-            # Get critical flows
-            critical_flows = session.query(Flow).filter(
-                Flow.confidence_category == 'Critical'
-            ).all()
-            
-            # Get unique source IPs
-            source_ips = set(flow.src_ip for flow in critical_flows)
-            
-            recommendations = f"""
-            <b>Immediate Actions:</b><br/>
-            1. Investigate the following source hosts for TOR usage:<br/>
-            """
-            
-            for ip in list(source_ips)[:10]:
-                recommendations += f"   • {ip}<br/>"
-            
-            recommendations += """
-            <br/>
-            2. Review firewall rules to block known TOR relay IPs if policy requires<br/>
-            3. Implement DPI (Deep Packet Inspection) for encrypted traffic analysis<br/>
-            4. Monitor for obfsproxy and pluggable transport usage<br/>
-            <br/>
-            <b>Long-term Measures:</b><br/>
-            • Deploy continuous network monitoring for TOR indicators<br/>
-            • Implement user awareness training on acceptable use policies<br/>
-            • Consider network segmentation for sensitive systems<br/>
-            <br/>
-            <b>Legal Notice:</b><br/>
-            All investigation activities must comply with applicable laws and regulations.
-            Consult legal counsel before taking action against users.
-            """
-            
-            content.append(Paragraph(recommendations, self.styles['Normal']))
-            
-        finally:
-            session.close()
+        # Unique source IPs of critical flows (only the ones listed)
+        source_ips = session.scalars(
+            select(Flow.src_ip).distinct()
+            .where(Flow.confidence_category == 'Critical')
+            .limit(10)
+        ).all() if self._stats.critical_flows else []
+        
+        recommendations = f"""
+        <b>Immediate Actions:</b><br/>
+        1. Investigate the following source hosts for TOR usage:<br/>
+        """
+        
+        for ip in source_ips:
+            recommendations += f"   • {ip}<br/>"
+        
+        recommendations += """
+        <br/>
+        2. Review firewall rules to block known TOR relay IPs if policy requires<br/>
+        3. Implement DPI (Deep Packet Inspection) for encrypted traffic analysis<br/>
+        4. Monitor for obfsproxy and pluggable transport usage<br/>
+        <br/>
+        <b>Long-term Measures:</b><br/>
+        • Deploy continuous network monitoring for TOR indicators<br/>
+        • Implement user awareness training on acceptable use policies<br/>
+        • Consider network segmentation for sensitive systems<br/>
+        <br/>
+        <b>Legal Notice:</b><br/>
+        All investigation activities must comply with applicable laws and regulations.
+        Consult legal counsel before taking action against users.
+        """
+        
+        content.append(Paragraph(recommendations, self.styles['Normal']))
         
         return content
     
-    def _save_report_metadata(self, output_path: Path, title: str):
+    def _save_report_metadata(self, session: Session, output_path: Path, title: str):
         """Save report metadata to database."""
-        session = self.db_manager.get_session()
+        stats = self._stats
         try:
-            # Get statistics
-            total_flows = session.query(Flow).count()
-            suspect_flows = session.query(Flow).filter(
-                Flow.confidence_score >= 30.0
-            ).count()
-            critical_alerts = session.query(Flow).filter(
-                Flow.confidence_category == 'Critical'
-            ).count()
-            
             report = Report(
                 title=title,
                 report_type='forensic',
                 file_path=str(output_path),
-                summary=f"Analysis of {total_flows} flows, {suspect_flows} suspects",
-                total_flows=total_flows,
-                suspect_flows=suspect_flows,
-                critical_alerts=critical_alerts
+                summary=f"Analysis of {stats.total_flows} flows, {stats.suspect_flows} suspects",
+                total_flows=stats.total_flows,
+                suspect_flows=stats.suspect_flows,
+                critical_alerts=stats.critical_flows
             )
             
             session.add(report)
@@ -452,29 +520,79 @@ class ForensicReportGenerator:
         except Exception as e:
             session.rollback()
             logger.error(f"Error saving report metadata: {e}")
-        finally:
-            session.close()
+
+def _build_one(spec: Dict[str, Any]) -> Path:
+    """
+    Generate a single report from a picklable spec (process pool worker).
+    
+    Each call opens its own database connection, as engines cannot be
+    shared across processes.
+    
+    Args:
+        spec: Report spec with 'db_url' and 'output_path', plus optional
+            generate_report keyword arguments ('title', 'include_visualizations',
+            'viz_paths')
+    
+    Returns:
+        Path to generated report
+    """
+    options = dict(spec)
+    db_manager = DatabaseManager(options.pop('db_url'))
+    try:
+        generator = ForensicReportGenerator(db_manager)
+        return generator.generate_report(Path(options.pop('output_path')), **options)
+    finally:
+        db_manager.engine.dispose()
+
+
+def generate_reports(specs: List[Dict[str, Any]], jobs: Optional[int] = None) -> List[Path]:
+    """
+    Generate several independent reports, one per worker process.
+    
+    Args:
+        specs: Report specs, as accepted by _build_one
+        jobs: Worker processes (defaults to the CPU count, at most 8)
+    
+    Returns:
+        Paths to generated reports, in spec order
+    """
+    if jobs is None:
+        jobs = min(os.cpu_count() or 1, 8)
+    jobs = min(jobs, len(specs))
+    
+    if jobs <= 1:
+        return [_build_one(spec) for spec in specs]
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_build_one, specs))
 
 
 if __name__ == '__main__':
     import click
     
     @click.command()
-    @click.option('--db', '-d', default='tor_analysis.db',
-                  help='Database path')
-    @click.option('--output', '-o', default='reports/forensic_report.pdf',
-                  help='Output PDF path')
+    @click.option('--db', '-d', multiple=True, default=['tor_analysis.db'],
+                  help='Database path (repeat to pair one database with each output)')
+    @click.option('--output', '-o', multiple=True, default=['reports/forensic_report.pdf'],
+                  help='Output PDF path (repeat to build several reports)')
     @click.option('--title', '-t', 
                   default='TOR Network Analysis - Forensic Report',
                   help='Report title')
-    def main(db: str, output: str, title: str):
-        """Generate forensic PDF report."""
-        db_manager = DatabaseManager(f"sqlite:///{db}")
-        
-        generator = ForensicReportGenerator(db_manager)
-        output_path = Path(output)
-        
-        report_path = generator.generate_report(output_path, title=title)
-        click.echo(f"✓ Report generated: {report_path}")
+    @click.option('--jobs', '-j', default=min(os.cpu_count() or 1, 8), type=int,
+                  help='Reports built in parallel')
+    def main(db: Tuple[str, ...], output: Tuple[str, ...], title: str, jobs: int):
+        """Generate forensic PDF reports."""
+        if len(db) == 1:
+            db = db * len(output)
+        if len(db) != len(output):
+            raise click.BadParameter('give one --db, or one per --output', param_hint='--db')
+        
+        specs = [
+            {'db_url': f"sqlite:///{db_path}", 'output_path': output_path, 'title': title}
+            for db_path, output_path in zip(db, output)
+        ]
+        
+        for report_path in generate_reports(specs, jobs=jobs):
+            click.echo(f"✓ Report generated: {report_path}")
     
     main()
@@ -2,17 +2,94 @@
 Confidence scoring for suspicious flows.
 """
 
-from typing import Dict, List, Tuple
+from bisect import bisect_right
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
+from itertools import islice
 
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import and_, or_, select
 
 from src.db.models import Flow, Correlation, TorNode, DatabaseManager
 from src.utils.logger import get_logger
 
+try:
+    from numba import njit, prange
+except ImportError:  # Optional: compiled scoring kernel (falls back to NumPy)
+    njit = None
+    prange = range
+
 logger = get_logger(__name__)
 
+# Rows fetched per round trip when streaming scoring inputs
+FETCH_BATCH_SIZE = 10000
+
+
+def _score_rows(indicators, points, term_ends, caps, has_payload, corr_count,
+                corr_weight_sum, band_counts, band_points, weight_fraction, out):
+    """
+    Score every flow in one parallel pass (compiled with Numba when available).
+    
+    Reads the same term tables as the per-flow _score_* methods and adds
+    the terms in the same order, so totals match score_flow exactly without
+    NumPy's per-component temporaries.
+    
+    Args:
+        indicators: Per-flow indicator matrix, one column per term of
+            ConfidenceScorer.TOR_NODE_TERMS, PAYLOAD_TERMS and UNUSUAL_TERMS
+        points: Points of each indicator column
+        term_ends: End column of the TOR node, payload and unusual terms
+        caps: Component maxima, in ConfidenceScorer.COMPONENTS order
+        has_payload: Flow carries a payload sample
+        corr_count, corr_weight_sum: Correlations touching each flow
+        band_counts, band_points: Timing count bands (descending minimum
+            counts) and their points
+        weight_fraction: Share of the timing weight scaled by the average
+            correlation weight
+        out: Buffer receiving the clamped totals
+    """
+    tor_end, payload_end, unusual_end = term_ends[0], term_ends[1], term_ends[2]
+    for i in prange(out.size):
+        # 1. TOR node match
+        tor = 0.0
+        for t in range(tor_end):
+            if indicators[i, t]:
+                tor += points[t]
+        tor = min(tor, caps[0])
+        
+        # 2. Timing correlation
+        timing = 0.0
+        count = corr_count[i]
+        if count > 0:
+            for b in range(band_counts.size):
+                if count >= band_counts[b]:
+                    timing = band_points[b]
+                    break
+            timing = min(timing + corr_weight_sum[i] / count * caps[1] * weight_fraction, caps[1])
+        
+        # 3. Payload patterns
+        payload = 0.0
+        if has_payload[i]:
+            for t in range(tor_end, payload_end):
+                if indicators[i, t]:
+                    payload += points[t]
+            payload = min(payload, caps[2])
+        
+        # 4. Unusual patterns
+        unusual = 0.0
+        for t in range(payload_end, unusual_end):
+            if indicators[i, t]:
+                unusual += points[t]
+        unusual = min(unusual, caps[3])
+        
+        out[i] = max(0.0, min(100.0, tor + timing + payload + unusual))
+
+
+# Compiled kernel for score_all_flows; None runs the NumPy path instead
+_score_kernel = njit(parallel=True, cache=True)(_score_rows) if njit is not None else None
+
 
 @dataclass
 class ScoreComponents:
@@ -45,6 +122,44 @@ class ConfidenceScorer:
         'unusual_patterns': 10
     }
     
+    # Component order of the weights passed to the compiled kernel
+    COMPONENTS = ('tor_node_match', 'timing_correlation', 'payload_similarity', 'unusual_patterns')
+    
+    # Indicators of the additive components, as (indicator, share of the
+    # component's weight), in the order their points are added. score_flow,
+    # the NumPy path and the compiled kernel all read these tables.
+    TOR_NODE_TERMS = (
+        ('tor_node', 0.5),
+        ('guard', 0.2),
+        ('exit', 0.2),
+        ('fast', 0.1),
+        ('relay_comm', 0.3),
+        ('directory_fetch', 0.2),
+        ('possible_tor_handshake', 0.3),
+        ('obfsproxy_candidate', 0.4),
+    )
+    PAYLOAD_TERMS = (
+        ('possible_tor_handshake', 0.6),
+        ('obfsproxy_candidate', 0.8),
+        ('large_transfer', 0.2),
+    )
+    UNUSUAL_TERMS = (
+        ('unusual_port', 0.5),
+        ('busy', 0.3),
+        ('long_lived', 0.2),
+    )
+    
+    # Timing correlation: share of the weight by minimum correlation count
+    # (first match wins), plus this share scaled by the average weight
+    TIMING_COUNT_BANDS = ((5, 0.5), (3, 0.3), (1, 0.2))
+    TIMING_WEIGHT_SHARE = 0.5
+    
+    # Indicator thresholds: bytes of a large transfer, packets of a busy
+    # flow, and the duration of a long-lived one
+    LARGE_TRANSFER_BYTES = 10000
+    BUSY_PACKET_COUNT = 100
+    LONG_LIVED = timedelta(seconds=60)
+    
     # Confidence categories
     CATEGORIES = {
         'Low': (0, 30),
@@ -53,14 +168,33 @@ class ConfidenceScorer:
         'Critical': (85, 100)
     }
     
-    def __init__(self, db_manager: DatabaseManager):
+    # Category names and their ascending lower bounds, for bisect and
+    # vectorized lookup
+    CATEGORY_LABELS = tuple(CATEGORIES)
+    CATEGORY_LOWER_BOUNDS = tuple(low for low, _ in CATEGORIES.values())[1:]
+    CATEGORY_NAMES = np.array(CATEGORY_LABELS)
+    CATEGORY_BOUNDS = np.array(CATEGORY_LOWER_BOUNDS, dtype=np.float64)
+    
+    # Ports scored as unusual, with a per-port lookup table for whole columns
+    UNUSUAL_PORTS = frozenset({9001, 9030, 9050, 9051, 9150})
+    UNUSUAL_PORT_TABLE = np.zeros(65536, dtype=bool)
+    UNUSUAL_PORT_TABLE[list(UNUSUAL_PORTS)] = True
+    
+    # Score updates sent per bulk_update_mappings call
+    UPDATE_BATCH_SIZE = 10000
+    
+    def __init__(self, db_manager: DatabaseManager, session: Optional[Session] = None):
         """
         Initialize confidence scorer.
         
         Args:
             db_manager: Database manager instance
+            session: Optional shared session (a new one is used per call otherwise)
         """
         self.db_manager = db_manager
+        self.session = session
+        # Relay IP -> (is_guard, is_exit, is_fast), loaded on first use
+        self._tor_nodes: Optional[Dict[str, Tuple[bool, bool, bool]]] = None
     
     def score_all_flows(self) -> int:
         """
@@ -69,33 +203,298 @@ class ConfidenceScorer:
         Returns:
             Number of flows scored
         """
-        session = self.db_manager.get_session()
-        scored_count = 0
-        
-        try:
-            # Get all flows
-            flows = session.query(Flow).all()
-            logger.info(f"Scoring {len(flows)} flows")
-            
-            for flow in flows:
-                score_components = self._calculate_score(flow, session)
+        with self.db_manager.session_scope(self.session) as session:
+            try:
+                # Fetch the scoring inputs for every flow as column arrays
+                features = self._fetch_features(session)
+                flow_ids = features['id']
+                logger.info(f"Scoring {len(flow_ids)} flows")
                 
-                # Update flow with score
-                flow.confidence_score = score_components.total
-                flow.confidence_category = self._get_category(score_components.total)
+                if len(flow_ids):
+                    totals = self._score_features(features, session)
+                    categories = self.CATEGORY_NAMES[
+                        np.searchsorted(self.CATEGORY_BOUNDS, totals, side='right')
+                    ]
+                    
+                    # Write scores back in bounded executemany batches
+                    rows = zip(flow_ids.tolist(), totals.tolist(), categories.tolist())
+                    for start in range(0, len(flow_ids), self.UPDATE_BATCH_SIZE):
+                        session.bulk_update_mappings(Flow, [
+                            {
+                                'id': flow_id,
+                                'confidence_score': total,
+                                'confidence_category': category
+                            }
+                            for flow_id, total, category in islice(rows, self.UPDATE_BATCH_SIZE)
+                        ])
                 
-                scored_count += 1
-            
-            session.commit()
-            logger.info(f"Scored {scored_count} flows")
-            return scored_count
+                session.commit()
+                # Scores changed wholesale; refresh statistics for their indexes
+                self.db_manager.analyze()
+                logger.info(f"Scored {len(flow_ids)} flows")
+                return len(flow_ids)
             
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error scoring flows: {e}")
-            raise
-        finally:
-            session.close()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error scoring flows: {e}")
+                raise
+    
+    def _fetch_features(self, session: Session) -> Dict[str, np.ndarray]:
+        """
+        Load the columns used for scoring into one array per column.
+        
+        Args:
+            session: Database session
+        
+        Returns:
+            Dictionary of column name -> array, aligned by flow
+        """
+        has_payload = and_(
+            Flow.payload_sample.isnot(None), Flow.payload_sample != b''
+        ).label('has_payload')
+        result = session.execute(select(
+            Flow.id, Flow.dst_ip, Flow.dst_port, Flow.pkt_count, Flow.byte_count,
+            Flow.ts_start, Flow.ts_end, Flow.relay_comm, Flow.directory_fetch,
+            Flow.possible_tor_handshake, Flow.obfsproxy_candidate, has_payload
+        ).execution_options(yield_per=FETCH_BATCH_SIZE))
+        
+        # Stream rows a partition at a time, transposing into column lists
+        columns = [[] for _ in result.keys()]
+        for chunk in result.partitions():
+            for column, values in zip(columns, zip(*chunk)):
+                column.extend(values)
+        (ids, dst_ips, dst_ports, pkt_counts, byte_counts, ts_starts, ts_ends,
+         relay_comm, directory_fetch, handshake, obfsproxy, payload) = columns
+        
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'dst_ip': dst_ips,
+            'dst_port': np.array(dst_ports, dtype=np.float64),
+            'pkt_count': np.array(pkt_counts, dtype=np.float64),
+            'byte_count': np.array(byte_counts, dtype=np.float64),
+            # Exact microsecond arithmetic; julianday() in SQL would round
+            # durations near the 60s threshold
+            'duration': (
+                np.array(ts_ends, dtype='datetime64[us]') -
+                np.array(ts_starts, dtype='datetime64[us]')
+            ),
+            'relay_comm': np.array(relay_comm, dtype=bool),
+            'directory_fetch': np.array(directory_fetch, dtype=bool),
+            'possible_tor_handshake': np.array(handshake, dtype=bool),
+            'obfsproxy_candidate': np.array(obfsproxy, dtype=bool),
+            'has_payload': np.array(payload, dtype=bool),
+        }
+    
+    def _score_features(self, features: Dict[str, np.ndarray], session: Session) -> np.ndarray:
+        """
+        Vectorized equivalent of _calculate_score over all flows.
+        
+        Each component adds its terms in the same order as the per-flow
+        scorers, so the totals are identical to scoring flows one by one.
+        
+        Args:
+            features: Column arrays from _fetch_features
+            session: Database session
+        
+        Returns:
+            Array of clamped total scores
+        """
+        n = len(features['id'])
+        
+        # Relay flags, looked up once per distinct destination
+        nodes = self._tor_node_flags(session)
+        dst_ips, inverse = np.unique(
+            np.array(features['dst_ip'], dtype=object).astype(str), return_inverse=True
+        )
+        unique_flags = np.array(
+            [(ip in nodes, *nodes.get(ip, (False, False, False))) for ip in dst_ips.tolist()],
+            dtype=bool
+        ).reshape(len(dst_ips), 4)
+        flags = unique_flags[inverse.reshape(-1)]
+        is_node = flags[:, 0]
+        flags = flags[:, 1:]
+        
+        # Per-flow correlation count and weight sum in one pass
+        count, weight_sum = self._correlation_totals(features['id'], session)
+        
+        # Indicator masks, keyed by the names used in the term tables
+        masks = {
+            'tor_node': is_node,
+            'guard': flags[:, 0],
+            'exit': flags[:, 1],
+            'fast': flags[:, 2],
+            'relay_comm': features['relay_comm'],
+            'directory_fetch': features['directory_fetch'],
+            'possible_tor_handshake': features['possible_tor_handshake'],
+            'obfsproxy_candidate': features['obfsproxy_candidate'],
+            'large_transfer': features['byte_count'] > self.LARGE_TRANSFER_BYTES,
+            'unusual_port': self.UNUSUAL_PORT_TABLE[features['dst_port'].astype(np.intp)],
+            'busy': features['pkt_count'] > self.BUSY_PACKET_COUNT,
+            'long_lived': features['duration'] > np.timedelta64(self.LONG_LIVED),
+        }
+        term_tables = (self.TOR_NODE_TERMS, self.PAYLOAD_TERMS, self.UNUSUAL_TERMS)
+        
+        if _score_kernel is not None:
+            terms = [
+                (name, self.WEIGHTS[component] * share)
+                for component, table in zip(('tor_node_match', 'payload_similarity', 'unusual_patterns'), term_tables)
+                for name, share in table
+            ]
+            max_timing = self.WEIGHTS['timing_correlation']
+            total = np.empty(n)
+            _score_kernel(
+                np.column_stack([masks[name] for name, _ in terms]),
+                np.array([points for _, points in terms], dtype=np.float64),
+                np.cumsum([len(table) for table in term_tables]),
+                np.array([self.WEIGHTS[name] for name in self.COMPONENTS], dtype=np.float64),
+                features['has_payload'], count, weight_sum,
+                np.array([minimum for minimum, _ in self.TIMING_COUNT_BANDS], dtype=np.int64),
+                np.array([max_timing * share for _, share in self.TIMING_COUNT_BANDS]),
+                self.TIMING_WEIGHT_SHARE, total
+            )
+            return total
+        
+        # 1. TOR node match
+        tor_node = self._accumulate_terms(
+            masks, self.TOR_NODE_TERMS, self.WEIGHTS['tor_node_match'], n
+        )
+        
+        # 2. Timing correlation
+        max_score = self.WEIGHTS['timing_correlation']
+        timing = np.zeros(n)
+        # Lowest band first, so higher bands overwrite it
+        for minimum, share in reversed(self.TIMING_COUNT_BANDS):
+            timing[count >= minimum] = max_score * share
+        
+        # Flows without correlations keep a weight score of zero
+        weight_score = np.divide(weight_sum, count, out=np.zeros(n), where=count > 0)
+        weight_score *= max_score
+        weight_score *= self.TIMING_WEIGHT_SHARE
+        timing += weight_score
+        np.minimum(timing, max_score, out=timing)
+        
+        # 3. Payload patterns
+        payload = self._accumulate_terms(
+            masks, self.PAYLOAD_TERMS, self.WEIGHTS['payload_similarity'], n
+        )
+        payload[~features['has_payload']] = 0.0
+        
+        # 4. Unusual patterns
+        unusual = self._accumulate_terms(
+            masks, self.UNUSUAL_TERMS, self.WEIGHTS['unusual_patterns'], n
+        )
+        
+        # Sum into the first component's buffer
+        total = tor_node
+        total += timing
+        total += payload
+        total += unusual
+        return np.clip(total, 0.0, 100.0, out=total)
+    
+    def _tor_node_flags(self, session: Session) -> Dict[str, Tuple[bool, bool, bool]]:
+        """
+        Get the relay flags of every known TOR node, querying them once.
+        
+        The relay list is small and static during a scoring run, so it is
+        kept for the lifetime of the scorer.
+        
+        Args:
+            session: Database session
+        
+        Returns:
+            Mapping of relay IP address to its (is_guard, is_exit, is_fast) flags
+        """
+        if self._tor_nodes is None:
+            self._tor_nodes = {
+                ip: (bool(is_guard), bool(is_exit), bool(is_fast))
+                for ip, is_guard, is_exit, is_fast in session.query(
+                    TorNode.ip_address, TorNode.is_guard, TorNode.is_exit, TorNode.is_fast
+                )
+            }
+        return self._tor_nodes
+    
+    @staticmethod
+    def _accumulate_terms(masks: Dict[str, np.ndarray], terms: Tuple[Tuple[str, float], ...],
+                          max_score: float, n: int) -> np.ndarray:
+        """
+        Add each term's points where its mask holds, in order, then cap.
+        
+        Args:
+            masks: Indicator masks by name
+            terms: (indicator, share of max_score) pairs
+            max_score: Weight and cap of the component
+            n: Number of flows
+        
+        Returns:
+            Component scores
+        """
+        out = np.zeros(n)
+        for name, share in terms:
+            np.add(out, max_score * share, out=out, where=masks[name])
+        return np.minimum(out, max_score, out=out)
+    
+    @staticmethod
+    def _sum_terms(indicators: Dict[str, bool], terms: Tuple[Tuple[str, float], ...],
+                   max_score: float) -> float:
+        """
+        Add each present indicator's points for one flow, in order, then cap.
+        
+        Args:
+            indicators: Indicator values by name
+            terms: (indicator, share of max_score) pairs
+            max_score: Weight and cap of the component
+        
+        Returns:
+            Component score
+        """
+        score = 0.0
+        for name, share in terms:
+            if indicators[name]:
+                score += max_score * share
+        return min(score, max_score)
+    
+    @staticmethod
+    def _correlation_totals(flow_ids: np.ndarray, session: Session) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Count and sum the correlation weights touching each flow.
+        
+        Args:
+            flow_ids: Flow IDs to aggregate for
+            session: Database session
+        
+        Returns:
+            Tuple of (correlation counts, weight sums) aligned with flow_ids
+        """
+        # Stream correlations in partitions straight into typed arrays, so
+        # the full row set is never held as Python tuples
+        result = session.execute(
+            select(
+                Correlation.flow_id, Correlation.correlated_flow_id,
+                Correlation.correlation_weight
+            ).order_by(Correlation.id).execution_options(yield_per=FETCH_BATCH_SIZE)
+        )
+        pair_chunks, weight_chunks = [], []
+        for chunk in result.partitions():
+            pair_chunks.append(np.array([(a, b) for a, b, _ in chunk], dtype=np.int64))
+            weight_chunks.append(np.fromiter((w for _, _, w in chunk), dtype=np.float64, count=len(chunk)))
+        if not pair_chunks:
+            return np.zeros(len(flow_ids)), np.zeros(len(flow_ids))
+        
+        pairs = np.concatenate(pair_chunks)
+        weights = np.concatenate(weight_chunks)
+        
+        # Interleave both endpoints so each flow's weights are summed in
+        # correlation order; a self-correlation counts once
+        endpoints = pairs.ravel()
+        keep = np.ones(endpoints.shape, dtype=bool)
+        keep[1::2] = pairs[:, 0] != pairs[:, 1]
+        endpoints = endpoints[keep]
+        weights = np.repeat(weights, 2)[keep]
+        
+        size = int(max(endpoints.max(), flow_ids.max())) + 1
+        count = np.bincount(endpoints, minlength=size)[flow_ids]
+        weight_sum = np.bincount(endpoints, weights=weights, minlength=size)[flow_ids]
+        return count, weight_sum
     
     def score_flow(self, flow_id: int) -> Tuple[float, ScoreComponents]:
         """
@@ -107,17 +506,13 @@ class ConfidenceScorer:
         Returns:
             Tuple of (total_score, score_components)
         """
-        session = self.db_manager.get_session()
-        try:
+        with self.db_manager.session_scope(self.session) as session:
             flow = session.query(Flow).filter_by(id=flow_id).first()
             if not flow:
                 raise ValueError(f"Flow {flow_id} not found")
             
             score_components = self._calculate_score(flow, session)
             return score_components.total, score_components
-            
-        finally:
-            session.close()
     
     def _calculate_score(self, flow: Flow, session: Session) -> ScoreComponents:
         """
@@ -168,38 +563,20 @@ class ConfidenceScorer:
         Returns:
             Score (0-40)
         """
-        score = 0.0
-        max_score = self.WEIGHTS['tor_node_match']
-        
         # Check if destination is known TOR node
-        tor_node = session.query(TorNode).filter_by(
-            ip_address=flow.dst_ip
-        ).first()
-        
-        if tor_node:
-            # Base score for TOR node match
-            score += max_score * 0.5
-            
-            # Bonus for specific node types
-            if tor_node.flags:
-                if 'Guard' in tor_node.flags:
-                    score += max_score * 0.2
-                if 'Exit' in tor_node.flags:
-                    score += max_score * 0.2
-                if 'Fast' in tor_node.flags:
-                    score += max_score * 0.1
-        
-        # Check for TOR-specific flags
-        if flow.relay_comm:
-            score += max_score * 0.3
-        if flow.directory_fetch:
-            score += max_score * 0.2
-        if flow.possible_tor_handshake:
-            score += max_score * 0.3
-        if flow.obfsproxy_candidate:
-            score += max_score * 0.4
-        
-        return min(score, max_score)
+        node_flags = self._tor_node_flags(session).get(flow.dst_ip)
+        is_guard, is_exit, is_fast = node_flags or (False, False, False)
+        
+        return self._sum_terms({
+            'tor_node': node_flags is not None,
+            'guard': is_guard,
+            'exit': is_exit,
+            'fast': is_fast,
+            'relay_comm': flow.relay_comm,
+            'directory_fetch': flow.directory_fetch,
+            'possible_tor_handshake': flow.possible_tor_handshake,
+            'obfsproxy_candidate': flow.obfsproxy_candidate,
+        }, self.TOR_NODE_TERMS, self.WEIGHTS['tor_node_match'])
     
     def _score_timing_correlation(self, flow: Flow, session: Session) -> float:
         """
@@ -215,34 +592,33 @@ class ConfidenceScorer:
         score = 0.0
         max_score = self.WEIGHTS['timing_correlation']
         
-        # Get correlations for this flow
-        correlations = session.query(Correlation).filter(
-            or_(
-                Correlation.flow_id == flow.id,
-                Correlation.correlated_flow_id == flow.id
-            )
+        # Get this flow's correlation weights (in the order bulk scoring sums them)
+        weights = session.scalars(
+            select(Correlation.correlation_weight).where(
+                or_(
+                    Correlation.flow_id == flow.id,
+                    Correlation.correlated_flow_id == flow.id
+                )
+            ).order_by(Correlation.id)
         ).all()
         
-        if not correlations:
+        if not weights:
             return 0.0
         
         # Score based on number and strength of correlations
-        total_weight = sum(c.correlation_weight for c in correlations)
-        correlation_count = len(correlations)
+        total_weight = sum(weights)
+        correlation_count = len(weights)
         
         # More correlations = higher score
-        if correlation_count >= 5:
-            count_score = max_score * 0.5
-        elif correlation_count >= 3:
-            count_score = max_score * 0.3
-        elif correlation_count >= 1:
-            count_score = max_score * 0.2
-        else:
-            count_score = 0.0
+        count_score = 0.0
+        for minimum, share in self.TIMING_COUNT_BANDS:
+            if correlation_count >= minimum:
+                count_score = max_score * share
+                break
         
         # Higher average weight = higher score
         avg_weight = total_weight / correlation_count if correlation_count > 0 else 0
-        weight_score = avg_weight * max_score * 0.5
+        weight_score = avg_weight * max_score * self.TIMING_WEIGHT_SHARE
         
         score = count_score + weight_score
         
@@ -258,25 +634,17 @@ class ConfidenceScorer:
         Returns:
             Score (0-20)
         """
-        score = 0.0
-        max_score = self.WEIGHTS['payload_similarity']
-        
         if not flow.payload_sample:
             return 0.0
         
-        # TLS handshake detected
-        if flow.possible_tor_handshake:
-            score += max_score * 0.6
-        
-        # Obfsproxy candidate (high entropy)
-        if flow.obfsproxy_candidate:
-            score += max_score * 0.8
-        
-        # Large payload (potential data transfer)
-        if flow.byte_count > 10000:
-            score += max_score * 0.2
-        
-        return min(score, max_score)
+        return self._sum_terms({
+            # TLS handshake detected
+            'possible_tor_handshake': flow.possible_tor_handshake,
+            # Obfsproxy candidate (high entropy)
+            'obfsproxy_candidate': flow.obfsproxy_candidate,
+            # Large payload (potential data transfer)
+            'large_transfer': flow.byte_count > self.LARGE_TRANSFER_BYTES,
+        }, self.PAYLOAD_TERMS, self.WEIGHTS['payload_similarity'])
     
     def _score_unusual_patterns(self, flow: Flow) -> float:
         """
@@ -288,24 +656,15 @@ class ConfidenceScorer:
         Returns:
             Score (0-10)
         """
-        score = 0.0
-        max_score = self.WEIGHTS['unusual_patterns']
-        
-        # Unusual port combinations
-        if flow.dst_port in {9001, 9030, 9050, 9051, 9150}:
-            score += max_score * 0.5
-        
-        # High packet count (sustained connection)
-        if flow.pkt_count > 100:
-            score += max_score * 0.3
-        
-        # Long duration connection
-        if flow.ts_end and flow.ts_start:
-            duration = (flow.ts_end - flow.ts_start).total_seconds()
-            if duration > 60:  # More than 1 minute
-                score += max_score * 0.2
-        
-        return min(score, max_score)
+        return self._sum_terms({
+            # Unusual port combinations
+            'unusual_port': flow.dst_port in self.UNUSUAL_PORTS,
+            # High packet count (sustained connection)
+            'busy': flow.pkt_count > self.BUSY_PACKET_COUNT,
+            # Long duration connection
+            'long_lived': bool(flow.ts_end and flow.ts_start)
+                          and flow.ts_end - flow.ts_start > self.LONG_LIVED,
+        }, self.UNUSUAL_TERMS, self.WEIGHTS['unusual_patterns'])
     
     def _get_category(self, score: float) -> str:
         """
@@ -317,11 +676,8 @@ class ConfidenceScorer:
         Returns:
             Category name
         """
-        for category, (min_score, max_score) in self.CATEGORIES.items():
-            if min_score <= score < max_score:
-                return category
-        
-        return 'Critical'  # >= 85
+        # Same boundaries as score_all_flows' searchsorted (>= 85 is Critical)
+        return self.CATEGORY_LABELS[bisect_right(self.CATEGORY_LOWER_BOUNDS, score)]
     
     def get_high_confidence_flows(self, min_score: float = 60.0) -> List[Flow]:
         """
@@ -333,15 +689,12 @@ class ConfidenceScorer:
         Returns:
             List of Flow objects
         """
-        session = self.db_manager.get_session()
-        try:
+        with self.db_manager.session_scope(self.session) as session:
             flows = session.query(Flow).filter(
                 Flow.confidence_score >= min_score
             ).order_by(Flow.confidence_score.desc()).all()
             
             return flows
-        finally:
-            session.close()
 
 
 if __name__ == '__main__':
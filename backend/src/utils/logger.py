@@ -2,16 +2,55 @@
 Structured logging utility for the TOR analysis tool.
 """
 
+import atexit
+import copy
 import logging
+import os
+import queue
 import sys
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from functools import lru_cache
+from typing import Callable, Optional, Set
 from pathlib import Path
 import json
-from datetime import datetime
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON log serialization
+    orjson = None
+
+# None of our formatters emit thread or process details, so skip collecting
+# them for every LogRecord
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Log directories already created by this process
+_CREATED_LOG_DIRS: Set[Path] = set()
+
+
+def _to_json(data) -> str:
+    """Serialize log data to a JSON string (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data)
 
 
 class StructuredLogger:
-    """Provides structured logging with JSON formatting and multiple handlers."""
+    """
+    Provides structured logging with JSON formatting and multiple handlers.
+    
+    Keyword arguments are evaluated before the level check. Structured data
+    that is expensive to build should go through debug_lazy, which only
+    calls its payload function when DEBUG is enabled:
+    
+        logger.debug_lazy("Flow table", lambda: {'flows': summarize(flows)})
+    """
+    
+    # Log files rotate at this size, keeping this many old files
+    LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+    LOG_FILE_BACKUPS = 5
     
     def __init__(self, name: str, log_file: Optional[Path] = None, level: int = logging.INFO):
         """
@@ -29,25 +68,48 @@ class StructuredLogger:
         # Console handler
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
-        console_formatter = logging.Formatter(
+        console_formatter = ConsoleFormatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         console_handler.setFormatter(console_formatter)
         self.logger.addHandler(console_handler)
         
-        # File handler (JSON format)
+        # File handler (JSON format), written from a background thread so
+        # callers never block on file I/O
         if log_file:
-            log_file.parent.mkdir(parents=True, exist_ok=True)
-            file_handler = logging.FileHandler(log_file)
+            if log_file.parent not in _CREATED_LOG_DIRS:
+                log_file.parent.mkdir(parents=True, exist_ok=True)
+                _CREATED_LOG_DIRS.add(log_file.parent)
+            file_handler = BufferedRotatingFileHandler(
+                log_file,
+                maxBytes=self.LOG_FILE_MAX_BYTES,
+                backupCount=self.LOG_FILE_BACKUPS,
+                delay=True
+            )
             file_handler.setLevel(level)
             file_handler.setFormatter(JsonFormatter())
-            self.logger.addHandler(file_handler)
+            
+            log_queue = queue.SimpleQueue()
+            queue_handler = RecordQueueHandler(log_queue)
+            queue_handler.setLevel(level)
+            self.logger.addHandler(queue_handler)
+            
+            self.listener = QueueListener(
+                log_queue, file_handler, respect_handler_level=True
+            )
+            self.listener.start()
+            atexit.register(self.listener.stop)
     
     def debug(self, message: str, **kwargs):
         """Log debug message with optional structured data."""
         self._log(logging.DEBUG, message, kwargs)
     
+    def debug_lazy(self, message: str, payload_fn: Callable[[], dict]):
+        """Log debug message with structured data built only if DEBUG is enabled."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, message, payload_fn())
+    
     def info(self, message: str, **kwargs):
         """Log info message with optional structured data."""
         self._log(logging.INFO, message, kwargs)
@@ -65,37 +127,144 @@ class StructuredLogger:
         self._log(logging.CRITICAL, message, kwargs)
     
     def _log(self, level: int, message: str, extra_data: dict):
-        """Internal logging method with structured data."""
-        if extra_data:
-            message = f"{message} | {json.dumps(extra_data)}"
-        self.logger.log(level, message)
+        """
+        Internal logging method with structured data.
+        
+        Structured data rides on the record and is only serialized by the
+        formatters of handlers that actually emit it.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        
+        # stacklevel=3 attributes the record to the caller of debug()/info()/...
+        self.logger.log(
+            level, message,
+            extra={'structured': extra_data} if extra_data else None,
+            stacklevel=3
+        )
+
+
+class RecordQueueHandler(QueueHandler):
+    """Queue handler for an in-process listener that keeps records intact."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message now, keeping exc_info and extras for the file formatter."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    Rotating file handler that writes through a large buffer.
+    
+    Records are not flushed one by one; the buffer is written out when it
+    fills, on rotation, and when logging shuts down. The file size is
+    tracked in memory so the rollover check never seeks the file.
+    """
+    
+    BUFFER_SIZE = 65536
+    
+    def _open(self):
+        stream = open(
+            self.baseFilename, self.mode, buffering=self.BUFFER_SIZE,
+            encoding=self.encoding, errors=self.errors
+        )
+        self._size = os.fstat(stream.fileno()).st_size
+        return stream
+    
+    def emit(self, record: logging.LogRecord):
+        """Write the formatted record, rotating first if it would overflow the file."""
+        try:
+            line = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._size and self._size + len(line) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(line)
+            self._size += len(line)
+        except Exception:
+            self.handleError(record)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Plain-text formatter that appends structured data as JSON."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """Format log record, followed by its structured data if any."""
+        message = super().format(record)
+        structured = getattr(record, 'structured', None)
+        if structured:
+            message = f"{message} | {_to_json(structured)}"
+        return message
 
 
 class JsonFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging."""
     
+    # Fixed fields in output order, left open for the optional ones. Only the
+    # message is free text; the other fields are identifiers and need no
+    # escaping.
+    TEMPLATE = (
+        '{{"timestamp":"{0}","level":"{1}","logger":"{2}","message":{3},'
+        '"module":"{4}","function":"{5}","line":{6}'
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (epoch second, formatted UTC prefix) of the last record
+        self._time_cache = (None, '')
+    
+    def _utc_timestamp(self, record: logging.LogRecord) -> str:
+        """
+        Format the record's creation time as ISO 8601 UTC.
+        
+        The date/time prefix is only re-formatted when the second changes.
+        
+        Args:
+            record: Log record
+        
+        Returns:
+            Timestamp such as ``2024-01-01T12:00:00.123Z``
+        """
+        second = int(record.created)
+        cached_second, prefix = self._time_cache
+        if second != cached_second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._time_cache = (second, prefix)
+        return f"{prefix}.{int(record.msecs):03d}Z"
+    
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON."""
-        log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'level': record.levelname,
-            'logger': record.name,
-            'message': record.getMessage(),
-            'module': record.module,
-            'function': record.funcName,
-            'line': record.lineno
-        }
+        log_line = self.TEMPLATE.format(
+            self._utc_timestamp(record),
+            record.levelname,
+            record.name,
+            _to_json(record.getMessage()),
+            record.module,
+            record.funcName,
+            record.lineno
+        )
+        
+        structured = getattr(record, 'structured', None)
+        if structured:
+            log_line += f',"data":{_to_json(structured)}'
         
         if record.exc_info:
-            log_data['exception'] = self.formatException(record.exc_info)
+            log_line += f',"exception":{_to_json(self.formatException(record.exc_info))}'
         
-        return json.dumps(log_data)
+        return log_line + '}'
 
 
 def get_logger(name: str, log_dir: Optional[Path] = None) -> StructuredLogger:
     """
     Get or create a structured logger.
     
+    Loggers are created once per (name, log_dir) and reused afterwards.
+    
     Args:
         name: Logger name
         log_dir: Optional directory for log files
@@ -103,8 +272,14 @@ def get_logger(name: str, log_dir: Optional[Path] = None) -> StructuredLogger:
     Returns:
         StructuredLogger instance
     """
+    return _get_cached_logger(name, str(log_dir) if log_dir else None)
+
+
+@lru_cache(maxsize=None)
+def _get_cached_logger(name: str, log_dir: Optional[str]) -> StructuredLogger:
+    """Create the structured logger for a (name, log_dir) pair."""
     log_file = None
     if log_dir:
-        log_file = log_dir / f"{name}.log"
+        log_file = Path(log_dir) / f"{name}.log"
     
     return StructuredLogger(name, log_file)
@@ -5,23 +5,20 @@ Streamlit dashboard for TOR network analysis.
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import networkx as nx
-from pyvis.network import Network
+import shutil
 import tempfile
 from pathlib import Path
 from datetime import datetime
-import base64
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import or_, func
+from sqlalchemy import Integer, case, cast, func, select
+from sqlalchemy.orm import aliased, load_only
 
-from src.db.models import Flow, TorNode, Correlation, Alert, DatabaseManager, init_database
-from src.collector.pcap_ingest import PcapIngestor
-from src.parser.tor_extractor import TorExtractor
-from src.correlator.correlation_engine import CorrelationEngine
-from src.scorer.confidence import ConfidenceScorer
-from src.report.generator import ForensicReportGenerator
+from src.db.models import Flow, TorNode, Correlation, Alert, DatabaseManager, init_database, SUSPECT_FILTER
+
+# Pipeline, graph and report modules are imported by the pages that use
+# them, so opening the dashboard (Overview) does not load scapy, pyvis
+# or reportlab.
 
 # Page configuration
 st.set_page_config(
@@ -66,10 +63,173 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Dashboard database file
+DB_PATH = Path("tor_analysis.db")
+
+# Rows fetched per round trip when streaming query results into a DataFrame
+STREAM_BATCH_SIZE = 1000
+
+# Aggregates are reused across reruns until the database changes (seconds)
+AGGREGATE_CACHE_TTL = 300
+
+# Width of the confidence histogram's bins (20 bins over 0-100)
+SCORE_BIN_WIDTH = 5
+
+# Most points drawn in the timeline scatter; larger sets are sampled
+TIMELINE_MAX_POINTS = 20000
+
+# Bytes copied per read when saving uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Scores stay numeric in flow tables and are only formatted for display
+SCORE_COLUMN_CONFIG = {'Score': st.column_config.NumberColumn(format="%.1f")}
+
+# Canvas (width, height) in pixels that server-side graph layouts are fitted into
+GRAPH_LAYOUT_SIZE = (1600, 1000)
+
+
 @st.cache_resource
 def get_db_manager():
     """Get cached database manager."""
-    return init_database(Path("tor_analysis.db"))
+    return init_database(DB_PATH)
+
+
+def db_version() -> float:
+    """
+    Get a stamp that changes whenever the database is written.
+    
+    Under WAL, writes land in the -wal file before they are checkpointed
+    into the database file, so both modification times are considered.
+    
+    Returns:
+        Latest modification time of the database files
+    """
+    paths = (DB_PATH, DB_PATH.with_name(f"{DB_PATH.name}-wal"))
+    return max((path.stat().st_mtime for path in paths if path.exists()), default=0.0)
+
+
+@st.cache_data(ttl=AGGREGATE_CACHE_TTL)
+def database_counts(version: float) -> Dict[str, int]:
+    """
+    Count flows, TOR nodes and correlations in one query.
+    
+    Args:
+        version: Database stamp from db_version (cache key only)
+    
+    Returns:
+        Dictionary of table counts
+    """
+    session = get_db_manager().get_session()
+    try:
+        flows, nodes, correlations = session.execute(select(
+            select(func.count(Flow.id)).scalar_subquery(),
+            select(func.count(TorNode.id)).scalar_subquery(),
+            select(func.count(Correlation.id)).scalar_subquery()
+        )).one()
+        return {'flows': flows, 'tor_nodes': nodes, 'correlations': correlations}
+    finally:
+        session.close()
+
+
+@st.cache_data(ttl=AGGREGATE_CACHE_TTL)
+def overview_metrics(version: float) -> Dict[str, int]:
+    """
+    Count total, suspect, critical and high flows in one pass.
+    
+    Args:
+        version: Database stamp from db_version (cache key only)
+    
+    Returns:
+        Dictionary of flow counts
+    """
+    session = get_db_manager().get_session()
+    try:
+        total, suspect, critical, high = session.execute(select(
+            func.count(Flow.id),
+            func.coalesce(func.sum(case((SUSPECT_FILTER, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Flow.confidence_category == 'Critical', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Flow.confidence_category == 'High', 1), else_=0)), 0)
+        )).one()
+        return {'total': total, 'suspect': suspect, 'critical': critical, 'high': high}
+    finally:
+        session.close()
+
+
+@st.cache_data(ttl=AGGREGATE_CACHE_TTL)
+def score_distribution(version: float) -> pd.DataFrame:
+    """
+    Count scored flows per score bin and category, binned in SQL.
+    
+    Args:
+        version: Database stamp from db_version (cache key only)
+    
+    Returns:
+        DataFrame with score_bin (bin start), confidence_category and
+        flows columns
+    """
+    # A score of exactly 100 falls in the last bin
+    score_bin = case(
+        (Flow.confidence_score >= 100.0, 100 - SCORE_BIN_WIDTH),
+        else_=cast(Flow.confidence_score / SCORE_BIN_WIDTH, Integer) * SCORE_BIN_WIDTH
+    ).label('score_bin')
+    
+    session = get_db_manager().get_session()
+    try:
+        return pd.read_sql(
+            select(score_bin, Flow.confidence_category, func.count(Flow.id).label('flows'))
+            .where(Flow.confidence_score > 0)
+            .group_by(score_bin, Flow.confidence_category)
+            .order_by(score_bin),
+            session.bind
+        )
+    finally:
+        session.close()
+
+
+@st.cache_data(ttl=AGGREGATE_CACHE_TTL)
+def category_counts(version: float) -> pd.DataFrame:
+    """
+    Count categorized flows per confidence category.
+    
+    Args:
+        version: Database stamp from db_version (cache key only)
+    
+    Returns:
+        DataFrame with Category and Count columns
+    """
+    session = get_db_manager().get_session()
+    try:
+        return pd.DataFrame(
+            session.query(
+                Flow.confidence_category,
+                func.count(Flow.id)
+            ).filter(
+                Flow.confidence_category.isnot(None)
+            ).group_by(Flow.confidence_category).all(),
+            columns=['Category', 'Count']
+        )
+    finally:
+        session.close()
+
+
+def read_frame(session, stmt) -> pd.DataFrame:
+    """
+    Stream a select's rows into a DataFrame built in one call.
+    
+    Args:
+        session: Database session
+        stmt: Select statement; its column labels become the DataFrame columns
+    
+    Returns:
+        DataFrame of the result rows
+    """
+    result = session.execute(
+        stmt.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+    )
+    rows = []
+    for partition in result.partitions():
+        rows.extend(partition)
+    return pd.DataFrame.from_records(rows, columns=list(result.keys()))
 
 
 def main():
@@ -96,19 +256,11 @@ def main():
         
         # Database stats
         st.subheader("Database Stats")
-        db_manager = get_db_manager()
-        session = db_manager.get_session()
+        counts = database_counts(db_version())
         
-        try:
-            total_flows = session.query(Flow).count()
-            total_nodes = session.query(TorNode).count()
-            total_correlations = session.query(Correlation).count()
-            
-            st.metric("Total Flows", f"{total_flows:,}")
-            st.metric("TOR Nodes", f"{total_nodes:,}")
-            st.metric("Correlations", f"{total_correlations:,}")
-        finally:
-            session.close()
+        st.metric("Total Flows", f"{counts['flows']:,}")
+        st.metric("TOR Nodes", f"{counts['tor_nodes']:,}")
+        st.metric("Correlations", f"{counts['correlations']:,}")
     
     # Route to pages
     if page == "📊 Overview":
@@ -131,21 +283,17 @@ def show_overview():
     
     db_manager = get_db_manager()
     session = db_manager.get_session()
+    version = db_version()
     
     try:
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
         
-        total_flows = session.query(Flow).count()
-        suspect_flows = session.query(Flow).filter(
-            Flow.confidence_score >= 30.0
-        ).count()
-        critical_flows = session.query(Flow).filter(
-            Flow.confidence_category == 'Critical'
-        ).count()
-        high_flows = session.query(Flow).filter(
-            Flow.confidence_category == 'High'
-        ).count()
+        metrics = overview_metrics(version)
+        total_flows = metrics['total']
+        suspect_flows = metrics['suspect']
+        critical_flows = metrics['critical']
+        high_flows = metrics['high']
         
         with col1:
             st.metric("Total Flows", f"{total_flows:,}")
@@ -166,22 +314,21 @@ def show_overview():
             st.subheader("Confidence Score Distribution")
             
             # Get flows with scores
-            flows_df = pd.read_sql(
-                session.query(Flow.confidence_score, Flow.confidence_category)
-                .filter(Flow.confidence_score > 0)
-                .statement,
-                session.bind
-            )
+            flows_df = score_distribution(version)
             
             if not flows_df.empty:
-                fig = px.histogram(
+                # Bars centred on their bins, stacked by category
+                flows_df['confidence_score'] = flows_df['score_bin'] + SCORE_BIN_WIDTH / 2
+                fig = px.bar(
                     flows_df,
                     x='confidence_score',
-                    nbins=20,
+                    y='flows',
                     color='confidence_category',
                     title="Flow Confidence Scores",
-                    labels={'confidence_score': 'Confidence Score', 'count': 'Number of Flows'}
+                    labels={'confidence_score': 'Confidence Score', 'flows': 'Number of Flows'}
                 )
+                fig.update_traces(width=SCORE_BIN_WIDTH)
+                fig.update_layout(bargap=0)
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No scored flows available. Run analysis first.")
@@ -189,19 +336,9 @@ def show_overview():
         with col2:
             st.subheader("Confidence Categories")
             
-            category_counts = session.query(
-                Flow.confidence_category,
-                func.count(Flow.id)
-            ).filter(
-                Flow.confidence_category.isnot(None)
-            ).group_by(Flow.confidence_category).all()
+            category_df = category_counts(version)
             
-            if category_counts:
-                category_df = pd.DataFrame(
-                    category_counts,
-                    columns=['Category', 'Count']
-                )
-                
+            if not category_df.empty:
                 fig = px.pie(
                     category_df,
                     values='Count',
@@ -221,26 +358,25 @@ def show_overview():
         st.divider()
         st.subheader("🚨 Top Suspect Flows")
         
-        top_flows = session.query(Flow).filter(
-            Flow.confidence_score >= 60.0
-        ).order_by(Flow.confidence_score.desc()).limit(10).all()
-        
-        if top_flows:
-            flows_data = []
-            for flow in top_flows:
-                flows_data.append({
-                    'ID': flow.id,
-                    'Source': f"{flow.src_ip}:{flow.src_port}",
-                    'Destination': f"{flow.dst_ip}:{flow.dst_port}",
-                    'Protocol': flow.protocol,
-                    'Score': f"{flow.confidence_score:.1f}",
-                    'Category': flow.confidence_category,
-                    'Packets': flow.pkt_count,
-                    'Bytes': flow.byte_count
-                })
-            
-            df = pd.DataFrame(flows_data)
-            st.dataframe(df, use_container_width=True, hide_index=True)
+        df = pd.read_sql(
+            select(
+                Flow.id.label('ID'),
+                Flow.endpoint_src.label('Source'),
+                Flow.endpoint_dst.label('Destination'),
+                Flow.protocol.label('Protocol'),
+                Flow.confidence_score.label('Score'),
+                Flow.confidence_category.label('Category'),
+                Flow.pkt_count.label('Packets'),
+                Flow.byte_count.label('Bytes')
+            ).where(
+                Flow.confidence_score >= 60.0
+            ).order_by(Flow.confidence_score.desc()).limit(10),
+            session.bind
+        )
+        
+        if not df.empty:
+            st.dataframe(df, use_container_width=True, hide_index=True,
+                         column_config=SCORE_COLUMN_CONFIG)
         else:
             st.info("No high-confidence flows detected.")
         
@@ -252,6 +388,9 @@ def show_data_ingestion():
     """Show data ingestion interface."""
     st.header("📁 Data Ingestion")
     
+    from src.collector.pcap_ingest import PcapIngestor
+    from src.parser.tor_extractor import TorExtractor
+    
     tab1, tab2 = st.tabs(["Upload PCAP", "Load TOR Nodes"])
     
     with tab1:
@@ -270,13 +409,18 @@ def show_data_ingestion():
         with col2:
             streaming = st.checkbox("Use Streaming Mode", value=True,
                                    help="Recommended for large files")
+            # Chosen before ingesting: a checkbox rendered after the button
+            # could only ever be read at its default, on the click's rerun
+            auto_analyze = st.checkbox("Run TOR analysis automatically", value=True)
         
         if uploaded_file is not None:
             if st.button("🚀 Ingest PCAP", type="primary"):
                 with st.spinner("Ingesting PCAP file..."):
-                    # Save uploaded file temporarily
+                    # Save uploaded file temporarily, copied in chunks rather
+                    # than as one bytes object
                     with tempfile.NamedTemporaryFile(delete=False, suffix='.pcap') as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
+                        uploaded_file.seek(0)
+                        shutil.copyfileobj(uploaded_file, tmp_file, UPLOAD_CHUNK_SIZE)
                         tmp_path = Path(tmp_file.name)
                     
                     try:
@@ -286,8 +430,8 @@ def show_data_ingestion():
                         
                         st.success(f"✅ Successfully ingested {flow_count:,} flows!")
                         
-                        # Auto-run analysis
-                        if st.checkbox("Run TOR analysis automatically", value=True):
+                        # Auto-run analysis, once per ingested file
+                        if auto_analyze:
                             run_tor_analysis()
                         
                     except Exception as e:
@@ -310,10 +454,10 @@ def show_data_ingestion():
                     try:
                         import json
                         
-                        # Save temporarily
-                        with tempfile.NamedTemporaryFile(mode='w', delete=False, 
-                                                        suffix='.json') as tmp_file:
-                            tmp_file.write(uploaded_json.getvalue().decode('utf-8'))
+                        # Save temporarily (the bytes are already UTF-8 JSON)
+                        with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as tmp_file:
+                            uploaded_json.seek(0)
+                            shutil.copyfileobj(uploaded_json, tmp_file, UPLOAD_CHUNK_SIZE)
                             tmp_path = Path(tmp_file.name)
                         
                         db_manager = get_db_manager()
@@ -346,32 +490,38 @@ def show_data_ingestion():
 
 def run_tor_analysis():
     """Run complete TOR analysis pipeline."""
+    from src.parser.tor_extractor import TorExtractor
+    from src.correlator.correlation_engine import CorrelationEngine
+    from src.scorer.confidence import ConfidenceScorer
+    
     db_manager = get_db_manager()
     
     progress_bar = st.progress(0)
     status_text = st.empty()
     
     try:
-        # Step 1: Extract TOR indicators
-        status_text.text("Extracting TOR indicators...")
-        progress_bar.progress(25)
-        
-        extractor = TorExtractor(db_manager)
-        tor_count = extractor.analyze_flows()
-        
-        # Step 2: Correlate flows
-        status_text.text("Correlating flows...")
-        progress_bar.progress(50)
-        
-        correlator = CorrelationEngine(db_manager)
-        corr_count = correlator.correlate_flows()
-        
-        # Step 3: Score flows
-        status_text.text("Calculating confidence scores...")
-        progress_bar.progress(75)
-        
-        scorer = ConfidenceScorer(db_manager)
-        scored_count = scorer.score_all_flows()
+        # One session for every stage, as in the API's analysis pipeline
+        with db_manager.session_scope() as session:
+            # Step 1: Extract TOR indicators
+            status_text.text("Extracting TOR indicators...")
+            progress_bar.progress(25)
+            
+            extractor = TorExtractor(db_manager, session=session)
+            tor_count = extractor.analyze_flows()
+            
+            # Step 2: Correlate flows
+            status_text.text("Correlating flows...")
+            progress_bar.progress(50)
+            
+            correlator = CorrelationEngine(db_manager, session=session)
+            corr_count = correlator.correlate_flows()
+            
+            # Step 3: Score flows
+            status_text.text("Calculating confidence scores...")
+            progress_bar.progress(75)
+            
+            scorer = ConfidenceScorer(db_manager, session=session)
+            scored_count = scorer.score_all_flows()
         
         progress_bar.progress(100)
         status_text.text("Analysis complete!")
@@ -407,52 +557,70 @@ def show_flow_analysis():
                 default=['High', 'Critical']
             )
         with col3:
-            limit = st.number_input("Max Results", min_value=10, max_value=1000, 
-                                   value=100, step=10)
-        
-        # Query flows
-        query = session.query(Flow).filter(Flow.confidence_score >= min_score)
+            page_size = st.selectbox("Page Size", [20, 50, 100], index=1)
         
+        criteria = [Flow.confidence_score >= min_score]
         if category_filter:
-            query = query.filter(Flow.confidence_category.in_(category_filter))
-        
-        flows = query.order_by(Flow.confidence_score.desc()).limit(limit).all()
-        
-        st.write(f"Found {len(flows)} flows matching criteria")
-        
-        if flows:
-            # Create DataFrame
-            flows_data = []
-            for flow in flows:
-                flows_data.append({
-                    'ID': flow.id,
-                    'Source IP': flow.src_ip,
-                    'Src Port': flow.src_port,
-                    'Dest IP': flow.dst_ip,
-                    'Dst Port': flow.dst_port,
-                    'Protocol': flow.protocol,
-                    'Start Time': flow.ts_start.strftime('%Y-%m-%d %H:%M:%S'),
-                    'Packets': flow.pkt_count,
-                    'Bytes': flow.byte_count,
-                    'Score': f"{flow.confidence_score:.1f}",
-                    'Category': flow.confidence_category
-                })
+            criteria.append(Flow.confidence_category.in_(category_filter))
+        
+        total = session.scalar(select(func.count(Flow.id)).where(*criteria))
+        st.write(f"Found {total:,} flows matching criteria")
+        
+        page = st.number_input("Page", min_value=1, max_value=max(1, -(-total // page_size)),
+                               value=1, step=1)
+        
+        # Query one page of flows (only the table's columns); the id
+        # tie-break keeps pages stable between reruns
+        stmt = select(
+            Flow.id.label('ID'),
+            Flow.src_ip.label('Source IP'),
+            Flow.src_port.label('Src Port'),
+            Flow.dst_ip.label('Dest IP'),
+            Flow.dst_port.label('Dst Port'),
+            Flow.protocol.label('Protocol'),
+            Flow.ts_start.label('Start Time'),
+            Flow.pkt_count.label('Packets'),
+            Flow.byte_count.label('Bytes'),
+            Flow.confidence_score.label('Score'),
+            Flow.confidence_category.label('Category')
+        ).where(*criteria).order_by(
+            Flow.confidence_score.desc(), Flow.id
+        ).offset((page - 1) * page_size).limit(page_size)
+        
+        df = read_frame(session, stmt)
+        
+        if not df.empty:
+            flow_ids = df['ID'].tolist()
+            df['Start Time'] = pd.to_datetime(df['Start Time']).dt.strftime('%Y-%m-%d %H:%M:%S')
             
-            df = pd.DataFrame(flows_data)
-            
-            # Display table
-            st.dataframe(df, use_container_width=True, hide_index=True)
+            # Display table in a viewport no taller than the page needs
+            st.dataframe(df, use_container_width=True, hide_index=True,
+                         column_config=SCORE_COLUMN_CONFIG,
+                         height=min(35 * (len(df) + 1), 600))
             
             # Flow detail viewer
             st.divider()
             st.subheader("Flow Details")
             
-            flow_id = st.selectbox("Select Flow ID", [f.id for f in flows])
+            flow_id = st.selectbox("Select Flow ID", flow_ids)
             
             if flow_id:
-                selected_flow = session.query(Flow).filter_by(id=flow_id).first()
+                # Only the displayed columns; the payload is fetched when
+                # the viewer is switched on
+                row = session.execute(
+                    select(Flow, func.length(Flow.payload_sample))
+                    .options(load_only(
+                        Flow.src_ip, Flow.src_port, Flow.dst_ip, Flow.dst_port,
+                        Flow.protocol, Flow.pkt_count, Flow.byte_count,
+                        Flow.possible_tor_handshake, Flow.relay_comm,
+                        Flow.directory_fetch, Flow.obfsproxy_candidate,
+                        Flow.confidence_score, Flow.confidence_category
+                    ))
+                    .where(Flow.id == flow_id)
+                ).first()
                 
-                if selected_flow:
+                if row:
+                    selected_flow, payload_length = row
                     col1, col2 = st.columns(2)
                     
                     with col1:
@@ -474,27 +642,28 @@ def show_flow_analysis():
                         st.write(f"- Score: {selected_flow.confidence_score:.1f}")
                         st.write(f"- Category: {selected_flow.confidence_category}")
                         
-                        # Get correlations
-                        correlations = session.query(Correlation).filter(
-                            or_(
-                                Correlation.flow_id == flow_id,
-                                Correlation.correlated_flow_id == flow_id
+                        # Get correlations as one index seek per endpoint
+                        # column (UNION ALL) rather than an OR over both
+                        correlations = session.execute(
+                            select(Correlation.correlated_flow_id, Correlation.correlation_weight)
+                            .where(Correlation.flow_id == flow_id)
+                            .union_all(
+                                select(Correlation.flow_id, Correlation.correlation_weight)
+                                .where(Correlation.correlated_flow_id == flow_id,
+                                       Correlation.flow_id != flow_id)
                             )
                         ).all()
                         
                         st.write(f"**Correlations: {len(correlations)}**")
-                        for corr in correlations[:5]:
-                            other_id = corr.correlated_flow_id if corr.flow_id == flow_id else corr.flow_id
-                            st.write(f"- Flow {other_id} (weight: {corr.correlation_weight:.2f})")
+                        for other_id, weight in correlations[:5]:
+                            st.write(f"- Flow {other_id} (weight: {weight:.2f})")
                     
                     # Payload viewer
-                    if selected_flow.payload_sample:
-                        st.write("**Payload Sample (first 512 bytes)**")
-                        try:
-                            payload = base64.b64decode(selected_flow.payload_sample)
-                            st.code(payload.hex(), language='text')
-                        except:
-                            st.write("Could not decode payload")
+                    if payload_length and st.toggle(f"Show payload sample ({payload_length} bytes)"):
+                        payload = session.scalar(
+                            select(Flow.payload_sample).where(Flow.id == flow_id)
+                        )
+                        st.code(payload.hex(), language='text')
         
         else:
             st.info("No flows match the selected criteria.")
@@ -503,79 +672,127 @@ def show_flow_analysis():
         session.close()
 
 
-def show_network_graph():
-    """Show network correlation graph."""
-    st.header("🕸️ Network Correlation Graph")
+def graph_layout(nodes: List[int],
+                 edges: List[Tuple[int, int]]) -> Optional[Dict[int, Tuple[float, float]]]:
+    """
+    Compute fixed node positions with igraph's C layout kernel.
     
-    db_manager = get_db_manager()
-    session = db_manager.get_session()
+    Args:
+        nodes: Flow IDs in the correlation graph
+        edges: Correlated flow ID pairs
     
+    Returns:
+        Dictionary of node to (x, y) pixel position, or None without igraph
+    """
     try:
-        # Get correlations
-        correlations = session.query(Correlation).all()
-        
-        if not correlations:
-            st.info("No correlations available. Run analysis first.")
-            return
-        
-        # Build NetworkX graph
-        G = nx.Graph()
-        
-        for corr in correlations:
-            flow1 = session.query(Flow).filter_by(id=corr.flow_id).first()
-            flow2 = session.query(Flow).filter_by(id=corr.correlated_flow_id).first()
-            
-            if flow1 and flow2:
-                label1 = f"{flow1.src_ip}→{flow1.dst_ip}"
-                label2 = f"{flow2.src_ip}→{flow2.dst_ip}"
-                
-                G.add_node(corr.flow_id, label=label1, 
-                          score=flow1.confidence_score,
-                          category=flow1.confidence_category)
-                G.add_node(corr.correlated_flow_id, label=label2,
-                          score=flow2.confidence_score,
-                          category=flow2.confidence_category)
-                
-                G.add_edge(corr.flow_id, corr.correlated_flow_id, 
-                          weight=corr.correlation_weight)
-        
-        st.write(f"Graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
-        
-        # Create Pyvis network
-        net = Network(height="600px", width="100%", bgcolor="#222222", 
-                     font_color="white")
-        
-        # Add nodes with colors based on category
-        color_map = {
-            'Low': '#90EE90',
-            'Medium': '#FFD700',
-            'High': '#FF8C00',
-            'Critical': '#FF0000'
-        }
-        
-        for node, data in G.nodes(data=True):
-            color = color_map.get(data.get('category', 'Low'), '#888888')
-            net.add_node(node, label=data.get('label', str(node)), 
-                        color=color, title=f"Score: {data.get('score', 0):.1f}")
-        
-        for edge in G.edges(data=True):
-            net.add_edge(edge[0], edge[1], 
-                        value=edge[2].get('weight', 1) * 10)
-        
-        # Save and display
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w') as tmp_file:
-            net.save_graph(tmp_file.name)
-            tmp_path = Path(tmp_file.name)
-        
-        with open(tmp_path, 'r') as f:
-            html_content = f.read()
-        
-        st.components.v1.html(html_content, height=650)
-        
-        tmp_path.unlink()
-        
+        import igraph as ig
+    except ImportError:  # Optional: server-side graph layout (falls back to pyvis physics)
+        return None
+    
+    index = {node: i for i, node in enumerate(nodes)}
+    g = ig.Graph(n=len(nodes), edges=[(index[u], index[v]) for u, v in edges])
+    
+    layout = g.layout_drl()
+    layout.fit_into(GRAPH_LAYOUT_SIZE)
+    
+    return dict(zip(nodes, map(tuple, layout.coords)))
+
+
+@st.cache_data(ttl=AGGREGATE_CACHE_TTL)
+def network_graph_html(version: float) -> Optional[Tuple[str, int, int]]:
+    """
+    Build the correlation graph and render it to pyvis HTML.
+    
+    Args:
+        version: Database stamp from db_version (cache key only)
+    
+    Returns:
+        Tuple of (HTML, node count, edge count), or None without correlations
+    """
+    from pyvis.network import Network
+    
+    session = get_db_manager().get_session()
+    
+    try:
+        # Get correlations with both endpoint flows in a single query;
+        # inner joins skip correlations whose flows no longer exist
+        source, target = aliased(Flow), aliased(Flow)
+        correlations = session.execute(
+            select(
+                Correlation.flow_id, Correlation.correlated_flow_id, Correlation.correlation_weight,
+                source.src_ip, source.dst_ip, source.confidence_score, source.confidence_category,
+                target.src_ip, target.dst_ip, target.confidence_score, target.confidence_category
+            )
+            .join(source, source.id == Correlation.flow_id)
+            .join(target, target.id == Correlation.correlated_flow_id)
+        ).all()
     finally:
         session.close()
+    
+    if not correlations:
+        return None
+    
+    # Collect nodes as (label, score, category) tuples and edges as weights
+    # keyed by the unordered flow ID pair; the graph is only drawn, so plain
+    # dicts replace a NetworkX graph and its per-node attribute dicts
+    nodes: Dict[int, Tuple[str, float, str]] = {}
+    edges: Dict[Tuple[int, int], float] = {}
+    
+    for (flow_id, correlated_flow_id, weight,
+         src1, dst1, score1, category1, src2, dst2, score2, category2) in correlations:
+        nodes[flow_id] = (f"{src1}→{dst1}", score1, category1)
+        nodes[correlated_flow_id] = (f"{src2}→{dst2}", score2, category2)
+        
+        edges[min(flow_id, correlated_flow_id), max(flow_id, correlated_flow_id)] = weight
+    
+    # Create Pyvis network
+    net = Network(height="600px", width="100%", bgcolor="#222222", 
+                 font_color="white")
+    
+    # Add nodes with colors based on category
+    color_map = {
+        'Low': '#90EE90',
+        'Medium': '#FFD700',
+        'High': '#FF8C00',
+        'Critical': '#FF0000'
+    }
+    
+    positions = graph_layout(list(nodes), list(edges))
+    if positions is not None:
+        net.toggle_physics(False)
+    
+    for node, (label, score, category) in nodes.items():
+        color = color_map.get(category, '#888888')
+        coords = {}
+        if positions is not None:
+            x, y = positions[node]
+            coords = {'x': x, 'y': y, 'physics': False}
+        net.add_node(node, label=label, 
+                    color=color, title=f"Score: {score:.1f}",
+                    **coords)
+    
+    for (flow_id, correlated_flow_id), weight in edges.items():
+        net.add_edge(flow_id, correlated_flow_id, 
+                    value=weight * 10)
+    
+    # Render straight to a string (no temporary file)
+    return net.generate_html(), len(nodes), len(edges)
+
+
+def show_network_graph():
+    """Show network correlation graph."""
+    st.header("🕸️ Network Correlation Graph")
+    
+    graph = network_graph_html(db_version())
+    
+    if graph is None:
+        st.info("No correlations available. Run analysis first.")
+        return
+    
+    html_content, node_count, edge_count = graph
+    st.write(f"Graph: {node_count} nodes, {edge_count} edges")
+    
+    st.components.v1.html(html_content, height=650)
 
 
 def show_timeline():
@@ -586,37 +803,37 @@ def show_timeline():
     session = db_manager.get_session()
     
     try:
-        # Get flows with timestamps
-        flows = session.query(Flow).filter(
+        # Get suspect flows with timestamps
+        df = read_frame(session, select(
+            Flow.ts_start.label('Time'),
+            Flow.id.label('Flow ID'),
+            Flow.src_ip.label('Source'),
+            Flow.dst_ip.label('Destination'),
+            Flow.confidence_score.label('Score'),
+            func.coalesce(Flow.confidence_category, 'Unknown').label('Category')
+        ).where(
             Flow.ts_start.isnot(None),
-            Flow.confidence_score >= 30.0
-        ).order_by(Flow.ts_start).all()
+            SUSPECT_FILTER
+        ).order_by(Flow.ts_start))
         
-        if not flows:
+        if df.empty:
             st.info("No flows available for timeline.")
             return
         
-        # Create timeline data
-        timeline_data = []
-        for flow in flows:
-            timeline_data.append({
-                'Time': flow.ts_start,
-                'Flow ID': flow.id,
-                'Source': flow.src_ip,
-                'Destination': flow.dst_ip,
-                'Score': flow.confidence_score,
-                'Category': flow.confidence_category or 'Unknown'
-            })
-        
-        df = pd.DataFrame(timeline_data)
-        
-        # Scatter plot
+        # Scatter plot, drawn with WebGL and sampled beyond what the
+        # chart can usefully resolve
+        points = df
+        if len(df) > TIMELINE_MAX_POINTS:
+            points = df.sample(n=TIMELINE_MAX_POINTS, random_state=0)
+            st.caption(f"Showing a sample of {TIMELINE_MAX_POINTS:,} of {len(df):,} flows")
+        
         fig = px.scatter(
-            df,
+            points,
             x='Time',
             y='Score',
             color='Category',
             hover_data=['Flow ID', 'Source', 'Destination'],
+            render_mode='webgl',
             title="Flow Confidence Over Time",
             color_discrete_map={
                 'Low': '#90EE90',
@@ -629,9 +846,15 @@ def show_timeline():
         fig.update_layout(height=500)
         st.plotly_chart(fig, use_container_width=True)
         
-        # Flow count over time
-        df['Hour'] = pd.to_datetime(df['Time']).dt.floor('H')
-        hourly_counts = df.groupby('Hour').size().reset_index(name='Count')
+        # Flow count over time, grouped by hour in SQL
+        hour = func.strftime('%Y-%m-%d %H:00:00', Flow.ts_start).label('Hour')
+        hourly_counts = read_frame(session, select(
+            hour, func.count(Flow.id).label('Count')
+        ).where(
+            Flow.ts_start.isnot(None),
+            SUSPECT_FILTER
+        ).group_by(hour).order_by(hour))
+        hourly_counts['Hour'] = pd.to_datetime(hourly_counts['Hour'])
         
         fig2 = px.line(
             hourly_counts,
@@ -651,6 +874,8 @@ def show_reports():
     """Show report generation interface."""
     st.header("📄 Forensic Reports")
     
+    from src.report.generator import ForensicReportGenerator
+    
     col1, col2 = st.columns([2, 1])
     
     with col1:
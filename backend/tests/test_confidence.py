@@ -3,8 +3,6 @@ Unit tests for confidence scoring module.
 """
 
 import pytest
-from pathlib import Path
-import tempfile
 from datetime import datetime, timedelta
 
 from src.db.models import DatabaseManager, Flow, TorNode, Correlation
@@ -13,17 +11,13 @@ from src.scorer.confidence import ConfidenceScorer, ScoreComponents
 
 @pytest.fixture
 def db_manager():
-    """Create temporary database for testing."""
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
-        db_path = Path(tmp.name)
-    
-    db_manager = DatabaseManager(f"sqlite:///{db_path}")
+    """Create in-memory database for testing."""
+    db_manager = DatabaseManager("sqlite:///:memory:")
     db_manager.create_tables()
     
     yield db_manager
     
-    # Cleanup
-    db_path.unlink()
+    db_manager.engine.dispose()
 
 
 @pytest.fixture
@@ -136,6 +130,39 @@ def test_score_all_flows(db_manager, sample_flows):
         session.close()
 
 
+def test_score_all_flows_matches_score_flow(db_manager, sample_flows):
+    """Test that bulk scoring agrees with scoring flows one at a time."""
+    scorer = ConfidenceScorer(db_manager)
+    scorer.score_all_flows()
+    
+    session = db_manager.get_session()
+    try:
+        for flow in session.query(Flow).all():
+            score, _ = scorer.score_flow(flow.id)
+            assert flow.confidence_score == score
+            assert flow.confidence_category == scorer._get_category(score)
+    finally:
+        session.close()
+
+
+def test_score_kernel_matches_score_flow(db_manager, sample_flows, monkeypatch):
+    """Test that the row-wise scoring kernel agrees with per-flow scoring."""
+    from src.scorer import confidence
+    
+    # Run the kernel's Python source, so this holds with or without Numba
+    monkeypatch.setattr(confidence, '_score_kernel', confidence._score_rows)
+    scorer = ConfidenceScorer(db_manager)
+    scorer.score_all_flows()
+    
+    session = db_manager.get_session()
+    try:
+        for flow in session.query(Flow).all():
+            score, _ = scorer.score_flow(flow.id)
+            assert flow.confidence_score == score
+    finally:
+        session.close()
+
+
 def test_get_category():
     """Test confidence category assignment."""
     scorer = ConfidenceScorer(None)
@@ -156,5 +183,25 @@ def test_get_high_confidence_flows(db_manager, sample_flows):
     assert len(high_conf_flows) > 0
 
 
+def test_top_scored_queries_use_indexes(db_manager):
+    """Test that strongest-first listings read an index instead of sorting."""
+    with db_manager.engine.connect() as conn:
+        for query, index in [
+            ("SELECT id FROM flows ORDER BY confidence_score DESC LIMIT 20",
+             "ix_flows_confidence_score"),
+            ("SELECT id FROM flows WHERE confidence_score >= 10 "
+             "ORDER BY confidence_score DESC, id LIMIT 50 OFFSET 100",
+             "ix_flows_confidence_score"),
+            ("SELECT id FROM correlations ORDER BY correlation_weight DESC LIMIT 20",
+             "ix_correlations_weight"),
+        ]:
+            plan = " ".join(
+                row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}")
+            )
+            
+            assert index in plan
+            assert "TEMP B-TREE" not in plan
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,137 @@
+"""
+Unit tests for flow correlation engine.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+
+from src.db.models import DatabaseManager, Flow, TorNode, Correlation
+from src.correlator.correlation_engine import CorrelationEngine
+
+
+@pytest.fixture
+def db_manager():
+    """Create in-memory database for testing."""
+    db_manager = DatabaseManager("sqlite:///:memory:")
+    db_manager.create_tables()
+
+    yield db_manager
+
+    db_manager.engine.dispose()
+
+
+@pytest.fixture
+def sample_flows(db_manager):
+    """Create correlated TOR flows for testing."""
+    session = db_manager.get_session()
+    base = datetime(2024, 1, 1, 12, 0, 0)
+
+    try:
+        session.add(TorNode(
+            ip_address="185.220.101.1",
+            port=9001,
+            fingerprint="GUARD1",
+            nickname="GuardRelay",
+            flags=["Guard", "Fast"]
+        ))
+        session.add(TorNode(
+            ip_address="185.220.101.2",
+            port=9001,
+            fingerprint="EXIT1",
+            nickname="ExitRelay",
+            flags=["Exit"]
+        ))
+
+        flows = [
+            # Guard then exit from the same host, half a second apart
+            Flow(src_ip="192.168.1.100", src_port=50000, dst_ip="185.220.101.1",
+                 dst_port=9001, protocol="TCP", ts_start=base,
+                 pkt_count=10, byte_count=5000, relay_comm=True),
+            Flow(src_ip="192.168.1.100", src_port=50001, dst_ip="185.220.101.2",
+                 dst_port=9001, protocol="TCP",
+                 ts_start=base + timedelta(milliseconds=500),
+                 pkt_count=10, byte_count=5000, relay_comm=True),
+            # Outside the time window
+            Flow(src_ip="192.168.1.100", src_port=50002, dst_ip="185.220.101.1",
+                 dst_port=9001, protocol="TCP",
+                 ts_start=base + timedelta(seconds=60),
+                 pkt_count=10, byte_count=5000, relay_comm=True),
+            # External source is never correlated
+            Flow(src_ip="8.8.8.8", src_port=443, dst_ip="185.220.101.2",
+                 dst_port=9001, protocol="TCP",
+                 ts_start=base + timedelta(milliseconds=700),
+                 pkt_count=10, byte_count=5000, relay_comm=True),
+        ]
+        session.add_all(flows)
+        session.commit()
+
+        return [flow.id for flow in flows]
+
+    finally:
+        session.close()
+
+
+def test_correlate_flows(db_manager, sample_flows):
+    """Test correlation of flows within the time window."""
+    engine = CorrelationEngine(db_manager, time_window_seconds=10)
+
+    correlation_count = engine.correlate_flows(min_correlation_weight=0.3)
+
+    assert correlation_count == 1
+
+    session = db_manager.get_session()
+    try:
+        correlation = session.query(Correlation).one()
+
+        assert correlation.flow_id == sample_flows[0]
+        assert correlation.correlated_flow_id == sample_flows[1]
+        assert correlation.correlation_type == 'entry_exit'
+        assert correlation.correlation_weight == pytest.approx(1.0)
+        assert correlation.evidence['timing_diff_seconds'] == pytest.approx(0.5)
+        assert correlation.evidence['same_source'] is True
+    finally:
+        session.close()
+
+
+def test_correlate_flows_min_weight(db_manager, sample_flows):
+    """Test that weak correlations are not persisted."""
+    engine = CorrelationEngine(db_manager, time_window_seconds=10)
+
+    assert engine.correlate_flows(min_correlation_weight=1.5) == 0
+
+
+def test_find_suspicious_chains(db_manager, sample_flows):
+    """Test chain discovery from the correlation graph."""
+    engine = CorrelationEngine(db_manager, time_window_seconds=10)
+    engine.correlate_flows()
+
+    chains = engine.find_suspicious_chains()
+
+    assert len(chains) == 1
+    assert sorted(chains[0]) == sample_flows[:2]
+
+    graph = engine.get_correlation_graph()
+    assert graph.number_of_edges() == 1
+    assert graph.has_edge(sample_flows[0], sample_flows[1])
+
+
+def test_get_flow_correlations(db_manager, sample_flows):
+    """Test correlation lookup with eager-loaded flows and keyset paging."""
+    engine = CorrelationEngine(db_manager, time_window_seconds=10)
+    engine.correlate_flows()
+
+    correlations = engine.get_flow_correlations(sample_flows[1])
+
+    assert len(correlations) == 1
+    # Related flows are usable after the session is closed
+    assert correlations[0].flow.dst_ip == "185.220.101.1"
+    assert correlations[0].correlated_flow.dst_ip == "185.220.101.2"
+
+    assert engine.get_flow_correlations(
+        sample_flows[1], after_id=correlations[0].id
+    ) == []
+    assert engine.get_flow_correlations(sample_flows[2]) == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,125 @@
+"""
+Unit tests for database models and schema migration.
+"""
+
+import pytest
+from sqlalchemy import inspect, text
+
+from src.db.models import Base, DatabaseManager, Flow, TorNode
+
+
+# Tables as created before the relay flag columns, generated endpoint
+# columns and later indexes were added
+BASELINE_SCHEMA = (
+    """
+    CREATE TABLE flows (
+        id INTEGER NOT NULL,
+        src_ip VARCHAR(45) NOT NULL,
+        src_port INTEGER NOT NULL,
+        dst_ip VARCHAR(45) NOT NULL,
+        dst_port INTEGER NOT NULL,
+        protocol VARCHAR(10) NOT NULL,
+        ts_start DATETIME NOT NULL,
+        ts_end DATETIME,
+        pkt_count INTEGER,
+        byte_count INTEGER,
+        payload_sample TEXT,
+        possible_tor_handshake BOOLEAN,
+        relay_comm BOOLEAN,
+        directory_fetch BOOLEAN,
+        obfsproxy_candidate BOOLEAN,
+        confidence_score FLOAT,
+        confidence_category VARCHAR(20),
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE tor_nodes (
+        id INTEGER NOT NULL,
+        ip_address VARCHAR(45) NOT NULL,
+        port INTEGER NOT NULL,
+        fingerprint VARCHAR(40),
+        nickname VARCHAR(100),
+        flags JSON,
+        country_code VARCHAR(2),
+        asn VARCHAR(20),
+        bandwidth INTEGER,
+        last_seen DATETIME,
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (fingerprint)
+    )
+    """,
+    """
+    INSERT INTO tor_nodes (ip_address, port, fingerprint, flags) VALUES
+        ('185.220.101.1', 9001, 'A', '["Guard", "Fast", "Stable"]'),
+        ('185.220.101.2', 443, 'B', '["Exit"]'),
+        ('185.220.101.3', 9001, 'C', NULL)
+    """,
+    # Payload samples were stored base64-encoded
+    """
+    INSERT INTO flows (src_ip, src_port, dst_ip, dst_port, protocol, ts_start, payload_sample) VALUES
+        ('192.168.1.100', 50000, '185.220.101.1', 9001, 'TCP', '2024-01-01 00:00:00', 'FgMBAAE='),
+        ('192.168.1.100', 50001, '185.220.101.2', 443, 'TCP', '2024-01-01 00:00:01', NULL)
+    """,
+)
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Create a database file with the baseline schema."""
+    db_manager = DatabaseManager(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with db_manager.engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+    
+    yield db_manager
+    
+    db_manager.engine.dispose()
+
+
+def test_create_tables_migrates_baseline_schema(baseline_db):
+    """Test that an existing database gains the current columns and indexes."""
+    baseline_db.create_tables()
+    
+    inspector = inspect(baseline_db.engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        
+        assert columns >= {column.name for column in table.columns}
+        assert indexes >= {index.name for index in table.indexes}
+    
+    # Relay flag columns are filled from the JSON flags
+    session = baseline_db.get_session()
+    try:
+        nodes = {
+            node.fingerprint: (node.is_guard, node.is_exit, node.is_fast, node.is_stable)
+            for node in session.query(TorNode).all()
+        }
+    finally:
+        session.close()
+    
+    assert nodes == {
+        'A': (True, False, True, True),
+        'B': (False, True, False, False),
+        'C': (False, False, False, False),
+    }
+    
+    # Payload samples are decoded to the raw bytes the column now holds
+    session = baseline_db.get_session()
+    try:
+        payloads = [flow.payload_sample for flow in session.query(Flow).order_by(Flow.id)]
+    finally:
+        session.close()
+    
+    assert payloads == [b'\x16\x03\x01\x00\x01', None]
+    
+    # Running again on a migrated database is a no-op
+    baseline_db.create_tables()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -4,28 +4,25 @@ Unit tests for PCAP ingestion module.
 
 import pytest
 from pathlib import Path
+from socket import inet_aton
 from datetime import datetime
 import tempfile
 
-from scapy.all import IP, TCP, Raw, wrpcap
+from scapy.all import IP, TCP, Raw, PcapWriter
 
 from src.db.models import DatabaseManager, Flow
-from src.collector.pcap_ingest import PcapIngestor, FlowKey, FlowRecord
+from src.collector.pcap_ingest import PcapIngestor, FlowRecord, IPPROTO_TCP
 
 
 @pytest.fixture
 def db_manager():
-    """Create temporary database for testing."""
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
-        db_path = Path(tmp.name)
-    
-    db_manager = DatabaseManager(f"sqlite:///{db_path}")
+    """Create in-memory database for testing."""
+    db_manager = DatabaseManager("sqlite:///:memory:")
     db_manager.create_tables()
     
     yield db_manager
     
-    # Cleanup
-    db_path.unlink()
+    db_manager.engine.dispose()
 
 
 @pytest.fixture
@@ -33,25 +30,29 @@ def sample_pcap():
     """Create sample PCAP file for testing."""
     from scapy.all import Ether, IP, TCP, UDP
     
-    packets = []
+    # Explicit MACs avoid a route/ARP lookup when each packet is built
+    ether = Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb")
     
-    # Create some TCP packets
-    for i in range(10):
-        pkt = Ether() / IP(src="192.168.1.100", dst="185.220.101.1") / \
-              TCP(sport=50000+i, dport=9001) / Raw(load=b"TOR handshake data")
-        packets.append(pkt)
+    # Create some TCP packets from one template
+    tcp_template = ether / IP(src="192.168.1.100", dst="185.220.101.1") / \
+        TCP(dport=9001) / Raw(load=b"TOR handshake data")
+    tcp_packets = [tcp_template.copy() for _ in range(10)]
+    for i, pkt in enumerate(tcp_packets):
+        pkt[TCP].sport = 50000 + i
     
-    # Create some UDP packets
-    for i in range(5):
-        pkt = Ether() / IP(src="192.168.1.101", dst="8.8.8.8") / \
-              UDP(sport=60000+i, dport=53) / Raw(load=b"DNS query")
-        packets.append(pkt)
+    # Create some UDP packets from one template
+    udp_template = ether / IP(src="192.168.1.101", dst="8.8.8.8") / \
+        UDP(dport=53) / Raw(load=b"DNS query")
+    udp_packets = [udp_template.copy() for _ in range(5)]
+    for i, pkt in enumerate(udp_packets):
+        pkt[UDP].sport = 60000 + i
     
-    # Save to temporary file
+    # Save to temporary file in a single write
     with tempfile.NamedTemporaryFile(suffix='.pcap', delete=False) as tmp:
         pcap_path = Path(tmp.name)
     
-    wrpcap(str(pcap_path), packets)
+    with PcapWriter(str(pcap_path), sync=False) as writer:
+        writer.write(tcp_packets + udp_packets)
     
     yield pcap_path
     
@@ -59,20 +60,25 @@ def sample_pcap():
     pcap_path.unlink()
 
 
-def test_flow_key_equality():
-    """Test FlowKey equality and hashing."""
-    key1 = FlowKey("192.168.1.1", 5000, "10.0.0.1", 80, "TCP")
-    key2 = FlowKey("192.168.1.1", 5000, "10.0.0.1", 80, "TCP")
-    key3 = FlowKey("192.168.1.2", 5000, "10.0.0.1", 80, "TCP")
+def test_process_packet_flow_key():
+    """Test that packets are keyed by their 5-tuple."""
+    from scapy.all import Ether
+    
+    ingestor = PcapIngestor(None)
+    packet = Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb") / \
+        IP(src="192.168.1.1", dst="10.0.0.1") / TCP(sport=5000, dport=80)
+    packet.time = 1000.0
     
-    assert key1 == key2
-    assert key1 != key3
-    assert hash(key1) == hash(key2)
+    key = ingestor.process_packet(packet)
+    
+    assert key == (inet_aton("192.168.1.1"), 5000, inet_aton("10.0.0.1"), 80, IPPROTO_TCP)
+    assert ingestor.process_packet(packet) == key
+    assert ingestor.flows[key].pkt_count == 2
 
 
 def test_flow_record_update():
     """Test FlowRecord update functionality."""
-    key = FlowKey("192.168.1.1", 5000, "10.0.0.1", 80, "TCP")
+    key = (inet_aton("192.168.1.1"), 5000, inet_aton("10.0.0.1"), 80, IPPROTO_TCP)
     record = FlowRecord(key, 1000.0)
     
     assert record.pkt_count == 0
@@ -105,13 +111,153 @@ def test_pcap_ingestion(db_manager, sample_pcap):
             assert flow.protocol in ['TCP', 'UDP']
             assert flow.pkt_count > 0
             assert flow.byte_count > 0
+            assert flow.endpoint_src == f"{flow.src_ip}:{flow.src_port}"
+            assert flow.endpoint_dst == f"{flow.dst_ip}:{flow.dst_port}"
+    finally:
+        session.close()
+
+
+def test_read_frames_matches_raw_pcap_reader(sample_pcap):
+    """Test that the memory-mapped reader agrees with Scapy's RawPcapReader."""
+    from scapy.all import RawPcapReader
+    
+    ingestor = PcapIngestor(None)
+    reader = RawPcapReader(str(sample_pcap))
+    try:
+        expected = [
+            (*ingestor._frame_info(reader, metadata), frame)
+            for frame, metadata in reader
+        ]
+    finally:
+        reader.close()
+    
+    assert list(ingestor._read_frames(sample_pcap)) == expected
+
+
+def test_parallel_ingestion_matches_serial(db_manager, sample_pcap):
+    """Test that parsing in worker processes yields the same flows."""
+    columns = ('src_ip', 'src_port', 'dst_ip', 'dst_port', 'protocol', 'pkt_count', 'byte_count')
+    
+    def ingested_flows(manager, workers):
+        ingestor = PcapIngestor(manager)
+        # Several batches, so they are spread over the workers
+        ingestor.PACKET_BATCH_SIZE = 4
+        ingestor.ingest_pcap(sample_pcap, streaming=False, workers=workers)
+        session = manager.get_session()
+        try:
+            return sorted(
+                tuple(getattr(flow, column) for column in columns)
+                for flow in session.query(Flow).all()
+            )
+        finally:
+            session.close()
+    
+    parallel_manager = DatabaseManager("sqlite:///:memory:")
+    parallel_manager.create_tables()
+    try:
+        assert ingested_flows(parallel_manager, 2) == ingested_flows(db_manager, 1)
+    finally:
+        parallel_manager.engine.dispose()
+
+
+def test_process_frame_matches_process_packet(db_manager):
+    """Test that raw frame parsing agrees with Scapy dissection."""
+    from scapy.all import Ether, Dot1Q, IPv6, IPv6ExtHdrHopByHop, UDP
+    
+    ether = Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb")
+    packets = [
+        ether / Dot1Q(vlan=10) / IP(src="192.168.1.100", dst="185.220.101.1") /
+        TCP(sport=50000, dport=9001) / Raw(load=b"TOR handshake data"),
+        ether / IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrHopByHop() /
+        UDP(sport=60000, dport=9030) / Raw(load=b"directory"),
+        ether / IP(src="10.0.0.1", dst="10.0.0.2") / IP(src="192.168.1.100", dst="185.220.101.1") /
+        TCP(sport=50001, dport=443) / Raw(load=b"IP-in-IP"),
+        ether / IP(src="10.0.0.1", dst="10.0.0.2") / IPv6(src="2001:db8::1", dst="2001:db8::2") /
+        UDP(sport=60001, dport=9030) / Raw(load=b"6in4"),
+        ether / IPv6(src="2001:db8::1", dst="2001:db8::2") / IP(src="192.168.1.100", dst="185.220.101.1") /
+        TCP(sport=50002, dport=9001) / Raw(load=b"4in6"),
+    ]
+    
+    for packet in packets:
+        frame = bytes(packet)
+        dissected = Ether(frame)
+        dissected.time = 1000.5
+        
+        scapy_ingestor = PcapIngestor(db_manager)
+        frame_ingestor = PcapIngestor(db_manager)
+        key = scapy_ingestor.process_packet(dissected)
+        
+        assert frame_ingestor.process_frame(1, 1000.5, frame) == key
+        
+        expected = scapy_ingestor.flows[key]
+        record = frame_ingestor.flows[key]
+        assert record.to_dict() == expected.to_dict()
+
+
+def test_process_batch_matches_process_frame(db_manager):
+    """Test that batch aggregation matches frame-by-frame updates."""
+    from scapy.all import Ether
+    
+    ether = Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb")
+    frames = [
+        bytes(ether / IP(src="192.168.1.100", dst="185.220.101.1") /
+              TCP(sport=50000 + i % 3, dport=9001) /
+              (Raw(load=b"cell %d" % i) if i % 4 else Raw()))
+        for i in range(20)
+    ]
+    timestamps = [1000.0 + i * 0.25 for i in range(20)]
+    
+    frame_ingestor = PcapIngestor(db_manager)
+    for timestamp, frame in zip(timestamps, frames):
+        frame_ingestor.process_frame(1, timestamp, frame)
+    
+    # Batches split flows, so records are updated more than once
+    batch_ingestor = PcapIngestor(db_manager)
+    for start in range(0, 20, 7):
+        batch = frames[start:start + 7]
+        batch_ingestor._process_batch(
+            [1] * len(batch), timestamps[start:start + 7], batch
+        )
+    
+    assert batch_ingestor.flows.keys() == frame_ingestor.flows.keys()
+    for key, expected in frame_ingestor.flows.items():
+        assert batch_ingestor.flows[key].to_dict() == expected.to_dict()
+
+
+def test_flush_idle_flows(db_manager):
+    """Test that only idle flows are flushed and dropped from memory."""
+    from scapy.all import Ether
+
+    ether = Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb")
+    idle = bytes(ether / IP(src="192.168.1.1", dst="10.0.0.1") / TCP(sport=5000, dport=80))
+    live = bytes(ether / IP(src="192.168.1.2", dst="10.0.0.1") / TCP(sport=5001, dport=80))
+
+    ingestor = PcapIngestor(db_manager)
+    ingestor._process_batch([1, 1], [1000.0, 1000.0], [idle, live])
+    ingestor._process_batch([1], [1500.0], [live])
+
+    ingestor._flush_flows(idle_before=1500.0 - ingestor.FLOW_IDLE_TIMEOUT)
+
+    assert list(ingestor.flows) == [
+        (inet_aton("192.168.1.2"), 5001, inet_aton("10.0.0.1"), 80, IPPROTO_TCP)
+    ]
+    assert ingestor.flows[list(ingestor.flows)[0]].pkt_count == 2
+    assert ingestor.flow_count == 1
+
+    ingestor._flush_flows()
+
+    assert not ingestor.flows
+    assert ingestor.flow_count == 2
+    session = db_manager.get_session()
+    try:
+        assert session.query(Flow).count() == 2
     finally:
         session.close()
 
 
 def test_flow_to_model_conversion():
     """Test conversion of FlowRecord to Flow model."""
-    key = FlowKey("192.168.1.1", 5000, "10.0.0.1", 80, "TCP")
+    key = (inet_aton("192.168.1.1"), 5000, inet_aton("10.0.0.1"), 80, IPPROTO_TCP)
     record = FlowRecord(key, 1000.0)
     record.update(1001.0, b"test", 100)
     
@@ -124,7 +270,7 @@ def test_flow_to_model_conversion():
     assert flow_model.protocol == "TCP"
     assert flow_model.pkt_count == 1
     assert flow_model.byte_count == 100
-    assert flow_model.payload_sample is not None
+    assert flow_model.payload_sample == b"test"
 
 
 if __name__ == '__main__':
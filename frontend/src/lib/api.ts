@@ -123,7 +123,7 @@ export const api = {
     return response.json();
   },
 
-  async uploadFile(file: File): Promise<{ status: string; flow_count: number }> {
+  async uploadFile(file: File): Promise<{ status: string; message: string }> {
     const formData = new FormData();
     formData.append('file', file);
 
@@ -31,7 +31,7 @@ export default function UploadPage() {
   const uploadMutation = useMutation({
     mutationFn: api.uploadFile,
     onSuccess: (data) => {
-      toast.success(`Uploaded successfully! ${data.flow_count} flows extracted.`);
+      toast.success(`Uploaded successfully! ${data.message}`);
       updateStep(0, "complete");
       updateStep(1, "active");
       analyzeMutation.mutate({ time_window: timeWindow, min_correlation_weight: minWeight });